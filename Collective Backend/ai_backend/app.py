@@ -6,22 +6,33 @@ import random
 import shutil
 import time
 import uuid
-import base64
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import wraps
 
 import cv2
-from flask import Flask, request, jsonify, render_template, session, send_from_directory
+import numpy as np
+from flask import Flask, Response, request, jsonify, render_template, session, send_from_directory, stream_with_context
 from flask_cors import CORS
-from moviepy import *
 from openai import OpenAI
 
-from ultralytics import YOLO
 from modules.user_manager import UserManager
 from modules.ddos_detector import DDoSDetector
-from config.database import execute_query
+from modules.rate_limiter import RedisWindowBackend
+from config.database import execute_query, transaction, pool_stats, set_query_observer
 from scheduler import scheduler
 from modules.admin_manager import AdminManager
+from modules.auth_cache import auth_cache
+from modules.inference_server import InferenceClient, InferenceEngine
+from modules.job_queue import JobQueue
+from modules.result_cache import ResultCache
+from modules.video_sampling import VIDEO_MODES
+from modules.chat_context import ChatContextBuilder
+from modules.image_payload import ImagePayloadCache
+from modules.llm_stream import complete, stream_completion, llm_metrics
+from modules.telemetry import telemetry
+from modules.thumbnails import ThumbnailStore
+from modules.static_files import StaticFiles, content_address, create_webp_variant
 
 # 设置环境变量
 os.environ['VOLC_ACCESSKEY'] = 'AKLTNmZlNTYxZDc4ZDBhNGE5ZmEzMDc3ZTBhZmQyZGE0ZDM'
@@ -41,12 +52,26 @@ CORS(app,
      resources={r"*": {"origins": ["http://localhost:8080", "http://127.0.0.1:8080", "http://localhost:8081", "http://127.0.0.1:8081", "http://localhost:5001", "http://127.0.0.1:5001"]}},
      supports_credentials=True,
      allow_headers=["Content-Type", "Authorization"],
+     expose_headers=["X-Next-Cursor"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 
+# 请求耗时统计：数据库耗时计入当前请求
+set_query_observer(lambda seconds: telemetry.add('db', seconds))
+# DDoS 检测的滑动窗口计数：设置 RATE_LIMIT_REDIS_URL 时所有 worker 共用 Redis 中的计数（需要安装 redis），
+# 否则每个进程单独计数，多 worker 部署时实际限额为阈值 × worker 数
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')
+if RATE_LIMIT_REDIS_URL:
+    import redis
+
+    DDoSDetector.set_window_backend(RedisWindowBackend(redis.Redis.from_url(RATE_LIMIT_REDIS_URL)))
+
+# Prometheus 抓取令牌（未设置时 /metrics 仅允许本机访问）
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 # 目录和路径
 WEIGHTS_DIR = 'PtSource'
 UPLOAD_DIR = 'uploads'
@@ -55,11 +80,95 @@ RESULTS_DIR = 'runs/predict/latest'
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+# 权重文件 -> 检测类别
+CATEGORY_MAP = {
+    '烟雾.pt':'smoke_detection','火焰.pt':'fire_detection','人员落水.pt':'person_drowning',
+    '光伏板.pt':'solar_panel_inspection','河道漂浮物.pt':'river_floating_objects',
+    '植物生长.pt':'crop_growth_monitoring','人闯红灯.pt':'pedestrian_red_light',
+    '车闯红灯.pt':'vehicle_red_light','人员摔倒.pt':'person_fall_detection',
+    '景区人流量识别.pt':'scenic_area_crowd'
+}
+
+# 推理后端：设置 INFERENCE_SOCKET 时交给独立的推理服务进程（python -m modules.inference_server），
+# 否则在本进程内使用常驻模型注册表（每个类别只加载一次，超出内存预算时 LRU 淘汰）
+MODEL_MEMORY_BUDGET_MB = 2048
+# 每个模型的预测上下文池：pool_size 个上下文共享权重、可并行推理；
+# max_batch > 1 时启用动态批：并发的单张图片请求按实测延迟曲线合并为一次前向，
+# 本批预计完成时间不超过 p99 延迟目标 slo_ms，为凑批最多等待 max_wait_ms；负载低时逐张推理
+MODEL_POOL = dict(pool_size=2, max_batch=4, max_wait_ms=10.0, slo_ms=500)
+INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET')
+INFERENCE_AUTHKEY = os.environ.get('INFERENCE_AUTHKEY')
+if INFERENCE_SOCKET:
+    inference = InferenceClient(INFERENCE_SOCKET, authkey=INFERENCE_AUTHKEY.encode() if INFERENCE_AUTHKEY else None)
+else:
+    inference = InferenceEngine(WEIGHTS_DIR, memory_budget_mb=MODEL_MEMORY_BUDGET_MB, pool=MODEL_POOL)
+
+# 视频流水线各阶段之间的队列深度（决定视频处理的内存峰值）
+VIDEO_QUEUE_SIZE = 8
+# 视频推理批大小：多帧合并为一次前向；<= 0 表示按吞吐量自动选择
+VIDEO_BATCH_SIZE = 8
+# 未指定 video_mode 时的视频检测模式（见 video_sampling.VIDEO_MODES：full / balanced / fast / keyframes）
+VIDEO_DEFAULT_MODE = 'full'
+# 视频编码器：ffmpeg（BGR 帧直接写入 ffmpeg 标准输入）/ cv2（cv2.VideoWriter）/ moviepy；
+# 不可用时自动退回其它后端。preset / crf 为 libx264 的速度与质量参数
+VIDEO_ENCODER = dict(backend='ffmpeg', preset='veryfast', crf=23)
+
+# 推理参数（同时作为结果缓存键的一部分）
+IMAGE_PREDICT_ARGS = dict(imgsz=640, conf=0.3, iou=0.5)
+VIDEO_PREDICT_ARGS = dict(imgsz=640, conf=0.25, iou=0.45)
+
+# 检测结果缓存：相同文件 + 相同模型 + 相同参数直接复用结果
+RESULT_CACHE_DIR = 'result_cache'
+RESULT_CACHE_MAX_MB = 2048
+RESULT_CACHE_MAX_AGE = 7 * 24 * 3600
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024, max_age=RESULT_CACHE_MAX_AGE)
+
+# 处理结果静态分发：内容寻址文件名 + 长期缓存 + Range；
+# 设置 STATIC_ACCEL_PREFIX（nginx internal location）时改由 nginx 发送文件
+STATIC_ACCEL_PREFIX = os.environ.get('STATIC_ACCEL_PREFIX')
+processed_files = StaticFiles(PROCESSED_DIR, accel_prefix=STATIC_ACCEL_PREFIX)
+# 为处理后的图片额外生成 .webp 变体（支持 WebP 的浏览器自动获取更小的文件）
+PROCESSED_WEBP_VARIANT = False
+
+# 历史列表缩略图（检测完成时生成）
+THUMBNAIL_DIR = 'thumbnails'
+THUMBNAIL_MAX_SIDE = 256
+THUMBNAIL_MAX_AGE = 30 * 24 * 3600  # 缩略图内容不变，浏览器可长期缓存
+thumbnails = ThumbnailStore(THUMBNAIL_DIR, max_side=THUMBNAIL_MAX_SIDE)
+
+# 历史会话分页
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# 原图异步落盘线程池
+io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload-io')
+
+# 异步检测任务队列（图片优先于视频，限制每个用户同时运行的任务数）
+JOB_WORKERS = 2
+JOB_MAX_PER_USER = 2
+job_queue = JobQueue(workers=JOB_WORKERS, max_per_user=JOB_MAX_PER_USER)
+
 # 大模型 API 客户端
 client = OpenAI(
     base_url="https://ark.cn-beijing.volces.com/api/v3",
     api_key=os.environ.get("ARK_API_KEY"),  
 )
+LLM_MODEL = "doubao-1.5-vision-lite-250315"  # 豆包视觉模型
+
+
+def wants_stream(data):
+    """请求体 stream=true、?stream=1 或 Accept: text/event-stream 时以 SSE 流式返回"""
+    return bool(data.get('stream')) or request.args.get('stream') == '1' \
+        or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_response(events):
+    """把 SSE 事件生成器包装为流式响应（关闭反向代理缓冲）"""
+    return Response(
+        stream_with_context(telemetry.bind(events)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # 装饰器：检查用户认证和封禁状态
 def require_auth(f):
@@ -71,27 +180,14 @@ def require_auth(f):
         if not user_id:
             return jsonify({"error": "Authentication required"}), 401
 
-        # 验证用户是否存在
-        if role == 'admin':
-            user_exists = execute_query(
-                "SELECT 1 FROM admin_names WHERE admin_id = %s",
-                (user_id,),
-                fetch=True
-            )
-        else:
-            user_exists = execute_query(
-                "SELECT 1 FROM user_names WHERE user_id = %s",
-                (user_id,),
-                fetch=True
-            )
-            
-        if not user_exists:
+        # 验证用户是否存在（短期缓存，避免每个请求查库）
+        if not auth_cache.user_exists(user_id, role):
             session.clear()  # 清除无效的会话
             return jsonify({"error": "Invalid user session. Please log in again."}), 401
         
         # 检查用户是否被封禁（仅对普通用户）
         if role == 'user':
-            is_banned, ban_info = UserManager.is_user_banned(user_id)
+            is_banned, ban_info = auth_cache.ban_state(user_id)
             if is_banned:
                 return jsonify({"error": f"Account banned: {ban_info}"}), 403
         
@@ -130,47 +226,61 @@ def ddos_protection(action_type):
     return decorator
 
 # ===================== 多轮对话核心工具 =====================
-def build_chat_context(session_id: int, max_rounds: int = 10):
-    """
-    把历史 user/assistant 消息按轮次拼成 OpenAI messages。
-    最新 max_rounds 轮，过长会截断。
-    """
-    rows = execute_query(
-        """
-        SELECT um.round_id,
-               um.message_content      AS user_msg,
-               ar.response_content     AS ai_msg
-        FROM   user_messages um
-        LEFT JOIN ai_responses ar
-               ON um.session_id = ar.session_id
-              AND um.round_id  = ar.round_id
-        WHERE  um.session_id = %s
-        ORDER  BY um.round_id
-        """,
-        (session_id,),
-        fetch=True
+def summarize_chat_rounds(previous_summary, rounds):
+    """把被挤出上下文窗口的旧轮次合并进会话摘要（调用大模型）"""
+    dialogue = "\n".join(
+        f"用户：{r['user_msg']}\n助手：{r['ai_msg'] or ''}" for r in rounds
+    )
+    completion = client.chat.completions.create(
+        model=LLM_MODEL,
+        messages=[{
+            "role": "user",
+            "content": f"已有摘要：{previous_summary or '无'}\n\n新增对话：\n{dialogue}\n\n"
+                       f"请把新增对话合并进摘要，保留关键事实，不超过200字，只输出摘要。"
+        }]
     )
+    return completion.choices[0].message.content
 
-    # 保留最近 max_rounds 轮
-    rows = rows[-max_rounds:]
 
-    context = []
-    for r in rows:
-        context.append({"role": "user",      "content": r["user_msg"]})
-        if r["ai_msg"]:
-            context.append({"role": "assistant","content": r["ai_msg"]})
-    return context
+# 多轮对话上下文：SQL 只取最近 N 轮，并限制 token 预算；旧轮次可选摘要
+CHAT_MAX_ROUNDS = 10
+CHAT_TOKEN_BUDGET = 3000
+CHAT_SUMMARIZE = False
+chat_context = ChatContextBuilder(
+    max_rounds=CHAT_MAX_ROUNDS,
+    token_budget=CHAT_TOKEN_BUDGET,
+    summarizer=summarize_chat_rounds if CHAT_SUMMARIZE else None
+)
+
+# 大模型图片载荷缓存：缩放到视觉模型输入尺寸并重新压缩为 JPEG，按 (路径, 修改时间) 缓存 data URI
+IMAGE_PAYLOAD_CACHE_MB = 64
+IMAGE_PAYLOAD_MAX_SIDE = 1024
+IMAGE_PAYLOAD_MAX_KB = 512
+image_payloads = ImagePayloadCache(
+    max_bytes=IMAGE_PAYLOAD_CACHE_MB * 1024 * 1024,
+    max_side=IMAGE_PAYLOAD_MAX_SIDE,
+    max_payload_bytes=IMAGE_PAYLOAD_MAX_KB * 1024
+)
+
+
+def build_chat_context(session_id: int, before_round: int = None):
+    """
+    把历史 user/assistant 消息按轮次拼成 OpenAI messages。
+    最新 CHAT_MAX_ROUNDS 轮，超出 token 预算会截断。
+    """
+    return chat_context.build(session_id, before_round=before_round)
 
 
 # ===================== 纯文本多轮对话接口 =====================
 @app.route('/chat', methods=['POST'])
+@telemetry.timed('chat')
 @require_auth
 @ddos_protection('conversation')
 def chat_endpoint():
     """
     前端纯文本对话：
-    POST /chat  { "session_id":123, "userQuery":"..." }
-    返回 {"assistant":"...", "round_id":n}
+    POST /chat  { "session_id":123, "userQuery":"...", "stream":false }
+    返回 {"assistant":"...", "round_id":n}；stream=true 时返回 text/event-stream
     """
     data       = request.json or {}
     session_id = data.get('session_id')
@@ -192,27 +302,21 @@ def chat_endpoint():
         (session_id, round_id, user_query)
     )
 
-    # ---- 组装上下文 ---------------------------------
-    messages = build_chat_context(session_id)
+    # ---- 组装上下文（不含本轮，本轮问题在末尾追加） ----------------
+    messages = build_chat_context(session_id, before_round=round_id)
 
-    # ⭐ 取此次会话对应的处理后图片路径
-    img_row = execute_query(
-        "SELECT processed_image_path FROM session_results WHERE session_id=%s",
-        (session_id,), fetch=True
-    )
-    if img_row and img_row[0]["processed_image_path"]:
-        img_path = img_row[0]["processed_image_path"]
-        # 把图片转 base64，再塞到 messages 开头
-        with open(img_path, "rb") as f:
-            img_b64 = base64.b64encode(f.read()).decode("utf-8")
+    # ⭐ 此次会话对应的处理后图片（按会话缓存的 data URI）
+    img_url = image_payloads.get(session_id)
+    if img_url:
+        # 把图片塞到 messages 开头（摘要之后）
         messages.insert(
-            0,
+            1 if messages and messages[0]["role"] == "system" else 0,
             {
                 "role": "user",
                 "content": [
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
+                        "image_url": {"url": img_url}
                     },
                     {"type": "text", "text": "(已知图片内容，继续对话)"}
                 ],
@@ -222,18 +326,21 @@ def chat_endpoint():
     # 把当前用户问题追加到末尾
     messages.append({"role": "user", "content": user_query})
 
-    # ---- 调大模型
-    completion = client.chat.completions.create(
-        model="doubao-1.5-vision-lite-250315",
-        messages=messages
-    )
-    assistant_reply = completion.choices[0].message.content
+    def save_reply(assistant_reply):
+        # ---- 写入 AI 回复
+        execute_query(
+            "INSERT INTO ai_responses (session_id,round_id,response_content) VALUES (%s,%s,%s)",
+            (session_id, round_id, assistant_reply)
+        )
+        return {"round_id": round_id}
 
-    # ---- 写入 AI 回复
-    execute_query(
-        "INSERT INTO ai_responses (session_id,round_id,response_content) VALUES (%s,%s,%s)",
-        (session_id, round_id, assistant_reply)
-    )
+    # ---- 流式：逐块推送，生成结束后写库
+    if wants_stream(data):
+        return sse_response(stream_completion(client, LLM_MODEL, messages, on_complete=save_reply))
+
+    # ---- 调大模型
+    assistant_reply = complete(client, LLM_MODEL, messages)
+    save_reply(assistant_reply)
 
     return jsonify({"assistant": assistant_reply, "round_id": round_id})
 
@@ -272,26 +379,63 @@ def get_history(session_id):
 @app.route('/history/sessions', methods=['GET'])
 @require_auth
 def list_user_sessions():
-    """返回当前用户的所有会话（含图片路径）"""
+    """
+    返回当前用户的会话（含图片路径和缩略图），按 (created_at, session_id) 倒序 keyset 分页：
+    GET /history/sessions?limit=50&cursor=<上一页响应头 X-Next-Cursor>
+    """
     user_id = session.get('user_id')
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        cursor = parse_history_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    # 先在 (user_id, created_at, session_id) 索引上取一页会话，再按主键关联类别和结果
+    keyset = ""
+    params = [user_id]
+    if cursor:
+        keyset = "AND (su.created_at < %s OR (su.created_at = %s AND su.session_id < %s))"
+        params += [cursor[0], cursor[0], cursor[1]]
     rows = execute_query(
-        """
-        SELECT su.session_id,
-               su.created_at,
+        f"""
+        SELECT p.session_id,
+               p.created_at,
                sc.detection_category,
                sr.processed_image_path
-        FROM   session_users su
+        FROM   (SELECT su.session_id, su.created_at
+                FROM   session_users su
+                WHERE  su.user_id = %s {keyset}
+                ORDER  BY su.created_at DESC, su.session_id DESC
+                LIMIT  %s) p
         LEFT JOIN session_categories sc
-               ON su.session_id = sc.session_id
+               ON p.session_id = sc.session_id
         LEFT JOIN session_results sr
-               ON su.session_id = sr.session_id
-        WHERE  su.user_id = %s
-        ORDER  BY su.created_at DESC
+               ON p.session_id = sr.session_id
+        ORDER  BY p.created_at DESC, p.session_id DESC
         """,
-        (user_id,),
+        (*params, limit + 1),
         fetch=True
     )
-    return jsonify(rows)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        thumb = thumbnails.filename_for(row['processed_image_path'])
+        row['thumbnail_url'] = f"/thumbnails/{thumb}" if thumb else None
+
+    response = jsonify(rows)
+    if has_more:
+        last = rows[-1]
+        response.headers['X-Next-Cursor'] = f"{last['created_at'].strftime('%Y-%m-%dT%H:%M:%S')}_{last['session_id']}"
+    return response
+
+
+def parse_history_cursor(cursor):
+    """解析分页游标 '<created_at>_<session_id>'，无游标返回 None"""
+    if not cursor:
+        return None
+    created_at, _, session_id = cursor.rpartition('_')
+    return datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S'), int(session_id)
 
 
 # ========= 会话详情（你已写过，但保留） =========
@@ -369,13 +513,23 @@ def force_logout():
 # 新增路由，用于提供处理后的图片
 @app.route('/processed_images/<filename>')
 def serve_processed_image(filename):
-    return send_from_directory(PROCESSED_DIR, filename)
+    """处理后的图片 / 视频：内容寻址文件长期缓存，支持 Range（视频拖动）与预生成变体"""
+    return processed_files.serve(filename)
+
+@app.route('/thumbnails/<filename>')
+def serve_thumbnail(filename):
+    """缩略图：文件名唯一且内容不变，带 ETag 并允许长期缓存"""
+    response = send_from_directory(THUMBNAIL_DIR, filename, max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/detect', methods=['POST'])
+@telemetry.timed('detect')
 @require_auth
 @ddos_protection('session')
 def detect():
@@ -386,14 +540,27 @@ def detect():
     file = request.files['source']
     weight_file = request.form.get('weight_file', '烟雾.pt')
     file_type = request.form.get('fileType', 'image')
+    video_mode = request.form.get('video_mode', VIDEO_DEFAULT_MODE)
     user_id = session.get('user_id')
 
+    if file_type == 'video' and video_mode not in VIDEO_MODES:
+        return jsonify({"error": f"Invalid video_mode, expected one of: {', '.join(VIDEO_MODES)}"}), 400
+
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    # 计算上传文件 SHA256（保留用于日志记录）
-    file_bytes = file.read()
-    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    # 原图保存路径（视频在此直接写入，图片由后台任务写入 uploads/ 目录并在内存中推理）
+    unique_name = f"{uuid.uuid4()}_{file.filename}"
+    source_path = os.path.join(UPLOAD_DIR, unique_name)
+
+    # 计算上传文件 SHA256（用作检测结果缓存键）
+    if file_type == 'video':
+        # 视频边写入边计算哈希，任务参数只带路径，排队期间不在内存中保留整个文件
+        file_bytes = None
+        file_hash = save_stream(file.stream, source_path)
+    else:
+        file_bytes = file.read()
+        file_hash = hashlib.sha256(file_bytes).hexdigest()
     
     # 移除文件去重查询，直接生成新的 session_id
     session_id = int(str(int(time.time()))[-6:]) + random.randint(1000, 9999)
@@ -403,12 +570,6 @@ def detect():
     ):
         session_id = int(str(int(time.time()))[-6:]) + random.randint(1000, 9999)
     
-    # 保存原图到 uploads/ 目录
-    unique_name = f"{uuid.uuid4()}_{file.filename}"
-    source_path = os.path.join(UPLOAD_DIR, unique_name)
-    with open(source_path, 'wb') as f:
-        f.write(file_bytes)
-    
     # 写入 session_users（移除 file_hash 字段）
     execute_query(
         """
@@ -418,66 +579,156 @@ def detect():
         (session_id, user_id, source_path)
     )
 
-    # ========== 以下逻辑：预测、保存结果、写入其它表 ==========
-    # 1. 若之前已经处理过，则直接从 session_results 取 processed_image_path
-    processed_row = execute_query(
-        "SELECT processed_image_path FROM session_results WHERE session_id=%s",
-        (session_id,), fetch=True
+    # 推理、保存结果、写入其它表交给后台任务队列，立即返回任务 ID
+    job = job_queue.submit(
+        run_detection, session_id, weight_file, file_type, file_bytes, source_path, file_hash, video_mode,
+        user_id=user_id, kind=file_type
     )
+    return jsonify({
+        "job_id"    : job.job_id,
+        "session_id": session_id,
+        "status"    : job.status,
+        "message"   : "任务已提交，请通过 /jobs/<job_id> 查询进度"
+    }), 202
+
+
+def run_detection(session_id, weight_file, file_type, file_bytes, source_path, file_hash, video_mode=VIDEO_DEFAULT_MODE):
+    """
+    后台任务：模型预测、保存处理结果并写入 session_results / session_categories。
+    图片以 file_bytes 传入；视频已写入 source_path，file_bytes 为 None。
+    """
+    with telemetry.request('detect_job', category=CATEGORY_MAP.get(weight_file)):
+        return _run_detection(session_id, weight_file, file_type, file_bytes, source_path, file_hash, video_mode)
 
-    if processed_row:
-        permanent_path = processed_row[0]['processed_image_path']
+
+def _run_detection(session_id, weight_file, file_type, file_bytes, source_path, file_hash, video_mode):
+    timings = {}
+    # 本次请求的文件写入与复制量：图片上传内容只在内存中保留一份，处理结果只编码写入一次；
+    # 视频已在 /detect 中写入 source_path，bytes_copied 为硬链接失败退回复制的字节数
+    if file_type == 'video':
+        upload_bytes = os.path.getsize(source_path)
+        io_stats = {"upload_bytes": upload_bytes, "bytes_written": upload_bytes, "bytes_copied": 0}
     else:
-        # -------- 处理模型 ------------------------------------
-        model = YOLO(os.path.join(WEIGHTS_DIR, weight_file))
-        if file_type == 'video':
-            tmp_path = process_video(model, source_path)
+        io_stats = {"upload_bytes": len(file_bytes), "bytes_written": 0, "bytes_copied": 0}
+    if file_type == 'video':
+        predict_args = dict(VIDEO_PREDICT_ARGS, video_mode=video_mode)  # 不同抽帧模式的结果分开缓存
+    else:
+        predict_args = IMAGE_PREDICT_ARGS
+    cache_key = ResultCache.make_key(file_hash, weight_file, file_type=file_type, **predict_args)
+    cached = result_cache.get(cache_key)
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+
+    persist = None
+    if file_type != 'video':
+        # 图片原图异步落盘，与推理并行
+        persist = io_executor.submit(write_file, source_path, file_bytes, io_stats)
+
+    if cached:
+        # 命中缓存：跳过推理，处理结果以硬链接方式放入永久目录
+        detections = cached['detections']
+        if cached['name']:
+            # 内容寻址文件名：相同结果只保存一份
+            permanent_path = os.path.join(PROCESSED_DIR, cached['name'])
+            if not os.path.exists(permanent_path):
+                io_stats['bytes_copied'] += result_cache.materialize(cached, permanent_path)
         else:
-            tmp_path = process_image(model, source_path)
-
-        # 永久目录
-        os.makedirs(PROCESSED_DIR, exist_ok=True)
-        permanent_filename = f"processed_{session_id}_{os.path.basename(tmp_path)}"
+            permanent_filename = f"processed_{session_id}_{os.path.basename(cached['artifact'])}"
+            permanent_path     = os.path.join(PROCESSED_DIR, permanent_filename)
+            io_stats['bytes_copied'] += result_cache.materialize(cached, permanent_path)
+        timings['cache_hit'] = True
+    else:
+        # 处理结果直接写入永久目录，不再经过 RESULTS_DIR 中转
+        kind = 'video' if file_type == 'video' else 'image'
+        ext = 'mp4' if file_type == 'video' else 'jpg'
+        permanent_filename = f"processed_{session_id}_processed_{kind}_{uuid.uuid4()}.{ext}"
         permanent_path     = os.path.join(PROCESSED_DIR, permanent_filename)
-        shutil.copy2(tmp_path, permanent_path)
-        safe_delete(tmp_path)
-
-        # 写入 session_results
-        execute_query(
+        # -------- 处理模型（常驻模型，避免每次请求重新加载权重） ------------
+        if file_type == 'video':
+            detections, video_stats = inference.detect_video(
+                weight_file, source_path, permanent_path, VIDEO_PREDICT_ARGS,
+                queue_size=VIDEO_QUEUE_SIZE, batch_size=VIDEO_BATCH_SIZE, sampling=VIDEO_MODES[video_mode],
+                encoder=VIDEO_ENCODER
+            )
+            timings.update(video_stats)
+            telemetry.add('model_load', video_stats['model_load_s'])
+            telemetry.add_speed(video_stats['speed'])
+            telemetry.add('annotate', video_stats['annotate']['busy_s'])
+            telemetry.add('encode', video_stats['encode']['busy_s'])
+        else:
+            with telemetry.stage('preprocess'):
+                image = decode_image(file_bytes)
+            detections, speed = inference.detect_image(weight_file, image, permanent_path, IMAGE_PREDICT_ARGS)
+            timings['speed'] = speed
+            telemetry.add_speed(speed)
+        io_stats['bytes_written'] += os.path.getsize(permanent_path)
+        # 重命名为内容寻址文件名（<sha256>.<ext>），URL 随内容变化，可长期缓存
+        permanent_path = content_address(permanent_path)
+        io_stats['bytes_copied'] += result_cache.put(cache_key, permanent_path, detections)
+    if PROCESSED_WEBP_VARIANT and file_type != 'video':
+        create_webp_variant(permanent_path)
+    if not thumbnails.filename_for(permanent_path):
+        thumbnails.create(permanent_path, is_video=file_type == 'video')
+    if persist:
+        persist.result()  # 任务完成前确保原图已落盘
+    timings['io'] = io_stats
+    logging.info(f"Session {session_id} file I/O: {io_stats}")
+
+    # 写入 session_results / session_categories（同一事务，复用一个连接）
+    with transaction() as tx:
+        tx.execute(
             """
             INSERT INTO session_results (session_id, recognition_result, processed_image_path)
             VALUES (%s, %s, %s)
             """,
             (session_id, f"使用{weight_file}模型识别完成", permanent_path)
         )
-
-        # 写入 session_categories（若首次）
-        if not execute_query(
-            "SELECT 1 FROM session_categories WHERE session_id=%s",
-            (session_id,), fetch=True
-        ):
-            category_map = {
-                '烟雾.pt':'smoke_detection','火焰.pt':'fire_detection','人员落水.pt':'person_drowning',
-                '光伏板.pt':'solar_panel_inspection','河道漂浮物.pt':'river_floating_objects',
-                '植物生长.pt':'crop_growth_monitoring','人闯红灯.pt':'pedestrian_red_light',
-                '车闯红灯.pt':'vehicle_red_light','人员摔倒.pt':'person_fall_detection',
-                '景区人流量识别.pt':'scenic_area_crowd'
-            }
-            execute_query(
-                "INSERT INTO session_categories (session_id,detection_category) VALUES (%s,%s)",
-                (session_id, category_map.get(weight_file,'smoke_detection'))
-            )
+        tx.execute(
+            "INSERT IGNORE INTO session_categories (session_id,detection_category) VALUES (%s,%s)",
+            (session_id, CATEGORY_MAP.get(weight_file,'smoke_detection'))
+        )
 
     # 返回 URL 友好路径
-    return jsonify({
+    return {
         "result"    : permanent_path.replace("\\", "/"),
         "session_id": session_id,
-        "message"   : "图片处理完成（自动复用或新建会话）"
-    })
-    
-    # except Exception as e:
-    #     logging.error(f"Error processing file: {str(e)}")
-    #     return jsonify({"error": str(e)}), 500
+        "message"   : "图片处理完成（自动复用或新建会话）",
+        "detections": detections,
+        "timings"   : timings
+    }
+
+
+def _get_owned_job(job_id):
+    """取出当前用户有权查看的任务（管理员可查看全部）"""
+    job = job_queue.get(job_id)
+    if not job:
+        return None
+    if session.get('role') != 'admin' and job.user_id != session.get('user_id'):
+        return None
+    return job
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_job_status(job_id):
+    """查询检测任务状态"""
+    job = _get_owned_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+@require_auth
+def get_job_result(job_id):
+    """获取检测任务结果：完成返回 200，未完成返回 202，失败返回 500"""
+    job = _get_owned_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status == 'done':
+        return jsonify(job.result)
+    if job.status == 'failed':
+        return jsonify({"error": job.error, **job.to_dict()}), 500
+    return jsonify(job.to_dict()), 202
 
 @app.route('/history/<int:session_id>', methods=['DELETE'])
 @require_auth
@@ -495,14 +746,32 @@ def delete_session(session_id):
     if not row:
         return jsonify({'error': '无权删除该会话'}), 403
 
+    results = execute_query(
+        "SELECT processed_image_path FROM session_results WHERE session_id = %s",
+        (session_id,),
+        fetch=True
+    )
     execute_query("DELETE FROM session_users WHERE session_id = %s", (session_id,))
+    chat_context.forget(session_id)
+    image_payloads.forget(session_id)
+
+    # 处理结果按内容寻址，多个会话可能共用同一文件；没有会话再引用时删除其缩略图
+    for path in {r['processed_image_path'] for r in results if r['processed_image_path']}:
+        still_used = execute_query(
+            "SELECT 1 FROM session_results WHERE processed_image_path = %s LIMIT 1",
+            (path,),
+            fetch=True
+        )
+        if not still_used:
+            thumbnails.delete(path)
     return jsonify({'success': True})
 
 @app.route('/analyze', methods=['POST'])
+@telemetry.timed('analyze')
 @require_auth
 @ddos_protection('conversation')
 def analyze_endpoint():
-    """处理大模型分析请求 - 使用豆包视觉模型分析本地图片。"""
+    """处理大模型分析请求 - 使用豆包视觉模型分析本地图片（stream=true 时以 SSE 流式返回）。"""
     data = request.json
     user_query = data.get('userQuery', '这是什么？')
     session_id = data.get('session_id')
@@ -512,25 +781,19 @@ def analyze_endpoint():
         return jsonify({"error": "Missing user query or session ID"}), 400
 
     try:
-        # 从数据库获取处理后的图片路径
-        result_data = execute_query(
-            "SELECT processed_image_path FROM session_results WHERE session_id = %s",
-            (session_id,),
-            fetch=True
-        )
-        
-        if not result_data or not result_data[0]['processed_image_path']:
+        # 处理后图片路径（按会话缓存）
+        processed_image_path = image_payloads.path_for(session_id)
+        if not processed_image_path:
             return jsonify({"error": "No processed image found for this session"}), 404
         
-        processed_image_path = result_data[0]['processed_image_path']
-        
         # 检查文件是否存在
         if not os.path.exists(processed_image_path):
             return jsonify({"error": "Processed image file not found"}), 404
         
-        # 将本地图片转换为base64编码，以便发送给豆包模型
-        with open(processed_image_path, 'rb') as image_file:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+        # 缩放并重新压缩后的 base64 载荷（按文件缓存，多次分析不重复读盘编码）
+        image_url = image_payloads.get_path(processed_image_path)
+        if not image_url:
+            return jsonify({"error": "Processed file cannot be sent to the vision model"}), 400
         
         # 记录用户消息
         if session_id:
@@ -547,34 +810,38 @@ def analyze_endpoint():
                 (session_id, round_id, user_query)
             )
         
-        # 使用豆包视觉模型分析本地图片
-        response = client.chat.completions.create(
-            model="doubao-1.5-vision-lite-250315",  # 豆包视觉模型
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_data}"
-                            },
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
                         },
-                        {"type": "text", "text": user_query},
-                    ],
-                }
-            ],
-        )
+                    },
+                    {"type": "text", "text": user_query},
+                ],
+            }
+        ]
 
-        analysis_result = response.choices[0].message.content
-        clean_result = remove_symbols(analysis_result)
-        
-        # 记录AI响应
-        if session_id:
+        def save_result(clean_result):
+            # 记录AI响应
             execute_query(
                 "INSERT INTO ai_responses (session_id, round_id, response_content) VALUES (%s, %s, %s)",
                 (session_id, round_id, clean_result)
             )
+            return {"processed_image_path": processed_image_path}
+
+        # 流式：逐块清洗并推送，生成结束后写库
+        if wants_stream(data):
+            return sse_response(stream_completion(
+                client, LLM_MODEL, messages, on_complete=save_result, transform=remove_symbols
+            ))
+
+        # 使用豆包视觉模型分析本地图片
+        clean_result = remove_symbols(complete(client, LLM_MODEL, messages))
+        save_result(clean_result)
         
         return jsonify({
             "analysis_result": clean_result,
@@ -585,55 +852,36 @@ def analyze_endpoint():
         logging.error(f"Error analyzing image: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def process_video(model, source_path):
-    """处理视频文件。"""
-    cap = cv2.VideoCapture(source_path)
-    if not cap.isOpened():
-        logging.error(f"Failed to open video file: {source_path}")
-        raise ValueError(f"Failed to open video file: {source_path}")
-
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frames = []
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        results = model.predict(frame, save=False, imgsz=640, conf=0.25, iou=0.45)
-        if results is None or len(results) == 0:
-            logging.error(f"Model prediction failed for frame")
-            raise ValueError(f"Model prediction failed for frame")
-        annotated_frame = results[0].plot()
-        frames.append(annotated_frame)
-
-    cap.release()
-
-    result_file_path = os.path.join(RESULTS_DIR, f'processed_video_{uuid.uuid4()}.mp4')
-    processed_video = ImageSequenceClip(frames, fps=fps)
+def decode_image(file_bytes):
+    """把上传的图片字节直接解码为 BGR ndarray（不经过磁盘）。"""
+    image = cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Failed to decode uploaded image")
+    return image
+
+def write_file(path, data, io_stats=None):
+    """把字节写入文件并计入 I/O 统计。"""
     try:
-        processed_video.write_videofile(result_file_path, codec='libx264')
-        logging.info(f"Video saved successfully: {result_file_path}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        if io_stats is not None:
+            io_stats['bytes_written'] += len(data)
     except Exception as e:
-        logging.error(f"Error saving video: {str(e)}")
-        raise e
-
-    return result_file_path
-
-def process_image(model, source_path):
-    """处理图片文件。"""
-    results = model.predict(source_path, imgsz=640, conf=0.3, iou=0.5)
-    annotated_image = results[0].plot()
-
-    result_file_path = os.path.join(RESULTS_DIR, f'processed_image_{uuid.uuid4()}.jpg')
+        logging.error(f"Failed to write {path}: {str(e)}")
+        raise
 
+def save_stream(stream, path, chunk_size=1 << 20):
+    """把上传流分块写入文件并同时计算 SHA256，返回十六进制哈希。"""
+    h = hashlib.sha256()
     try:
-        cv2.imwrite(result_file_path, annotated_image)
-        logging.info(f"Image saved successfully: {result_file_path}")
+        with open(path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                h.update(chunk)
+                f.write(chunk)
     except Exception as e:
-        logging.error(f"Error saving image: {str(e)}")
-        raise e
-
-    return result_file_path
+        logging.error(f"Failed to write {path}: {str(e)}")
+        raise
+    return h.hexdigest()
 
 def clean_results_dir():
     """清理 RESULTS_DIR 目录中的文件。"""
@@ -682,7 +930,7 @@ def get_user_stats(user_id):
 def reset_all_stats():
     """重置所有用户攻击统计（管理员接口）"""
     try:
-        DDoSDetector.reset_user_stats()
+        DDoSDetector.reset_user_stats(clear_windows=True)
         return jsonify({"message": "All user stats reset successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -756,6 +1004,72 @@ def unban_user(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/admin/model-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_model_stats():
+    """获取常驻模型注册表统计（命中/未命中/加载耗时）"""
+    return jsonify(inference.stats())
+
+@app.route('/admin/cache-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_cache_stats():
+    """获取检测结果缓存统计（命中率、占用空间）"""
+    return jsonify(result_cache.stats())
+
+@app.route('/admin/db-pool-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_db_pool_stats():
+    """获取数据库连接池指标（借出次数、等待时间、大小调整）"""
+    return jsonify(pool_stats())
+
+@app.route('/admin/llm-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_llm_stats():
+    """大模型调用指标（流式 / 阻塞的首 token 时间与生成速度）"""
+    return jsonify(llm_metrics.stats())
+
+@app.route('/admin/image-payload-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_image_payload_stats():
+    """大模型图片载荷缓存命中率与发送流量"""
+    return jsonify(image_payloads.stats())
+
+@app.route('/admin/job-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_job_stats():
+    """获取检测任务队列统计"""
+    return jsonify(job_queue.stats())
+
+@app.route('/admin/scheduler-stats', methods=['GET'])
+@require_auth
+@admin_required
+def get_scheduler_stats():
+    """定时任务运行统计（耗时、失败、重叠）"""
+    return jsonify(scheduler.stats())
+
+@app.route('/admin/telemetry', methods=['GET'])
+@require_auth
+@admin_required
+def get_telemetry():
+    """各接口分阶段耗时分布（总耗时 / 数据库 / 模型加载 / 前处理 / 推理 / 后处理 / 标注 / 编码 / 大模型）"""
+    return jsonify(telemetry.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 文本格式指标（Bearer METRICS_TOKEN，未配置令牌时仅允许本机）"""
+    if METRICS_TOKEN:
+        if not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+            return jsonify({"error": "Unauthorized"}), 401
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({"error": "Forbidden"}), 403
+    return Response(telemetry.prometheus(), mimetype='text/plain; version=0.0.4')
+
 # 在文件末尾添加
 from scheduler import scheduler
 
@@ -766,5 +1080,6 @@ if __name__ == '__main__':
     try:
         app.run(host='0.0.0.0', port=5001, debug=True)
     finally:
-        # 停止定时任务
+        # 停止定时任务和任务队列
         scheduler.stop()
+        job_queue.stop()
@@ -0,0 +1,111 @@
+"""
+require_auth 认证开销基准：对比每个请求直接查库与使用 AuthCache 的数据库调用次数和延迟。
+
+数据库用带固定延迟、容量与连接池一致的模拟实现代替，因此无需 MySQL：
+    cd ai_backend
+    python -m benchmarks.auth_cache_bench --threads 32 --requests 200 --db-latency 2
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FakeDatabase:
+    """模拟 execute_query：固定延迟 + 连接池并发上限，统计调用次数"""
+
+    def __init__(self, latency_ms=2.0, pool_size=10):
+        self.latency = latency_ms / 1000
+        self.pool = threading.Semaphore(pool_size)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def execute_query(self, query, params=None, fetch=False):
+        with self._lock:
+            self.calls += 1
+        with self.pool:
+            time.sleep(self.latency)
+        if "banned_users" in query:
+            return []  # 未封禁
+        return [{"1": 1}] if fetch else 1
+
+    def transaction(self):
+        raise NotImplementedError("transactions are not simulated")
+
+
+def install_fake_database(db):
+    """在导入业务模块之前替换 config.database，避免连接真实 MySQL"""
+    module = types.ModuleType("config.database")
+    module.execute_query = db.execute_query
+    module.transaction = db.transaction
+    package = types.ModuleType("config")
+    package.database = module
+    sys.modules["config"] = package
+    sys.modules["config.database"] = module
+
+
+def run(check, threads, requests, users):
+    """并发执行 check(user_id)，返回每个请求的耗时（毫秒）"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(i):
+        for n in range(requests):
+            t0 = time.perf_counter()
+            check((i * requests + n) % users + 1)
+            dt = (time.perf_counter() - t0) * 1e3
+            with lock:
+                latencies.append(dt)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return latencies
+
+
+def summarize(name, latencies, db_calls):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<10} requests={len(latencies):<7} db_calls/req={db_calls / len(latencies):.2f}  "
+        f"p50={statistics.median(latencies):.2f}ms  p99={p99:.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32, help="并发线程数")
+    parser.add_argument("--requests", type=int, default=200, help="每个线程的请求数")
+    parser.add_argument("--users", type=int, default=50, help="不同用户数")
+    parser.add_argument("--db-latency", type=float, default=2.0, help="单次查询延迟（毫秒）")
+    parser.add_argument("--pool-size", type=int, default=10, help="连接池大小")
+    parser.add_argument("--ttl", type=float, default=30, help="缓存 TTL（秒）")
+    args = parser.parse_args()
+
+    db = FakeDatabase(args.db_latency, args.pool_size)
+    install_fake_database(db)
+    from modules.auth_cache import AuthCache
+    from modules.user_manager import UserManager
+
+    def uncached(user_id):
+        # 与原 require_auth 相同的查询序列
+        db.execute_query("SELECT 1 FROM user_names WHERE user_id = %s", (user_id,), fetch=True)
+        UserManager.is_user_banned(user_id)
+
+    cache = AuthCache(ttl=args.ttl)
+
+    def cached(user_id):
+        cache.user_exists(user_id, "user")
+        cache.ban_state(user_id)
+
+    for name, check in (("uncached", uncached), ("cached", cached)):
+        db.calls = 0
+        latencies = run(check, args.threads, args.requests, args.users)
+        summarize(name, latencies, db.calls)
+    print(f"cache stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
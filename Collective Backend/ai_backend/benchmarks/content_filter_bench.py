@@ -0,0 +1,109 @@
+"""
+敏感词匹配基准：逐类别 any(kw in text)（旧实现）对比 Aho–Corasick 自动机。
+
+用法（在 ai_backend 目录下）：
+    python -m benchmarks.content_filter_bench --keywords 10000 --messages 2000
+"""
+import argparse
+import random
+import time
+
+from modules.aho_corasick import AhoCorasick
+
+CATEGORIES = ("涉黄内容", "暴力内容", "政治敏感", "赌博相关", "毒品相关", "恐怖主义",
+              "诈骗欺诈", "仇恨言论", "隐私泄露", "非法交易", "邪教相关", "其他敏感")
+CHECKED = ("涉黄内容", "暴力内容", "政治敏感")  # check_text 返回的三个标志对应的类别
+
+
+def random_word(rng, lo=2, hi=6):
+    return "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(lo, hi)))
+
+
+def make_data(n_keywords, n_messages, length, hit_rate, seed=0):
+    """随机中文关键词与消息，hit_rate 比例的消息中插入一个关键词"""
+    rng = random.Random(seed)
+    keywords = {}
+    while len(keywords) < n_keywords:
+        keywords[random_word(rng)] = rng.choice(CATEGORIES)
+    by_category = {}
+    for keyword, category in keywords.items():
+        by_category.setdefault(category, []).append(keyword)
+
+    all_keywords = list(keywords)
+    messages = []
+    for _ in range(n_messages):
+        text = random_word(rng, length, length)
+        if rng.random() < hit_rate:
+            pos = rng.randint(0, len(text))
+            text = text[:pos] + rng.choice(all_keywords) + text[pos:]
+        messages.append(text)
+    return keywords, by_category, messages
+
+
+def check_naive(by_category, text):
+    """旧实现：每个类别单独扫描一遍"""
+    return tuple(any(kw in text for kw in by_category.get(c, [])) for c in CHECKED)
+
+
+def check_automaton(automaton, text):
+    matched = {c for _, _, _, cats in automaton.iter_matches(text) for c in cats}
+    return tuple(c in matched for c in CHECKED)
+
+
+def run(n_keywords=10000, n_messages=2000, length=200, hit_rate=0.2):
+    keywords, by_category, messages = make_data(n_keywords, n_messages, length, hit_rate)
+
+    t0 = time.perf_counter()
+    automaton = AhoCorasick()
+    for keyword, category in keywords.items():
+        automaton.add(keyword, category)
+    automaton.build()
+    build_s = time.perf_counter() - t0
+
+    # 增量更新：增删 1% 的关键词后重建失配链接
+    t0 = time.perf_counter()
+    changed = list(keywords.items())[: max(1, n_keywords // 100)]
+    for keyword, category in changed:
+        automaton.remove(keyword, category)
+    for keyword, category in changed:
+        automaton.add(keyword, category)
+    automaton.build()
+    incremental_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    naive = [check_naive(by_category, m) for m in messages]
+    naive_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast = [check_automaton(automaton, m) for m in messages]
+    fast_s = time.perf_counter() - t0
+
+    assert naive == fast, "automaton results differ from the naive implementation"
+    return {
+        "keywords": n_keywords,
+        "messages": n_messages,
+        "build_ms": build_s * 1e3,
+        "incremental_1pct_ms": incremental_s * 1e3,
+        "naive_us_per_msg": naive_s / n_messages * 1e6,
+        "automaton_us_per_msg": fast_s / n_messages * 1e6,
+        "speedup": naive_s / fast_s if fast_s else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=200, help="消息长度（字符）")
+    parser.add_argument("--hit-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'keywords':>9} {'build ms':>9} {'incr ms':>8} {'naive us/msg':>13} {'AC us/msg':>10} {'speedup':>8}")
+    for n in args.keywords:
+        r = run(n, args.messages, args.length, args.hit_rate)
+        print(f"{r['keywords']:>9} {r['build_ms']:>9.1f} {r['incremental_1pct_ms']:>8.1f} "
+              f"{r['naive_us_per_msg']:>13.1f} {r['automaton_us_per_msg']:>10.1f} {r['speedup']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+本地 OpenAI 兼容的假大模型服务，用于测试和对比流式 / 阻塞调用（不访问外网）。
+
+用法（在 ai_backend 目录下）：
+    python -m benchmarks.fake_openai_server --compare
+    python -m benchmarks.fake_openai_server --port 8765 --serve
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIServer:
+    """
+    POST /v1/chat/completions 的最小实现：
+    按 first_token_delay 延迟后每 token_delay 秒输出一个 token，支持 stream=true（SSE）与阻塞两种模式。
+    """
+
+    def __init__(self, reply="这是一张包含*目标*的#检测#结果图片。", first_token_delay=0.2, token_delay=0.02,
+                 host="127.0.0.1", port=0):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests = []  # 收到的请求体
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tokens(self):
+        """按字切分回复（中文一字约一 token）"""
+        return list(self.reply)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests.append(body)
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._blocking(body)
+
+            def _blocking(self, body):
+                tokens = server.tokens()
+                time.sleep(server.first_token_delay + server.token_delay * (len(tokens) - 1))
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                time.sleep(server.first_token_delay)
+                for i, token in enumerate(server.tokens()):
+                    if i:
+                        time.sleep(server.token_delay)
+                    self._event({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                    })
+                self._event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                })
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, data):
+                self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+
+def compare(runs=5, **kwargs):
+    """对比流式与阻塞调用的首 token 时间和生成速度"""
+    from openai import OpenAI
+
+    from modules.llm_stream import LLMMetrics, complete, stream_completion
+    import modules.llm_stream as llm_stream
+
+    llm_stream.llm_metrics = metrics = LLMMetrics()
+    messages = [{"role": "user", "content": "这是什么？"}]
+    with FakeOpenAIServer(**kwargs) as server:
+        client = OpenAI(base_url=server.base_url, api_key="fake")
+        for _ in range(runs):
+            complete(client, "fake", messages)
+            for _ in stream_completion(client, "fake", messages):
+                pass
+    return metrics.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--serve", action="store_true", help="持续运行，供 OPENAI base_url 指向")
+    parser.add_argument("--compare", action="store_true", help="对比流式与阻塞模式")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    delays = dict(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+
+    if args.compare:
+        for mode, s in compare(args.runs, **delays).items():
+            print(f"{mode:9s} calls={s['calls']} ttft avg={s['ttft_ms_avg']}ms p95={s['ttft_ms_p95']}ms "
+                  f"total avg={s['total_ms_avg']}ms tokens/s avg={s['tokens_per_s_avg']}")
+    if args.serve:
+        server = FakeOpenAIServer(port=args.port, **delays)
+        print(f"Fake OpenAI server listening on {server.base_url}")
+        try:
+            server._server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
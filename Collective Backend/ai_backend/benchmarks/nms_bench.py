@@ -0,0 +1,72 @@
+"""
+NMS 微基准：逐图循环（旧实现）对比整批一次 NMS，覆盖不同批大小和候选框数量，并与 NumPy/Numba CPU 实现对比。
+
+用法（在 ai_backend 目录下，需要 torch）：
+    python -m benchmarks.nms_bench --batch-sizes 1 8 32 --candidates 1000 8400 --device cpu
+"""
+import argparse
+import time
+
+import torch
+
+from utils.ops import nms, nms_cpu, non_max_suppression
+
+
+def make_prediction(bs, candidates, nc, device, seed=0):
+    """模型原始输出格式 (bs, 4 + nc, candidates)：xywh + 各类别分数"""
+    g = torch.Generator().manual_seed(seed)
+    pred = torch.rand(bs, 4 + nc, candidates, generator=g)
+    pred[:, :2] *= 640
+    pred[:, 2:4] = pred[:, 2:4] * 120 + 4
+    pred[:, 4:] = pred[:, 4:] ** 3  # 多数候选分数较低，接近真实分布
+    return pred.to(device)
+
+
+def timeit(fn, repeat, device):
+    fn()  # 预热
+    if device.startswith("cuda"):
+        torch.cuda.synchronize()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    if device.startswith("cuda"):
+        torch.cuda.synchronize()
+    return (time.perf_counter() - t0) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1000, 8400])
+    parser.add_argument("--nc", type=int, default=4, help="类别数")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'cands':>6} {'kept':>6} {'loop ms':>8} {'batched ms':>11} {'speedup':>8} "
+          f"{'nms ms':>7} {'cpu nms ms':>11}")
+    for bs in args.batch_sizes:
+        for n in args.candidates:
+            pred = make_prediction(bs, n, args.nc, args.device)
+
+            def run(batched):
+                return non_max_suppression(pred, args.conf, args.iou, in_place=False, batched=batched)
+
+            kept = sum(len(x) for x in run(True))
+            loop_ms = timeit(lambda: run(False), args.repeat, args.device)
+            batched_ms = timeit(lambda: run(True), args.repeat, args.device)
+
+            # 单次 NMS 调用本身：默认实现（torchvision）对比 NumPy/Numba
+            boxes = pred[0, :4].T.clone()
+            boxes[:, 2:] += boxes[:, :2]
+            scores = pred[0, 4:].amax(0)
+            nms_ms = timeit(lambda: nms(boxes, scores, args.iou), args.repeat, args.device)
+            cpu_ms = timeit(lambda: nms_cpu(boxes, scores, args.iou), args.repeat, args.device)
+            print(f"{bs:>6} {n:>6} {kept:>6} {loop_ms:>8.2f} {batched_ms:>11.2f} {loop_ms / batched_ms:>7.1f}x "
+                  f"{nms_ms:>7.2f} {cpu_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+预测上下文池基准：多个线程并发提交单张图片推理，对比旧实现（同一模型的请求在一把锁上串行）
+与 PredictorPool（N 个共享权重的上下文，可选动态批），输出吞吐量、p50/p99 延迟、平均批大小和超出 SLO 的请求数。
+--rate > 0 时按泊松过程以该速率（张/秒）提交请求（开环负载），否则 --threads 个线程连续提交。
+
+用法（在 ai_backend 目录下，需要 torch 与权重文件）：
+    python -m benchmarks.predictor_pool_bench --weights weights/烟雾.pt --threads 8 --pool-sizes 1 2 4
+    python -m benchmarks.predictor_pool_bench --weights weights/烟雾.pt --micro-batch 8 --wait-ms 5
+    python -m benchmarks.predictor_pool_bench --weights weights/烟雾.pt --micro-batch 8 --slo-ms 200 --rate 5 50 200
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ultralytics import YOLO
+
+from modules.predictor_pool import PredictorPool
+
+
+class _Locked:
+    """旧实现：整个 predict 调用持有同一把锁"""
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def predict(self, source, **kwargs):
+        with self.lock:
+            return self.model.predict(source, **kwargs)
+
+
+def run(predictor, images, threads, rate=0.0, **predict_args):
+    def one(image):
+        t0 = time.perf_counter()
+        predictor.predict(image, **predict_args)
+        return (time.perf_counter() - t0) * 1e3
+
+    with ThreadPoolExecutor(threads if rate <= 0 else len(images)) as pool:
+        list(pool.map(one, images[:threads]))  # 预热
+        t0 = time.perf_counter()
+        if rate > 0:
+            futures = []
+            for image in images:
+                futures.append(pool.submit(one, image))
+                time.sleep(random.expovariate(rate))
+            latencies = sorted(f.result() for f in futures)
+        else:
+            latencies = sorted(pool.map(one, images))
+        wall = time.perf_counter() - t0
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return len(images) / wall, statistics.median(latencies), p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--size", default="1280x720", help="图片尺寸 宽x高")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--micro-batch", type=int, default=1)
+    parser.add_argument("--wait-ms", type=float, default=2.0)
+    parser.add_argument("--slo-ms", type=float, default=None, help="动态批的 p99 延迟目标")
+    parser.add_argument("--rate", type=float, nargs="+", default=[0.0], help="开环请求速率（张/秒），0 表示连续提交")
+    parser.add_argument("--device", default=None)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split("x"))
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(args.requests)]
+    model = YOLO(args.weights)
+    predict_args = dict(imgsz=640, device=args.device, verbose=False)
+    model.predict(images[0], **predict_args)
+
+    random.seed(0)
+    print(f"{'mode':>16} {'rate':>6} {'img/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'avg batch':>9} {'SLO miss':>8}")
+    for rate in args.rate:
+        rows = [("locked", _Locked(model))]
+        rows += [(f"pool={n} batch={args.micro_batch}",
+                  PredictorPool(model, size=n, max_batch=args.micro_batch, max_wait_ms=args.wait_ms,
+                                slo_ms=args.slo_ms))
+                 for n in args.pool_sizes]
+        for name, predictor in rows:
+            throughput, p50, p99 = run(predictor, images, args.threads, rate, **predict_args)
+            batching = predictor.stats()["batching"] if isinstance(predictor, PredictorPool) else None
+            avg_batch, missed = (batching["avg_batch"], batching["slo_violations"]) if batching else (1.0, "-")
+            print(f"{name:>16} {rate:>6.0f} {throughput:>7.1f} {p50:>7.1f} {p99:>7.1f} {avg_batch:>9.2f} {missed:>8}")
+            if isinstance(predictor, PredictorPool):
+                predictor.close()
+
+
+if __name__ == "__main__":
+    main()
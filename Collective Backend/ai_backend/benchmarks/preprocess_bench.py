@@ -0,0 +1,64 @@
+"""
+预处理基准：逐批新建数组（旧实现）对比复用预分配输入缓冲区的融合预处理（letterbox → RGB → CHW → 归一化）。
+结果取自 Results.speed["preprocess"]，即预测器自带的 preprocess 计时；预测器与推理服务相同（modules.detect_predictor），
+通过 fused_preprocess 切换两条路径。
+
+用法（在 ai_backend 目录下，需要 torch 与权重文件）：
+    python -m benchmarks.preprocess_bench --weights weights/烟雾.pt --size 1920x1080 --batch 8
+"""
+import argparse
+import statistics
+
+import numpy as np
+
+from ultralytics import YOLO
+
+from modules.detect_predictor import accelerated
+
+
+def make_predictor(model, **predict_args):
+    """与 PredictorPool 相同的方式创建预测器"""
+    args = {**model.overrides, "conf": 0.25, "save": False, "mode": "predict", "verbose": False, **predict_args}
+    predictor = accelerated(model._smart_load("predictor"))(overrides=args, _callbacks=model.callbacks)
+    predictor.setup_model(model=model.model, verbose=False)
+    return predictor
+
+
+def run(predictor, frames, batch, rounds, fused):
+    """每张图片的 preprocess 耗时中位数（毫秒），第一轮作为预热"""
+    predictor.fused_preprocess = fused
+    times = []
+    for _ in range(rounds):
+        for i in range(0, len(frames), batch):
+            results = predictor(source=frames[i:i + batch], stream=False)
+            times.extend(r.speed["preprocess"] for r in results)
+    return statistics.median(times[len(frames):] or times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--size", default="1920x1080", help="帧尺寸 宽x高")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--half", action="store_true")
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split("x"))
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(args.frames)]
+    predictor = make_predictor(YOLO(args.weights), imgsz=640, device=args.device, half=args.half)
+    if not hasattr(predictor, "fused_preprocess"):
+        raise SystemExit(f"{type(predictor).__name__} has no fused preprocess path (only detection models)")
+
+    print(f"{'batch':>6} {'legacy ms/img':>14} {'fused ms/img':>13} {'speedup':>8}")
+    for batch in args.batch:
+        legacy = run(predictor, frames, batch, args.rounds, False)
+        fused = run(predictor, frames, batch, args.rounds, True)
+        print(f"{batch:>6} {legacy:>14.2f} {fused:>13.2f} {legacy / fused:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
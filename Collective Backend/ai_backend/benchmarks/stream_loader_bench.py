@@ -0,0 +1,115 @@
+"""
+多路视频流读取基准：LoadStreams 按就绪的流组批（环形缓冲区 + 截止时间），统计每批包含的流数、组批等待时间，
+以及各路流的采集/交付/丢弃帧数和交付时的帧延迟。
+
+可加入一路限速的慢流（--slow-fps），观察它不再拖慢其它流：
+    cd ai_backend
+    python -m benchmarks.stream_loader_bench --streams 8 --seconds 10 --slow-fps 2
+    python -m benchmarks.stream_loader_bench --sources rtsp://cam1/live rtsp://cam2/live --policy drop-newest --buffer
+不指定 --sources 时生成合成的测试视频作为流（文件流按解码速度读取，相当于高帧率摄像头）。
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from data.loaders import LoadStreams  # 本仓库的 LoadStreams（环形缓冲区与按截止时间组批），上游没有这些参数
+
+
+class _SlowCapture:
+    """包装 VideoCapture，每次 grab 前休眠，模拟帧率低或网络卡顿的摄像头"""
+
+    def __init__(self, cap, fps):
+        self.cap = cap
+        self.interval = 1 / fps
+
+    def grab(self):
+        time.sleep(self.interval)
+        return self.cap.grab()
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+def synthetic_video(path, frames, width, height):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (width, height))
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame[:] = i % 256
+        writer.write(frame)
+    writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", nargs="+", help="流地址（默认使用合成视频）")
+    parser.add_argument("--streams", type=int, default=8, help="合成流数量")
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--frames", type=int, default=3000, help="每路合成视频的帧数")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--slow-fps", type=float, default=0, help="第一路流限速到该帧率（0 表示不限速）")
+    parser.add_argument("--buffer", action="store_true", help="按顺序交付缓冲的每一帧（默认只取最新帧）")
+    parser.add_argument("--capacity", type=int, default=30)
+    parser.add_argument("--policy", default=None, choices=["drop-oldest", "drop-newest", "block"])
+    parser.add_argument("--deadline-ms", type=float, default=None)
+    parser.add_argument("--infer-ms", type=float, default=20, help="模拟每批推理耗时")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = args.sources
+        if not sources:
+            width, height = map(int, args.size.split("x"))
+            sources = [os.path.join(tmp, f"stream{i}.avi") for i in range(args.streams)]
+            for path in sources:
+                synthetic_video(path, args.frames, width, height)
+        listing = os.path.join(tmp, "list.streams")
+        with open(listing, "w") as f:
+            f.write("\n".join(sources))
+
+        if args.slow_fps:
+            # 只替换第一路的 VideoCapture
+            original, created = cv2.VideoCapture, []
+
+            def capture(source):
+                cap = original(source) if created else _SlowCapture(original(source), args.slow_fps)
+                created.append(cap)
+                return cap
+
+            cv2.VideoCapture = capture
+        dataset = LoadStreams(
+            listing,
+            buffer=args.buffer,
+            capacity=args.capacity,
+            policy=args.policy,
+            deadline=args.deadline_ms / 1000 if args.deadline_ms is not None else None,
+        )
+        if args.slow_fps:
+            cv2.VideoCapture = original
+
+        sizes, waits = [], []
+        start = time.perf_counter()
+        t0 = start
+        for paths, images, _ in dataset:
+            waits.append((time.perf_counter() - t0) * 1e3)
+            sizes.append(len(images))
+            time.sleep(args.infer_ms / 1000)
+            t0 = time.perf_counter()
+            if t0 - start > args.seconds:
+                break
+        elapsed = time.perf_counter() - start
+        stats = dataset.stats()
+        dataset.close()
+
+    print(f"batches: {len(sizes)} ({len(sizes) / elapsed:.1f}/s), streams per batch: avg {statistics.mean(sizes):.2f}, "
+          f"min {min(sizes)}; batch wait ms: p50 {statistics.median(waits):.1f}, max {max(waits):.1f}")
+    print(f"{'stream':>6} {'captured':>9} {'delivered':>10} {'dropped':>8} {'depth':>6} {'lag ms':>7}")
+    for i, s in enumerate(stats):
+        print(f"{i:>6} {s['captured']:>9} {s['delivered']:>10} {s['dropped']:>8} {s['depth']:>6} {s['lag_ms']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+视频编码后端基准：同一段视频分别用 ffmpeg 管道、cv2.VideoWriter、moviepy 写入，
+并与旧实现（全部帧收集到列表后交给 moviepy ImageSequenceClip）对比墙钟时间和峰值内存。
+
+每个后端在独立子进程中运行，峰值 RSS 分别统计 Python 进程和 ffmpeg 子进程。
+不指定 --video 时使用合成的测试片段：
+    cd ai_backend
+    python -m benchmarks.video_encoder_bench --frames 600 --size 1280x720
+    python -m benchmarks.video_encoder_bench --video demo.mp4 --preset veryfast --crf 23
+"""
+import argparse
+import json
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from modules.video_encoders import ENCODERS, open_encoder
+
+BASELINE = "imageseq"
+
+
+def synthetic_frames(n, width, height):
+    """移动色块的合成片段：每帧内容不同，编码器无法跳过"""
+    base = np.zeros((height, width, 3), dtype=np.uint8)
+    base[:, :, 0] = np.linspace(0, 255, width, dtype=np.uint8)
+    base[:, :, 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    for i in range(n):
+        frame = base.copy()
+        x = i * 7 % max(1, width - 100)
+        y = i * 3 % max(1, height - 100)
+        frame[y:y + 100, x:x + 100] = (0, 0, 255)
+        cv2.putText(frame, str(i), (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        yield frame
+
+
+def video_frames(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def encode(backend, frames, output, fps, preset, crf, queue_size=8):
+    """生产者线程经有界队列把帧交给编码器（与 VideoPipeline 的编码阶段相同）"""
+    if backend == BASELINE:
+        from moviepy.editor import ImageSequenceClip
+
+        clip = ImageSequenceClip([cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in frames], fps=fps)
+        clip.write_videofile(output, codec="libx264", preset=preset, ffmpeg_params=["-crf", str(crf)], logger=None)
+        return BASELINE
+
+    q = queue.Queue(maxsize=queue_size)
+
+    def produce():
+        for f in frames:
+            q.put(f)
+        q.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    writer = None
+    while True:
+        frame = q.get()
+        if frame is None:
+            break
+        if writer is None:
+            writer = open_encoder(output, (frame.shape[1], frame.shape[0]), fps, backend, preset=preset, crf=crf)
+        writer.write(frame)
+    writer.close()
+    return writer.name
+
+
+def child(args):
+    width, height = map(int, args.size.split("x"))
+    frames = video_frames(args.video) if args.video else synthetic_frames(args.frames, width, height)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "out.mp4")
+        t0 = time.perf_counter()
+        used = encode(args.child, frames, output, args.fps, args.preset, args.crf)
+        wall = time.perf_counter() - t0
+        size = os.path.getsize(output)
+    print(json.dumps({
+        "backend": used,
+        "wall_s": wall,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "ffmpeg_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "size_kb": size / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="测试视频（默认使用合成片段）")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--preset", default="veryfast")
+    parser.add_argument("--crf", type=int, default=23)
+    parser.add_argument("--backends", nargs="+", default=[*ENCODERS, BASELINE])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+
+    print(f"{'backend':>9} {'used':>8} {'wall s':>7} {'py RSS MB':>10} {'ffmpeg RSS MB':>14} {'size KB':>8}")
+    for backend in args.backends:
+        cmd = [sys.executable, "-m", "benchmarks.video_encoder_bench", "--child", backend,
+               "--frames", str(args.frames), "--size", args.size, "--fps", str(args.fps),
+               "--preset", args.preset, "--crf", str(args.crf)]
+        if args.video:
+            cmd += ["--video", args.video]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{backend:>9} failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{backend:>9} {r['backend']:>8} {r['wall_s']:>7.2f} {r['rss_mb']:>10.1f} "
+              f"{r['ffmpeg_rss_mb']:>14.1f} {r['size_kb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+视频检测模式基准：逐个运行 video_sampling.VIDEO_MODES，报告处理帧率、推理帧占比，
+并以 full 模式逐帧推理的检测框为参照，计算每个输出帧的召回率 / 精确率（IoU >= 0.5，同类别）。
+
+用法（在 ai_backend 目录下，需要 torch 与权重文件）：
+    python -m benchmarks.video_modes_bench --video demo.mp4 --weights weights/烟雾.pt
+"""
+import argparse
+import os
+import tempfile
+
+import cv2
+
+from modules.video_pipeline import VideoPipeline
+from modules.video_sampling import VIDEO_MODES, match_boxes
+
+
+def run_mode(model, video, mode, batch_size=8):
+    pipeline = VideoPipeline(model, batch_size=batch_size, record_boxes=True, **VIDEO_MODES[mode])
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = pipeline.run(video, os.path.join(tmp, f"{mode}.mp4"))
+    return stats, pipeline.frame_boxes
+
+
+def accuracy(reference, boxes, scale, source_index, iou_thres=0.5):
+    """把输出帧对齐到源视频帧并缩放回原分辨率后，统计匹配的框数"""
+    tp = n_pred = n_ref = 0
+    for i, pred in enumerate(boxes):
+        ref = reference[min(source_index(i), len(reference) - 1)]
+        pred = pred.copy()
+        pred[:, :4] /= scale
+        tp += len(match_boxes(ref, pred, iou_thres))
+        n_pred += len(pred)
+        n_ref += len(ref)
+    recall = tp / n_ref if n_ref else 1.0
+    precision = tp / n_pred if n_pred else 1.0
+    return recall, precision
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=list(VIDEO_MODES))
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.weights)
+    cap = cv2.VideoCapture(args.video)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    cap.release()
+
+    _, reference = run_mode(model, args.video, "full", args.batch_size)  # 预热并得到参照结果
+    print(f"{'mode':>10} {'frames':>7} {'inferred':>9} {'wall s':>7} {'src fps':>7} {'recall':>7} {'precision':>9}")
+    for mode in args.modes:
+        stats, boxes = run_mode(model, args.video, mode, args.batch_size)
+        scale = stats["mode"]["output_size"][0] / width
+        ratio = fps / stats["mode"]["output_fps"]  # 每个输出帧对应的源帧数
+        recall, precision = accuracy(reference, boxes, scale, lambda i: int(round(i * ratio)))
+        print(f"{mode:>10} {stats['frames']:>7} {stats['sampled_frames']:>9} {stats['wall_s']:>7.2f} "
+              f"{len(reference) / stats['wall_s']:>7.1f} {recall:>7.3f} {precision:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
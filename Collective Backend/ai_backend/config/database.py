@@ -1,6 +1,9 @@
 import mysql.connector
 from mysql.connector import pooling
 import logging
+import threading
+import time
+from collections import Counter, deque
 from contextlib import contextmanager
 
 # 数据库配置
@@ -14,18 +17,248 @@ DB_CONFIG = {
     'autocommit': True
 }
 
+# 连接池配置
+POOL_SIZE = 10  # 初始大小
+POOL_MIN_SIZE = 5
+POOL_MAX_SIZE = 32  # mysql-connector 单个连接池上限
+POOL_TIMEOUT = 5.0  # 连接池耗尽时最长等待时间（秒）
+POOL_TARGET_WAIT_MS = 20  # 等待时间 p95 超过该值时扩容
+POOL_RESIZE_INTERVAL = 60  # 两次调整之间的最短间隔（秒）
+
+
+class PoolMetrics:
+    """连接池指标：借出次数、等待时间、占用峰值、耗尽次数"""
+
+    def __init__(self, window=1000):
+        self.checkouts = 0
+        self.timeouts = 0  # 等待超时（连接池耗尽）次数
+        self.waited = 0  # 需要等待的借出次数
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0  # 自上次调整以来的占用峰值
+        self.resizes = 0
+        self.recent_waits = deque(maxlen=window)  # 最近的等待时间（秒）
+        self.lock = threading.Lock()
+
+    def checkout(self, wait, retried):
+        with self.lock:
+            self.checkouts += 1
+            self.waited += int(retried)
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.recent_waits.append(wait)
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checkin(self):
+        with self.lock:
+            self.in_use -= 1
+
+    def wait_percentile(self, q):
+        with self.lock:
+            waits = sorted(self.recent_waits)
+        return waits[min(len(waits) - 1, int(len(waits) * q))] if waits else 0.0
+
+
+class AdaptivePool:
+    """
+    可按等待时间自动调整大小的连接池。
+    mysql-connector 的连接池创建后无法改变大小，调整时新建连接池替换旧池。
+    调整在后台线程中进行，请求线程只发出调整信号；替换后立即借出并断开旧池中的空闲连接，
+    旧池借出的连接归还时直接断开、不再放回旧池，新池大小受 POOL_MAX_SIZE 减去旧池未归还连接数的限制，
+    各代连接池打开的连接总数不超过 POOL_MAX_SIZE。只使用 mysql-connector 的公开接口。
+    第一个连接池在首次借出连接时创建，导入本模块不需要数据库在线。
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.metrics = PoolMetrics()
+        self._generation = 0
+        self._last_resize = time.monotonic()
+        self._lock = threading.Lock()
+        self._outstanding = Counter()  # 连接池名 -> 借出未归还的连接数
+        self._retired = {}  # 连接池名 -> 仍有借出连接的旧连接池
+        self._force_resize = False
+        self._resize_event = threading.Event()
+        self._initial_size = size
+        self.pool = None
+        threading.Thread(target=self._resize_loop, name="db-pool-resize", daemon=True).start()
+
+    @property
+    def size(self):
+        pool = self.pool
+        return pool.pool_size if pool is not None else self._initial_size
+
+    def _create(self, size):
+        self._generation += 1
+        return pooling.MySQLConnectionPool(
+            pool_name=f"ai_pool_{self._generation}",
+            pool_size=size,
+            pool_reset_session=True,
+            **DB_CONFIG
+        )
+
+    def get_connection(self):
+        """借出连接；连接池耗尽时退避重试，超过 POOL_TIMEOUT 抛出 PoolError"""
+        start = time.perf_counter()
+        delay, retried = 0.001, False
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = self._create(self._initial_size)
+        while True:
+            try:
+                connection = self.pool.get_connection()
+                break
+            except mysql.connector.errors.PoolError:
+                if time.perf_counter() - start > POOL_TIMEOUT:
+                    with self.metrics.lock:
+                        self.metrics.timeouts += 1
+                    logging.error(f"Database pool exhausted (size={self.size}) after {POOL_TIMEOUT}s")
+                    self.maybe_resize(force=True)
+                    raise
+                retried = True
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        with self._lock:
+            self._outstanding[connection.pool_name] += 1
+        self.metrics.checkout(time.perf_counter() - start, retried)
+        if retried:
+            self.maybe_resize()
+        return connection
+
+    def release(self, connection):
+        """归还连接；属于已替换的旧池时直接断开，不再放回旧池"""
+        self.metrics.checkin()
+        name = connection.pool_name
+        with self._lock:
+            self._outstanding[name] -= 1
+            retired = name in self._retired
+            if retired and self._outstanding[name] <= 0:
+                del self._retired[name]
+                del self._outstanding[name]
+        if retired:
+            self._disconnect(connection)
+        elif connection.is_connected():
+            connection.close()
+
+    @staticmethod
+    def _disconnect(connection):
+        """断开池化连接底层的数据库连接（PooledMySQLConnection.close() 只会把连接放回连接池）"""
+        try:
+            connection.disconnect()
+        except mysql.connector.Error:
+            pass  # 连接已失效
+
+    def _close_idle(self, pool):
+        """借出并断开连接池中的全部空闲连接，返回断开的数量"""
+        closed = 0
+        while True:
+            try:
+                connection = pool.get_connection()
+            except mysql.connector.Error:  # PoolError：已无空闲连接
+                return closed
+            self._disconnect(connection)
+            closed += 1
+
+    def maybe_resize(self, force=False):
+        """请求后台线程检查是否需要调整连接池大小，不阻塞调用方"""
+        if force:
+            self._force_resize = True
+        self._resize_event.set()
+
+    def _resize_loop(self):
+        # 每 POOL_RESIZE_INTERVAL 秒检查一次（空闲时也能缩容），收到信号时提前检查
+        while True:
+            self._resize_event.wait(POOL_RESIZE_INTERVAL)
+            self._resize_event.clear()
+            force, self._force_resize = self._force_resize, False
+            if not force and time.monotonic() - self._last_resize < POOL_RESIZE_INTERVAL:
+                continue
+            try:
+                self._resize(force)
+            except Exception as e:
+                logging.error(f"Failed to resize database pool: {e}")
+
+    def _resize(self, force):
+        """根据最近等待时间与占用峰值调整连接池大小，只在后台线程中调用"""
+        if self.pool is None:
+            return
+        size = self.size
+        p95_ms = self.metrics.wait_percentile(0.95) * 1e3
+        peak = self.metrics.peak_in_use
+        self._last_resize = time.monotonic()
+        with self.metrics.lock:
+            self.metrics.peak_in_use = self.metrics.in_use
+        if force or p95_ms > POOL_TARGET_WAIT_MS:
+            # 各代连接池借出未归还的连接仍占用数据库连接，新池只能用剩下的额度
+            with self._lock:
+                held = sum(self._outstanding.values())
+            new_size = min(max(size + 1, int(size * 1.5)), POOL_MAX_SIZE - held)
+            if new_size <= size:
+                logging.warning(f"Database pool cannot grow beyond {size} ({held} connections still checked out)")
+                return
+        elif peak < size // 2:
+            new_size = max(POOL_MIN_SIZE, peak * 2)
+            if new_size >= size:
+                return
+        else:
+            return
+        old, pool = self.pool, self._create(new_size)
+        with self._lock:
+            self.pool = pool
+            # 旧池借出的连接归还时由 release 断开，全部归还后丢弃旧池
+            self._retired = {name: p for name, p in self._retired.items() if self._outstanding[name] > 0}
+            self._retired[old.pool_name] = old
+        # 之后归还的旧池连接由 release 断开；此前已归还的在这里断开
+        closed = self._close_idle(old)
+        with self.metrics.lock:
+            self.metrics.resizes += 1
+            self.metrics.recent_waits.clear()
+        logging.info(
+            f"Database pool resized {size} -> {new_size} (p95 wait {p95_ms:.1f}ms), "
+            f"closed {closed} idle connections of {old.pool_name}"
+        )
+
+    def stats(self):
+        """连接池指标"""
+        m = self.metrics
+        p50, p95 = m.wait_percentile(0.5), m.wait_percentile(0.95)
+        with self._lock:
+            retired = sum(self._outstanding[name] for name in self._retired)
+        with m.lock:
+            return {
+                "size": self.size,
+                "retired_in_use": retired,  # 旧池借出未归还的连接数
+                "in_use": m.in_use,
+                "peak_in_use": m.peak_in_use,
+                "checkouts": m.checkouts,
+                "waited": m.waited,
+                "timeouts": m.timeouts,
+                "resizes": m.resizes,
+                "wait_avg_ms": round(m.wait_total / m.checkouts * 1e3, 3) if m.checkouts else 0.0,
+                "wait_p50_ms": round(p50 * 1e3, 3),
+                "wait_p95_ms": round(p95 * 1e3, 3),
+                "wait_max_ms": round(m.wait_max * 1e3, 3),
+            }
+
+
 # 创建连接池
-connection_pool = pooling.MySQLConnectionPool(
-    pool_name="ai_pool",
-    pool_size=10,
-    pool_reset_session=True,
-    **DB_CONFIG
-)
+connection_pool = AdaptivePool(POOL_SIZE)
+
+# 数据库耗时回调：每次借出连接到归还（含等待连接池）的秒数
+_query_observer = None
+
+def set_query_observer(observer):
+    """注册数据库耗时回调 observer(seconds)，传 None 取消"""
+    global _query_observer
+    _query_observer = observer
 
 @contextmanager
 def get_db_connection():
     """获取数据库连接的上下文管理器"""
     connection = None
+    start = time.perf_counter()
     try:
         connection = connection_pool.get_connection()
         yield connection
@@ -35,8 +268,10 @@ def get_db_connection():
             connection.rollback()
         raise
     finally:
-        if connection and connection.is_connected():
-            connection.close()
+        if connection:
+            connection_pool.release(connection)
+        if _query_observer:
+            _query_observer(time.perf_counter() - start)
 
 def execute_query(query, params=None, fetch=False):
     """执行SQL查询"""
@@ -49,4 +284,69 @@ def execute_query(query, params=None, fetch=False):
             conn.commit()
             return cursor.rowcount
         finally:
-            cursor.close()
\ No newline at end of file
+            cursor.close()
+
+def execute_many(query, seq_params):
+    """批量执行同一条语句（INSERT 会被合并为多行插入）"""
+    seq_params = list(seq_params)
+    if not seq_params:
+        return 0
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(query, seq_params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+class UnitOfWork:
+    """事务内的语句执行器，所有语句共用同一个连接"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastrowid = None
+
+    def execute(self, query, params=None, fetch=False):
+        """执行SQL（不单独提交），fetch=True 返回结果行，否则返回影响行数"""
+        cursor = self.connection.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params or ())
+            self.lastrowid = cursor.lastrowid
+            return cursor.fetchall() if fetch else cursor.rowcount
+        finally:
+            cursor.close()
+
+    def executemany(self, query, seq_params):
+        """批量执行同一条语句"""
+        seq_params = list(seq_params)
+        if not seq_params:
+            return 0
+        cursor = self.connection.cursor()
+        try:
+            cursor.executemany(query, seq_params)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+@contextmanager
+def transaction():
+    """
+    事务上下文：多条语句复用一个连接并原子提交，出错时整体回滚。
+    with transaction() as tx:
+        tx.execute(...)
+        tx.executemany(...)
+    """
+    with get_db_connection() as conn:
+        conn.start_transaction()
+        try:
+            yield UnitOfWork(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def pool_stats():
+    """连接池指标"""
+    return connection_pool.stats()
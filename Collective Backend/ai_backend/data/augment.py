@@ -1559,6 +1559,46 @@ class LetterBox:
         new_shape = labels.pop("rect_shape", self.new_shape)
         if isinstance(new_shape, int):
             new_shape = (new_shape, new_shape)
+        ratio, (dw, dh), new_unpad, (top, bottom, left, right) = self.get_params(shape, new_shape)
+
+        if shape[::-1] != new_unpad:  # resize
+            img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+        img = cv2.copyMakeBorder(
+            img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114)
+        )  # add border
+        if labels.get("ratio_pad"):
+            labels["ratio_pad"] = (labels["ratio_pad"], (left, top))  # for evaluation
+
+        if len(labels):
+            labels = self._update_labels(labels, ratio, dw, dh)
+            labels["img"] = img
+            labels["resized_shape"] = new_shape
+            return labels
+        else:
+            return img
+
+    def get_params(self, shape, new_shape=None):
+        """
+        Computes the letterbox geometry for an image without touching pixels.
+
+        Args:
+            shape (Tuple[int, int]): Current image shape (height, width).
+            new_shape (int | Tuple[int, int] | None): Target shape, defaults to `self.new_shape`.
+
+        Returns:
+            ratio (Tuple[float, float]): Scaling ratios (width, height).
+            pad (Tuple[float, float]): Padding (dw, dh) on one side, as used to update labels.
+            new_unpad (Tuple[int, int]): Resized image size (width, height) before padding.
+            border (Tuple[int, int, int, int]): Border sizes (top, bottom, left, right) in pixels.
+
+        Examples:
+            >>> letterbox = LetterBox(new_shape=(640, 640))
+            >>> ratio, pad, new_unpad, (top, bottom, left, right) = letterbox.get_params((480, 640))
+        """
+        if new_shape is None:
+            new_shape = self.new_shape
+        if isinstance(new_shape, int):
+            new_shape = (new_shape, new_shape)
 
         # Scale ratio (new / old)
         r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
@@ -1580,23 +1620,9 @@ class LetterBox:
             dw /= 2  # divide padding into 2 sides
             dh /= 2
 
-        if shape[::-1] != new_unpad:  # resize
-            img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
         top, bottom = int(round(dh - 0.1)) if self.center else 0, int(round(dh + 0.1))
         left, right = int(round(dw - 0.1)) if self.center else 0, int(round(dw + 0.1))
-        img = cv2.copyMakeBorder(
-            img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114)
-        )  # add border
-        if labels.get("ratio_pad"):
-            labels["ratio_pad"] = (labels["ratio_pad"], (left, top))  # for evaluation
-
-        if len(labels):
-            labels = self._update_labels(labels, ratio, dw, dh)
-            labels["img"] = img
-            labels["resized_shape"] = new_shape
-            return labels
-        else:
-            return img
+        return ratio, (dw, dh), new_unpad, (top, bottom, left, right)
 
     def _update_labels(self, labels, ratio, padw, padh):
         """
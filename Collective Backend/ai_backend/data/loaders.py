@@ -6,7 +6,7 @@ import os
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from threading import Thread
+from threading import Condition, Thread
 from urllib.parse import urlparse
 
 import cv2
@@ -19,6 +19,8 @@ from ultralytics.data.utils import FORMATS_HELP_MSG, IMG_FORMATS, VID_FORMATS
 from ultralytics.utils import IS_COLAB, IS_KAGGLE, LOGGER, ops
 from ultralytics.utils.checks import check_requirements
 
+from .stream_buffer import StreamBuffer, wait_for_streams  # relative: not part of the pip-installed ultralytics
+
 
 @dataclass
 class SourceTypes:
@@ -34,13 +36,18 @@ class LoadStreams:
     """
     Stream Loader for various types of video streams, Supports RTSP, RTMP, HTTP, and TCP streams.
 
+    Each stream is captured by its own thread into a fixed-capacity `StreamBuffer`. Batches are assembled
+    asynchronously: `__next__` waits for the first stream with a frame, then up to `deadline` seconds for the others,
+    and returns only the streams that are ready, so one slow or stalled camera does not hold back the rest.
+
     Attributes:
         sources (str): The source input paths or URLs for the video streams.
         vid_stride (int): Video frame-rate stride, defaults to 1.
-        buffer (bool): Whether to buffer input streams, defaults to False.
+        buffer (bool): Whether to buffer input streams (FIFO), defaults to False (always read the latest frame).
         running (bool): Flag to indicate if the streaming thread is running.
         mode (str): Set to 'stream' indicating real-time capture.
-        imgs (list): List of image frames for each stream.
+        buffers (list): List of StreamBuffer ring buffers, one per stream.
+        deadline (float): Seconds to wait for the remaining streams once one stream has a frame.
         fps (list): List of FPS for each stream.
         frames (list): List of total frames for each stream.
         threads (list): List of threads for each stream.
@@ -52,6 +59,7 @@ class LoadStreams:
         __init__: Initialize the stream loader.
         update: Read stream frames in daemon thread.
         close: Close stream loader and release resources.
+        stats: Return per-stream buffer depth, drop and lag counters.
         __iter__: Returns an iterator object for the class.
         __next__: Returns source paths, transformed, and original images for processing.
         __len__: Return the length of the sources object.
@@ -62,13 +70,28 @@ class LoadStreams:
          ```
     """
 
-    def __init__(self, sources="file.streams", vid_stride=1, buffer=False):
-        """Initialize instance variables and check for consistent input stream shapes."""
+    def __init__(self, sources="file.streams", vid_stride=1, buffer=False, capacity=30, policy=None, deadline=None):
+        """
+        Initialize instance variables and check for consistent input stream shapes.
+
+        Args:
+            sources (str): Stream URL or a file listing one stream per line.
+            vid_stride (int): Video frame-rate stride.
+            buffer (bool): Deliver every buffered frame in order instead of only the latest one.
+            capacity (int): Ring buffer size per stream in buffer mode; latest-frame mode keeps at most 2 frames.
+            policy (str, optional): Full-buffer policy, 'drop-oldest', 'drop-newest' or 'block'. Defaults to 'block'
+                in buffer mode and 'drop-oldest' otherwise.
+            deadline (float, optional): Seconds to wait for the remaining streams once one stream has a frame.
+                Defaults to half a frame interval of the fastest stream.
+        """
         torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
         self.buffer = buffer  # buffer input streams
         self.running = True  # running flag for Thread
         self.mode = "stream"
         self.vid_stride = vid_stride  # video frame-rate stride
+        capacity = capacity if buffer else min(capacity, 2)
+        policy = policy or ("block" if buffer else "drop-oldest")
+        self.cond = Condition()  # shared by all stream buffers, notified on every new frame
 
         sources = Path(sources).read_text().rsplit() if os.path.isfile(sources) else [sources]
         n = len(sources)
@@ -77,7 +100,7 @@ class LoadStreams:
         self.frames = [0] * n
         self.threads = [None] * n
         self.caps = [None] * n  # video capture objects
-        self.imgs = [[] for _ in range(n)]  # images
+        self.buffers = [None] * n  # frame ring buffers
         self.shape = [[] for _ in range(n)]  # image shapes
         self.sources = [ops.clean_str(x) for x in sources]  # clean source names for later
         for i, s in enumerate(sources):  # index, source
@@ -106,38 +129,46 @@ class LoadStreams:
             success, im = self.caps[i].read()  # guarantee first frame
             if not success or im is None:
                 raise ConnectionError(f"{st}Failed to read images from {s}")
-            self.imgs[i].append(im)
             self.shape[i] = im.shape
+            self.buffers[i] = StreamBuffer(im.shape, capacity, policy, self.cond)
+            self.buffers[i].put(im)
             self.threads[i] = Thread(target=self.update, args=([i, self.caps[i], s]), daemon=True)
             LOGGER.info(f"{st}Success ✅ ({self.frames[i]} frames of shape {w}x{h} at {self.fps[i]:.2f} FPS)")
             self.threads[i].start()
+        self.deadline = 0.5 / max(self.fps) if deadline is None else deadline
         LOGGER.info("")  # newline
 
     def update(self, i, cap, stream):
-        """Read stream `i` frames in daemon thread."""
+        """Read stream `i` frames in daemon thread, decoding directly into the stream's ring buffer."""
         n, f = 0, self.frames[i]  # frame number, frame array
+        buf = self.buffers[i]
         while self.running and cap.isOpened() and n < (f - 1):
-            if len(self.imgs[i]) < 30:  # keep a <=30-image buffer
-                n += 1
-                cap.grab()  # .read() = .grab() followed by .retrieve()
-                if n % self.vid_stride == 0:
-                    success, im = cap.retrieve()
-                    if not success:
-                        im = np.zeros(self.shape[i], dtype=np.uint8)
-                        LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
-                        cap.open(stream)  # re-open stream if signal was lost
-                    if self.buffer:
-                        self.imgs[i].append(im)
-                    else:
-                        self.imgs[i] = [im]
-            else:
-                time.sleep(0.01)  # wait until the buffer is empty
+            n += 1
+            cap.grab()  # .read() = .grab() followed by .retrieve()
+            if n % self.vid_stride != 0:
+                continue
+            k = buf.reserve()  # None: dropped by the 'drop-newest' policy, skip decoding
+            if k is None:
+                continue
+            success, im = cap.retrieve(buf.data[k])
+            if not success:
+                buf.data[k] = 0
+                LOGGER.warning("WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.")
+                cap.open(stream)  # re-open stream if signal was lost
+            elif not np.shares_memory(im, buf.data[k]):  # stream resolution changed, decoded into a new array
+                buf.fill(k, im)
+            buf.commit(k)
+        with self.cond:
+            self.cond.notify_all()  # let the batch assembler notice the finished stream
 
     def close(self):
         """Close stream loader and release resources."""
         self.running = False  # stop flag for Thread
+        for buf in self.buffers:
+            if buf is not None:
+                buf.close()
         for thread in self.threads:
-            if thread.is_alive():
+            if thread is not None and thread.is_alive():
                 thread.join(timeout=5)  # Add timeout
         for cap in self.caps:  # Iterate through the stored VideoCapture objects
             try:
@@ -146,37 +177,51 @@ class LoadStreams:
                 LOGGER.warning(f"WARNING ⚠️ Could not release VideoCapture object: {e}")
         cv2.destroyAllWindows()
 
+    def stats(self):
+        """Return per-stream buffer depth, capture, drop and lag counters."""
+        return [
+            {"source": s, "alive": t.is_alive(), **b.stats()} for s, t, b in zip(self.sources, self.threads, self.buffers)
+        ]
+
     def __iter__(self):
         """Iterates through YOLO image feed and re-opens unresponsive streams."""
         self.count = -1
         return self
 
+    def _ready(self):
+        """Return indices of streams with a frame and the number of streams that may still produce one."""
+        ready = [i for i, b in enumerate(self.buffers) if len(b)]
+        live = sum(1 for i, t in enumerate(self.threads) if len(self.buffers[i]) or t.is_alive())
+        return ready, live
+
     def __next__(self):
-        """Returns source paths, transformed and original images for processing."""
+        """Returns source paths, transformed and original images of the streams that are ready."""
         self.count += 1
 
-        images = []
-        for i, x in enumerate(self.imgs):
-            # Wait until a frame is available in each buffer
-            while not x:
-                if not self.threads[i].is_alive() or cv2.waitKey(1) == ord("q"):  # q to quit
-                    self.close()
-                    raise StopIteration
-                time.sleep(1 / min(self.fps))
-                x = self.imgs[i]
-                if not x:
-                    LOGGER.warning(f"WARNING ⚠️ Waiting for stream {i}")
-
-            # Get and remove the first frame from imgs buffer
-            if self.buffer:
-                images.append(x.pop(0))
-
-            # Get the last frame, and clear the rest from the imgs buffer
-            else:
-                images.append(x.pop(-1) if x else np.zeros(self.shape[i], dtype=np.uint8))
-                x.clear()
+        with self.cond:
+            # Wait until a frame is available in any buffer
+            ready, live = self._ready()
+            waited = 0.0
+            while not ready:
+                if not live or cv2.waitKey(1) == ord("q"):  # all streams finished, or q to quit
+                    break
+                if not self.cond.wait(1 / min(self.fps)):
+                    waited += 1 / min(self.fps)
+                    if waited >= 1:  # warn once per second of waiting
+                        LOGGER.warning("WARNING ⚠️ Waiting for streams")
+                        waited = 0.0
+                ready, live = self._ready()
+
+            # Give the remaining streams until the deadline to catch up
+            if ready:
+                ready, live = wait_for_streams(self.cond, self._ready, self.deadline)
+
+        if not ready:
+            self.close()
+            raise StopIteration
 
-        return self.sources, images, [""] * self.bs
+        images = [self.buffers[i].get(latest=not self.buffer) for i in ready]
+        return [self.sources[i] for i in ready], images, [""] * len(ready)
 
     def __len__(self):
         """Return the length of the sources object."""
@@ -0,0 +1,161 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""Per-stream frame ring buffers and deadline batch assembly for LoadStreams. Depends only on OpenCV and NumPy."""
+
+import time
+from threading import Condition
+
+import cv2
+import numpy as np
+
+
+class StreamBuffer:
+    """
+    Fixed-capacity frame ring buffer for one stream, backed by a preallocated uint8 array.
+
+    The capture thread decodes straight into the next free slot (`reserve` -> decode -> `commit`), so steady-state
+    capture allocates nothing. When the buffer is full, `policy` decides what happens to a new frame: 'drop-oldest'
+    overwrites the oldest unread frame, 'drop-newest' discards the new frame and 'block' makes the capture thread wait
+    until the consumer frees a slot.
+
+    Attributes:
+        data (np.ndarray): Frame storage of shape (capacity, h, w, 3).
+        stamps (np.ndarray): Capture time of the frame in each slot.
+        capacity (int): Number of slots.
+        policy (str): Full-buffer policy, one of 'drop-oldest', 'drop-newest' or 'block'.
+        cond (threading.Condition): Condition notified whenever a frame is committed or taken.
+        captured (int): Frames committed to the buffer.
+        delivered (int): Frames handed to the consumer.
+        dropped (int): Frames discarded by the policy or skipped by a latest-frame read.
+        lag (float): Age in seconds of the last delivered frame.
+    """
+
+    POLICIES = {"drop-oldest", "drop-newest", "block"}
+
+    def __init__(self, shape, capacity=30, policy="drop-oldest", cond=None):
+        """Preallocate `capacity` frames of `shape` (h, w, 3)."""
+        if policy not in self.POLICIES:
+            raise ValueError(f"Invalid stream buffer policy '{policy}', valid policies are {sorted(self.POLICIES)}")
+        self.data = np.zeros((capacity, *shape), dtype=np.uint8)
+        self.stamps = [0.0] * capacity
+        self.capacity = capacity
+        self.policy = policy
+        self.cond = cond or Condition()
+        self.head = 0  # slot of the oldest unread frame
+        self.count = 0  # unread frames
+        self.closed = False
+        self.captured = self.delivered = self.dropped = 0
+        self.lag = 0.0
+
+    def __len__(self):
+        """Return the number of unread frames."""
+        return self.count
+
+    def reserve(self):
+        """Return the slot index for the next frame, or None if the frame must be dropped or the buffer is closed."""
+        with self.cond:
+            while self.count == self.capacity and not self.closed:
+                if self.policy == "drop-oldest":
+                    self.head = (self.head + 1) % self.capacity
+                    self.count -= 1
+                    self.dropped += 1
+                elif self.policy == "drop-newest":
+                    self.dropped += 1
+                    return None
+                else:
+                    self.cond.wait(0.1)
+            return None if self.closed else (self.head + self.count) % self.capacity
+
+    def commit(self, k, stamp=None):
+        """Publish the frame written into slot `k`."""
+        with self.cond:
+            self.stamps[k] = time.time() if stamp is None else stamp
+            self.count += 1
+            self.captured += 1
+            self.cond.notify_all()
+
+    def fill(self, k, im):
+        """Copy a decoded frame into slot `k`, resizing it if the stream changed resolution."""
+        slot = self.data[k]
+        if im.shape == slot.shape:
+            np.copyto(slot, im)
+        else:
+            slot[:] = cv2.resize(im, (slot.shape[1], slot.shape[0]))
+
+    def put(self, im):
+        """Add a decoded frame; returns False if the policy dropped it."""
+        k = self.reserve()
+        if k is None:
+            return False
+        self.fill(k, im)
+        self.commit(k)
+        return True
+
+    def get(self, latest=False):
+        """
+        Take a frame, or None if the buffer is empty.
+
+        Args:
+            latest (bool): Return the newest frame and discard the older unread ones instead of the oldest (FIFO).
+
+        Returns:
+            (np.ndarray | None): A copy of the frame; the slot is reused as soon as it is released.
+        """
+        with self.cond:
+            if not self.count:
+                return None
+            if latest:
+                k = (self.head + self.count - 1) % self.capacity
+                self.dropped += self.count - 1
+                self.head, self.count = (k + 1) % self.capacity, 0
+            else:
+                k = self.head
+                self.head = (k + 1) % self.capacity
+                self.count -= 1
+            im = self.data[k].copy()  # copy under the lock, the capture thread can only reuse the slot afterwards
+            self.delivered += 1
+            self.lag = time.time() - self.stamps[k]
+            self.cond.notify_all()  # wake a capture thread blocked on a full buffer
+            return im
+
+    def close(self):
+        """Release a capture thread blocked on a full buffer."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        """Return buffer depth and capture, delivery, drop and lag counters."""
+        with self.cond:
+            return {
+                "depth": self.count,
+                "capacity": self.capacity,
+                "policy": self.policy,
+                "captured": self.captured,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "lag_ms": round(float(self.lag) * 1e3, 1),
+            }
+
+
+def wait_for_streams(cond, ready_fn, deadline):
+    """
+    Wait up to `deadline` seconds for the remaining live streams once at least one stream has a frame.
+
+    Args:
+        cond (threading.Condition): Condition shared by the stream buffers, held by the caller.
+        ready_fn (Callable): Returns (indices of streams with a frame, number of streams that may still produce one).
+        deadline (float): Seconds to wait at most.
+
+    Returns:
+        ready (List[int]): Indices of streams with a frame when all live streams are ready or the deadline passes.
+        live (int): Number of streams that may still produce a frame.
+    """
+    end = time.time() + deadline
+    ready, live = ready_fn()
+    while ready and len(ready) < live:
+        remaining = end - time.time()
+        if remaining <= 0:
+            break
+        cond.wait(remaining)
+        ready, live = ready_fn()
+    return ready, live
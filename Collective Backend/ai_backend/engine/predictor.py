@@ -47,6 +47,8 @@ from ultralytics.utils.checks import check_imgsz, check_imshow
 from ultralytics.utils.files import increment_path
 from ultralytics.utils.torch_utils import select_device, smart_inference_mode
 
+from .preprocess import LetterboxBuffers, fusable  # relative: not part of the pip-installed ultralytics
+
 STREAM_WARNING = """
 WARNING ⚠️ inference results will accumulate in RAM unless `stream=True` is passed, causing potential out-of-memory
 errors for large sources or long-running streams and videos. See https://docs.ultralytics.com/modes/predict/ for help.
@@ -75,8 +77,12 @@ class BasePredictor:
         device (torch.device): Device used for prediction.
         dataset (Dataset): Dataset used for prediction.
         vid_writer (dict): Dictionary of {save_path: video_writer, ...} writer for saving video output.
+        fused_preprocess (bool): Whether same-shape uint8 batches are preprocessed into reused input buffers. Other
+            inputs, and subclasses that override `pre_transform`, use the letterbox/np.stack path.
     """
 
+    fused_preprocess = True
+
     def __init__(self, cfg=DEFAULT_CFG, overrides=None, _callbacks=None):
         """
         Initializes the BasePredictor class.
@@ -110,6 +116,7 @@ class BasePredictor:
         self.callbacks = _callbacks or callbacks.get_default_callbacks()
         self.txt_path = None
         self._lock = threading.Lock()  # for automatic thread-safe inference
+        self._input_buffers = LetterboxBuffers()  # input tensors reused by the fused preprocess path
         callbacks.add_integration_callbacks(self)
 
     def preprocess(self, im):
@@ -120,6 +127,15 @@ class BasePredictor:
             im (torch.Tensor | List(np.ndarray)): BCHW for tensor, [(HWC) x B] for list.
         """
         not_tensor = not isinstance(im, torch.Tensor)
+        if (
+            not_tensor
+            and self.fused_preprocess
+            and type(self).pre_transform is BasePredictor.pre_transform  # subclasses may change the letterbox
+            and fusable(im)
+        ):
+            return self._input_buffers(
+                im, self.imgsz, auto=self.model.pt, stride=self.model.stride, device=self.device, half=self.model.fp16
+            )
         if not_tensor:
             im = np.stack(self.pre_transform(im))
             im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW, (n, 3, h, w)
@@ -0,0 +1,136 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""Fused letterbox preprocessing into reused input buffers. Depends only on OpenCV, NumPy and PyTorch."""
+
+import cv2
+import numpy as np
+import torch
+
+
+def letterbox_geometry(shape, new_shape, auto=False, stride=32, scaleup=True):
+    """
+    Computes the resize and border sizes used by `LetterBox(new_shape, auto=auto, stride=stride, scaleup=scaleup)`.
+
+    Args:
+        shape (Tuple[int, int]): Image shape (height, width).
+        new_shape (int | Tuple[int, int]): Target shape (height, width).
+        auto (bool): Pad to the minimum rectangle that is a multiple of `stride` instead of the full target shape.
+        stride (int): Stride used with `auto`.
+        scaleup (bool): Allow scaling images up.
+
+    Returns:
+        new_unpad (Tuple[int, int]): Resized image size (width, height) before padding.
+        border (Tuple[int, int, int, int]): Border sizes (top, bottom, left, right) in pixels.
+
+    Examples:
+        >>> letterbox_geometry((480, 640), 640)
+        ((640, 480), (80, 80, 0, 0))
+    """
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+    r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+    if not scaleup:
+        r = min(r, 1.0)
+    new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw, dh = dw / 2, dh / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return new_unpad, (top, bottom, left, right)
+
+
+def fusable(im):
+    """Returns True if `im` is a list of same-shape (h, w, 3) uint8 images that `LetterboxBuffers` can process."""
+    return (
+        isinstance(im, (list, tuple))
+        and len(im) > 0
+        and all(isinstance(x, np.ndarray) for x in im)
+        and len({x.shape for x in im}) == 1
+        and im[0].ndim == 3
+        and im[0].shape[2] == 3
+        and im[0].dtype == np.uint8
+    )
+
+
+class LetterboxBuffers:
+    """
+    Letterbox, BGR to RGB, BHWC to BCHW and normalization written straight into reused input buffers.
+
+    Each image is resized into its slot of a preallocated uint8 BHWC host tensor (pinned on CUDA so the copy to the
+    device is asynchronous) and converted to RGB in place; one copy then permutes and casts into a preallocated BCHW
+    input tensor, which is scaled in place. Same-shape batches (video frames, streams) allocate nothing per batch.
+    The result is bit-identical to letterboxing each image, stacking and converting the batch.
+
+    Attributes:
+        host (torch.Tensor | None): uint8 BHWC host buffer.
+        dev (torch.Tensor | None): fp16/fp32 BCHW input buffer on the inference device.
+        copied (torch.cuda.Event | None): Marks the end of the last host-to-device copy.
+
+    Examples:
+        >>> buffers = LetterboxBuffers()
+        >>> x = buffers([np.zeros((720, 1280, 3), dtype=np.uint8)] * 4, 640, auto=True, device=torch.device("cpu"))
+        >>> x.shape
+        torch.Size([4, 3, 384, 640])
+    """
+
+    def __init__(self):
+        """Initializes empty buffers; they are allocated on first use and grown as needed."""
+        self.host = None
+        self.dev = None
+        self.copied = None
+
+    def __call__(self, im, new_shape, auto=False, stride=32, device=torch.device("cpu"), half=False):
+        """
+        Preprocesses a batch into the buffers. The returned tensor is overwritten by the next call.
+
+        Args:
+            im (List(np.ndarray)): [(h, w, 3) x B] uint8 BGR images of the same shape.
+            new_shape (int | Tuple[int, int]): Letterbox target shape (height, width).
+            auto (bool): Pad to the minimum stride-multiple rectangle, as `LetterBox(auto=True)`.
+            stride (int): Model stride used with `auto`.
+            device (torch.device): Inference device.
+            half (bool): Return an fp16 tensor instead of fp32.
+
+        Returns:
+            (torch.Tensor): BCHW input tensor in range 0.0 - 1.0.
+        """
+        n = len(im)
+        shape = im[0].shape[:2]
+        (w, h), (top, bottom, left, right) = letterbox_geometry(shape, new_shape, auto=auto, stride=stride)
+        height, width = top + h + bottom, left + w + right
+
+        dtype = torch.half if half else torch.float
+        if (
+            self.host is None
+            or self.host.shape[0] < n
+            or self.host.shape[1:3] != (height, width)
+            or self.dev.dtype != dtype
+            or self.dev.device.type != device.type
+        ):
+            pin = device.type == "cuda"
+            self.host = torch.empty((n, height, width, 3), dtype=torch.uint8, pin_memory=pin)
+            self.dev = torch.empty((n, 3, height, width), dtype=dtype, device=device)
+        if self.copied is not None:
+            self.copied.synchronize()  # the previous asynchronous copy may still be reading the host buffer
+
+        buf = self.host.numpy()
+        for i, x in enumerate(im):
+            slot = buf[i]
+            slot[:top] = slot[top + h :] = 114  # border, same value as LetterBox
+            slot[top : top + h, :left] = slot[top : top + h, left + w :] = 114
+            view = slot[top : top + h, left : left + w]
+            if shape[::-1] != (w, h):
+                cv2.resize(x, (w, h), dst=view, interpolation=cv2.INTER_LINEAR)
+                cv2.cvtColor(view, cv2.COLOR_BGR2RGB, dst=view)
+            else:
+                cv2.cvtColor(x, cv2.COLOR_BGR2RGB, dst=view)
+
+        src = self.host[:n]
+        if device.type != "cpu":
+            src = src.to(device, non_blocking=True)
+            if device.type == "cuda":
+                self.copied = torch.cuda.Event()
+                self.copied.record()
+        # BHWC to BCHW and uint8 to fp16/32 in one copy, then 0 - 255 to 0.0 - 1.0 in place
+        return self.dev[:n].copy_(src.permute(0, 3, 1, 2)).div_(255)
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from config.database import execute_query
+from modules.auth_cache import auth_cache
 import logging
 
 class AdminManager:
@@ -81,6 +82,7 @@ class AdminManager:
                 (user_id,)
             )
             
+            auth_cache.invalidate(user_id)
             logging.info(f"User {user_id} banned successfully. Reason: {reason}, Duration: {duration} minutes")
             
         except Exception as e:
@@ -116,6 +118,7 @@ class AdminManager:
                 (user_id,)
             )
             
+            auth_cache.invalidate(user_id)
             logging.info(f"User {user_id} unbanned successfully")
             
         except Exception as e:
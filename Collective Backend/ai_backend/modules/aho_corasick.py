@@ -0,0 +1,125 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    多模式字符串匹配自动机（Aho–Corasick）。
+    一次扫描文本即可找出所有关键词的出现位置，耗时 O(文本长度 + 匹配数)，与关键词数量无关。
+    每个关键词可关联多个值（例如所属类别）；支持增量增删关键词，失配链接在下次匹配前按需重建。
+    """
+
+    def __init__(self):
+        self._goto = [{}]  # 节点 -> {字符: 子节点}
+        self._values = [None]  # 节点 -> 以该节点结尾的关键词的值集合（None 表示不是关键词结尾）
+        self._depth = [0]
+        self._fail = [0]
+        self._out = [0]  # 沿失配链最近的关键词结尾节点（0 表示没有）
+        self._built = True
+        self._size = 0  # 当前关键词数
+        self._dead = 0  # 被删除后残留的关键词节点数
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, keyword):
+        node = self._find(keyword)
+        return node is not None and bool(self._values[node])
+
+    def add(self, keyword, value=None):
+        """添加关键词（同一关键词可多次添加不同的值）"""
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._values.append(None)
+                self._depth.append(self._depth[node] + 1)
+                self._fail.append(0)
+                self._out.append(0)
+            node = nxt
+        if not self._values[node]:
+            self._values[node] = set()
+            self._size += 1
+            self._built = False  # 新的关键词结尾会改变失配链上的输出
+        self._values[node].add(value)
+
+    def remove(self, keyword, value=None):
+        """删除关键词的一个值，值全部删除后关键词不再匹配"""
+        node = self._find(keyword)
+        if node is None or not self._values[node]:
+            return
+        self._values[node].discard(value)
+        if not self._values[node]:
+            self._values[node] = None
+            self._size -= 1
+            self._dead += 1
+            self._built = False
+
+    def build(self):
+        """按广度优先计算失配链接与输出链接；残留的已删除节点过多时整体压缩"""
+        if self._dead > max(self._size, 1024):
+            self._compact()
+        fail, out, goto, values = self._fail, self._out, self._goto, self._values
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            out[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[child] = f
+                out[child] = f if values[f] else out[f]
+        self._built = True
+
+    def iter_matches(self, text):
+        """逐个产出 (起始位置, 结束位置, 关键词, 值集合)，结束位置不含"""
+        if not self._built:
+            self.build()
+        goto, fail, out, values, depth = self._goto, self._fail, self._out, self._values, self._depth
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            match = node if values[node] else out[node]
+            while match:
+                start = i + 1 - depth[match]
+                yield start, i + 1, text[start:i + 1], values[match]
+                match = out[match]
+
+    def find_all(self, text):
+        """返回全部匹配 [(起始位置, 结束位置, 关键词, 值集合)]"""
+        return list(self.iter_matches(text))
+
+    def _find(self, keyword):
+        node = 0
+        for ch in keyword:
+            node = self._goto[node].get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _compact(self):
+        """丢弃已删除关键词残留的节点，重新插入现存关键词"""
+        entries = []
+        stack = [(0, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if self._values[node]:
+                entries.append((prefix, self._values[node]))
+            for ch, child in self._goto[node].items():
+                stack.append((child, prefix + ch))
+        self.__init__()
+        for keyword, vals in entries:
+            for value in vals:
+                self.add(keyword, value)
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from config.database import execute_query
+
+_MISS = object()
+
+
+class AuthCache:
+    """
+    认证状态短期缓存（进程内）。
+    缓存用户是否存在与封禁状态，避免每个请求都查询 user_names/admin_names 和 banned_users；
+    封禁/解封时显式失效，多进程部署下其它进程的陈旧数据最多保留 ttl 秒。
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._users = {}  # (role, user_id) -> (是否存在, 过期时间)
+        self._bans = {}  # user_id -> ((is_banned, ban_info), 过期时间)
+        self._lock = threading.Lock()
+        self._generation = 0  # 每次失效 +1，防止失效前发起的查询把旧状态写回缓存
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def user_exists(self, user_id, role='user'):
+        """用户（或管理员）是否存在"""
+        key = (role, user_id)
+        exists, generation = self._lookup(self._users, key)
+        if exists is not _MISS:
+            return exists
+
+        if role == 'admin':
+            rows = execute_query(
+                "SELECT 1 FROM admin_names WHERE admin_id = %s",
+                (user_id,),
+                fetch=True
+            )
+        else:
+            rows = execute_query(
+                "SELECT 1 FROM user_names WHERE user_id = %s",
+                (user_id,),
+                fetch=True
+            )
+        exists = bool(rows)
+        self._store(self._users, key, exists, generation)
+        return exists
+
+    def ban_state(self, user_id):
+        """封禁状态，返回值同 UserManager.is_user_banned: (is_banned, ban_info)"""
+        state, generation = self._lookup(self._bans, user_id)
+        if state is not _MISS:
+            return state
+
+        from modules.user_manager import UserManager
+
+        state = UserManager.is_user_banned(user_id)
+        self._store(self._bans, user_id, state, generation)
+        return state
+
+    def invalidate(self, user_id):
+        """用户封禁状态变化时调用，清除该用户的缓存"""
+        with self._lock:
+            self._bans.pop(user_id, None)
+            self._users.pop(('user', user_id), None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._bans.clear()
+            self._users.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        """命中率统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._users) + len(self._bans),
+                "ttl": self.ttl,
+            }
+
+    def _lookup(self, table, key):
+        with self._lock:
+            entry = table.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0], self._generation
+            self.misses += 1
+            return _MISS, self._generation
+
+    def _store(self, table, key, value, generation):
+        with self._lock:
+            if generation == self._generation:
+                table[key] = (value, time.monotonic() + self.ttl)
+
+
+# 全局实例
+auth_cache = AuthCache()
@@ -0,0 +1,51 @@
+import logging
+import time
+
+
+def profile_predict_latency(model, imgsz=640, batch_sizes=(1, 2, 4, 8, 16), n=3):
+    """
+    在模型所在设备上测量各批大小的单次前向耗时（秒），作为延迟曲线的初值。
+    某个批大小失败（如显存不足）时停止，返回已测得的 {批大小: 秒}。
+    """
+    import torch
+
+    p = next(model.parameters())
+    device, dtype = p.device, p.dtype
+
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+
+    latency = {}
+    with torch.inference_mode():
+        for b in batch_sizes:
+            try:
+                x = torch.zeros(b, 3, imgsz, imgsz, device=device, dtype=dtype)
+                model(x)  # 预热
+                sync()
+                t0 = time.perf_counter()
+                for _ in range(n):
+                    model(x)
+                sync()
+                latency[b] = max(time.perf_counter() - t0, 1e-9) / n
+            except Exception as e:
+                logging.warning(f"Latency probe failed at batch size {b}: {e}")
+                break
+    ms = ", ".join(f"{b}: {t * 1e3:.1f}" for b, t in latency.items())
+    logging.info(f"Latency probe on {str(device).upper()} at imgsz={imgsz} (batch: ms): {ms}")
+    return latency
+
+
+def check_predict_batch_size(model, imgsz=640, batch_sizes=(1, 2, 4, 8, 16), n=3, tolerance=0.05, batch_size=1):
+    """
+    按实测前向吞吐量（张/秒）选择推理批大小，CPU 上同样适用。
+    取吞吐量达到最优值 (1 - tolerance) 的最小批大小；探测全部失败时返回 batch_size。
+    """
+    throughput = {b: b / t for b, t in profile_predict_latency(model, imgsz, batch_sizes, n).items()}
+    if not throughput:
+        logging.warning(f"Batch size probe failed, using default batch size {batch_size}")
+        return batch_size
+    best = max(throughput.values())
+    b = min(k for k, v in throughput.items() if v >= best * (1 - tolerance))
+    logging.info(f"Using inference batch size {b} ({throughput[b]:.1f} img/s, best {best:.1f} img/s)")
+    return b
@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+from collections import Counter, deque
+
+
+def power_of_two_sizes(max_batch):
+    """1, 2, 4, ... 直到 max_batch（含 max_batch 本身），用于探测与候选批大小"""
+    sizes = []
+    b = 1
+    while b < max_batch:
+        sizes.append(b)
+        b *= 2
+    sizes.append(max_batch)
+    return sizes
+
+
+class LatencyCurve:
+    """
+    批大小 -> 单次推理耗时（秒）曲线。
+    以 profile_predict_latency 探测（只含前向）的结果为初值，
+    之后按实际执行的整批耗时（含预处理、后处理）做指数滑动平均；未测量的批大小按相邻点线性插值，
+    超出已测范围时按单张耗时线性外推（偏保守）。
+    """
+
+    def __init__(self, seed=None, alpha=0.2):
+        self.alpha = alpha
+        self._points = {int(b): float(t) for b, t in (seed or {}).items()}
+        self._lock = threading.Lock()
+
+    def observe(self, batch, seconds):
+        with self._lock:
+            prev = self._points.get(batch)
+            self._points[batch] = seconds if prev is None else prev + self.alpha * (seconds - prev)
+
+    def latency(self, batch):
+        """估计批大小为 batch 时的耗时（秒），没有任何测量时返回 0"""
+        with self._lock:
+            if batch in self._points:
+                return self._points[batch]
+            if not self._points:
+                return 0.0
+            sizes = sorted(self._points)
+            i = bisect.bisect_left(sizes, batch)
+            if i == 0:
+                return self._points[sizes[0]]
+            lo = sizes[i - 1]
+            if i == len(sizes):
+                return self._points[lo] * batch / lo
+            hi = sizes[i]
+            t_lo, t_hi = self._points[lo], self._points[hi]
+            return t_lo + (t_hi - t_lo) * (batch - lo) / (hi - lo)
+
+    def best_batch(self, max_batch, tolerance=0.05):
+        """吞吐量（张/秒）达到最优值 (1 - tolerance) 的最小批大小"""
+        throughput = {b: b / max(self.latency(b), 1e-9) for b in power_of_two_sizes(max_batch)}
+        best = max(throughput.values())
+        return min(b for b, v in throughput.items() if v >= best * (1 - tolerance))
+
+    def as_dict(self):
+        with self._lock:
+            return {b: round(t * 1e3, 2) for b, t in sorted(self._points.items())}
+
+
+class BatchScheduler:
+    """
+    延迟感知的动态批调度策略。
+    每次有空闲预测上下文时，根据最早请求已等待的时间、队列深度和请求到达间隔决定本批大小与还可等待的时间：
+    - 目标批大小取延迟曲线上吞吐量最优的批大小，并受 p99 延迟目标（slo_ms）约束：
+      最早请求已等待时间 + 本批预计耗时不超过 slo_ms；
+    - 队列里的请求不足目标批大小时，只有按当前到达速率能在剩余余量（且不超过 max_wait_ms）内凑满才等待，
+      否则立即发送已有请求——负载低时自然退化为批大小 1、不额外等待。
+    同时统计队列深度、实际批大小与超出 SLO 的请求数。
+    """
+
+    def __init__(self, max_batch, slo_ms=None, max_wait_ms=2.0, curve=None, alpha=0.2, window=1024):
+        self.max_batch = max(1, int(max_batch))
+        self.slo = slo_ms / 1000 if slo_ms else None
+        self.max_wait = max_wait_ms / 1000
+        self.curve = curve or LatencyCurve(alpha=alpha)
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._last_arrival = None
+        self.interarrival = None  # 请求到达间隔的滑动平均（秒）
+        self._latencies = deque(maxlen=window)  # 最近请求的端到端延迟（秒）
+        # 统计
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.completed = 0
+        self.violations = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+
+    def arrived(self, queue_depth):
+        """请求入队时调用，更新到达间隔与队列深度"""
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_arrival is not None:
+                gap = now - self._last_arrival
+                self.interarrival = gap if self.interarrival is None else (
+                    self.interarrival + self.alpha * (gap - self.interarrival)
+                )
+            self._last_arrival = now
+            self.requests += 1
+            self.queue_depth = queue_depth
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def plan(self, oldest_age, queued):
+        """
+        返回 (目标批大小, 还可等待的秒数)。
+        oldest_age 为本批最早请求已等待的秒数，queued 为当前可取的请求数（含最早请求）。
+        """
+        with self._lock:
+            self.queue_depth = queued
+            interarrival = self.interarrival
+        target = self.curve.best_batch(self.max_batch)
+        if self.slo is None:
+            budget = float("inf")
+        else:
+            # 满足延迟目标的最大批大小；一张都来不及时仍按 1 张发送
+            budget = self.slo - oldest_age
+            while target > 1 and self.curve.latency(target) > budget:
+                target -= 1
+        if queued >= target:
+            return target, 0.0
+        slack = min(self.max_wait, budget - self.curve.latency(target))
+        fill = (target - queued) * interarrival if interarrival is not None else float("inf")
+        return target, fill if fill <= slack else 0.0
+
+    def completed_batch(self, size, seconds, latencies):
+        """一批执行完成：更新延迟曲线、批大小分布与各请求端到端延迟"""
+        self.curve.observe(size, seconds)
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes[size] += 1
+            self.completed += len(latencies)
+            self._latencies.extend(latencies)
+            if self.slo is not None:
+                self.violations += sum(t > self.slo for t in latencies)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            images = sum(b * n for b, n in self.batch_sizes.items())
+
+            def percentile(q):
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1e3, 2) if latencies else 0.0
+
+            return {
+                "max_batch": self.max_batch,
+                "slo_ms": round(self.slo * 1e3, 2) if self.slo is not None else None,
+                "max_wait_ms": round(self.max_wait * 1e3, 2),
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch": round(images / self.batches, 2) if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "p50_ms": percentile(0.5),
+                "p99_ms": percentile(0.99),
+                "slo_violations": self.violations,
+                "violation_rate": round(self.violations / self.completed, 4) if self.completed else 0.0,
+                "interarrival_ms": round(self.interarrival * 1e3, 2) if self.interarrival is not None else None,
+                "latency_curve_ms": self.curve.as_dict(),
+            }
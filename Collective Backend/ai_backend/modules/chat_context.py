@@ -0,0 +1,132 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from config.database import execute_query
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符按 1 个计，其余按 4 个字符 1 个计"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '\u2e80' <= ch <= '\u9fff' or '\uf900' <= ch <= '\ufaff')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class ChatContextBuilder:
+    """
+    多轮对话上下文构建器。
+    只从数据库取最近 max_rounds 轮，并在 token 预算内从新到旧保留；
+    配置 summarizer 时，被挤出窗口的旧轮次会增量合并为一段摘要放在上下文开头。
+    """
+
+    def __init__(self, max_rounds=10, token_budget=3000, summarizer=None, max_sessions=256):
+        self.max_rounds = max_rounds
+        self.token_budget = token_budget
+        # summarizer(previous_summary, rounds) -> 新摘要；rounds 为 [{"user_msg", "ai_msg"}]
+        self.summarizer = summarizer
+        self.max_sessions = max_sessions
+        self._summaries = OrderedDict()  # session_id -> (已摘要到的轮次, 摘要文本)
+        self._lock = threading.Lock()
+
+    def build(self, session_id, before_round=None):
+        """返回 OpenAI messages 格式的历史上下文（不含 before_round 及之后的轮次）"""
+        if before_round is None:
+            rows = execute_query(
+                """
+                SELECT um.round_id,
+                       um.message_content      AS user_msg,
+                       ar.response_content     AS ai_msg
+                FROM   user_messages um
+                LEFT JOIN ai_responses ar
+                       ON um.session_id = ar.session_id
+                      AND um.round_id  = ar.round_id
+                WHERE  um.session_id = %s
+                ORDER  BY um.round_id DESC
+                LIMIT  %s
+                """,
+                (session_id, self.max_rounds),
+                fetch=True
+            )
+        else:
+            rows = execute_query(
+                """
+                SELECT um.round_id,
+                       um.message_content      AS user_msg,
+                       ar.response_content     AS ai_msg
+                FROM   user_messages um
+                LEFT JOIN ai_responses ar
+                       ON um.session_id = ar.session_id
+                      AND um.round_id  = ar.round_id
+                WHERE  um.session_id = %s AND um.round_id < %s
+                ORDER  BY um.round_id DESC
+                LIMIT  %s
+                """,
+                (session_id, before_round, self.max_rounds),
+                fetch=True
+            )
+
+        # 从最新一轮开始，在 token 预算内尽量多保留
+        kept, used = [], 0
+        for r in rows:
+            cost = estimate_tokens(r["user_msg"]) + estimate_tokens(r["ai_msg"])
+            if kept and used + cost > self.token_budget:
+                break
+            kept.append(r)
+            used += cost
+        kept.reverse()
+
+        context = []
+        if self.summarizer and kept:
+            summary = self._summary(session_id, kept[0]["round_id"])
+            if summary:
+                context.append({"role": "system", "content": f"此前对话摘要：{summary}"})
+        for r in kept:
+            context.append({"role": "user",      "content": r["user_msg"]})
+            if r["ai_msg"]:
+                context.append({"role": "assistant","content": r["ai_msg"]})
+        return context
+
+    def forget(self, session_id):
+        """删除会话时清除摘要"""
+        with self._lock:
+            self._summaries.pop(session_id, None)
+
+    def _summary(self, session_id, first_kept_round):
+        """把 first_kept_round 之前、尚未摘要的轮次合并进会话摘要"""
+        with self._lock:
+            upto, summary = self._summaries.get(session_id, (0, ""))
+        if upto >= first_kept_round - 1:
+            return summary
+
+        # 只取新挤出窗口的轮次（稳定对话中每轮最多一轮）
+        rows = execute_query(
+            """
+            SELECT um.round_id,
+                   um.message_content      AS user_msg,
+                   ar.response_content     AS ai_msg
+            FROM   user_messages um
+            LEFT JOIN ai_responses ar
+                   ON um.session_id = ar.session_id
+                  AND um.round_id  = ar.round_id
+            WHERE  um.session_id = %s AND um.round_id > %s AND um.round_id < %s
+            ORDER  BY um.round_id
+            LIMIT  %s
+            """,
+            (session_id, upto, first_kept_round, self.max_rounds),
+            fetch=True
+        )
+        if rows:
+            try:
+                summary = self.summarizer(summary, rows)
+                upto = rows[-1]["round_id"]
+            except Exception as e:
+                logging.error(f"Error summarizing chat history for session {session_id}: {e}")
+                return summary
+
+        with self._lock:
+            self._summaries[session_id] = (upto, summary)
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > self.max_sessions:
+                self._summaries.popitem(last=False)
+        return summary
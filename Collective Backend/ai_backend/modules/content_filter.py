@@ -1,35 +1,83 @@
+import threading
 import time
 
 from ai_backend.config.database import execute_query
+from ai_backend.modules.aho_corasick import AhoCorasick
 from typing import Dict, List
 
 
 class DatabaseContentFilter:
+    """
+    敏感词过滤：全部类别的关键词编译进同一个 Aho–Corasick 自动机，一次扫描得到所有命中位置和类别。
+    刷新时先比较关键词表指纹，有变化才拉取全表并只增删差异部分。
+    """
+
+    CACHE_TTL = 3600  # 1小时缓存
+
+    # check_text 返回的标志 -> 关键词类别（数据库 ENUM 值；保留旧的英文类别名以兼容）
+    CATEGORY_FLAGS = {
+        'has_porn': ('涉黄内容', 'porn'),
+        'has_violence': ('暴力内容', 'violence'),
+        'has_politics': ('政治敏感', 'politics'),
+    }
+
     def __init__(self):
-        self.cached_keywords = None
+        self.cached_keywords = None  # 类别 -> 关键词列表
         self.last_update = 0
+        self._automaton = AhoCorasick()
+        self._entries = set()  # 已编译的 (关键词, 类别)
+        self._fingerprint = None
+        self._lock = threading.Lock()
 
     def _refresh_cache(self):
-        """从数据库刷新敏感词缓存"""
-        results = execute_query(
-            "SELECT keyword, category FROM sensitive_keywords",
+        """从数据库刷新敏感词缓存（关键词表未变化时跳过）"""
+        fingerprint = execute_query(
+            """
+            SELECT COUNT(*) AS n,
+                   COALESCE(MAX(keyword_id), 0) AS max_id,
+                   COALESCE(SUM(CRC32(CONCAT(keyword_id, ':', keyword, ':', category))), 0) AS checksum
+            FROM sensitive_keywords
+            """,
             fetch=True
-        )
-        self.cached_keywords = {}
-        for item in results:
-            self.cached_keywords.setdefault(item['category'], []).append(item['keyword'])
+        )[0]
+        fingerprint = (fingerprint['n'], fingerprint['max_id'], int(fingerprint['checksum']))
+        if fingerprint != self._fingerprint:
+            results = execute_query(
+                "SELECT keyword, category FROM sensitive_keywords",
+                fetch=True
+            )
+            entries = {(item['keyword'], item['category']) for item in results if item['keyword']}
+            with self._lock:
+                for keyword, category in self._entries - entries:
+                    self._automaton.remove(keyword, category)
+                for keyword, category in entries - self._entries:
+                    self._automaton.add(keyword, category)
+                self._automaton.build()
+                self._entries = entries
+            cached_keywords = {}
+            for keyword, category in sorted(entries):
+                cached_keywords.setdefault(category, []).append(keyword)
+            self.cached_keywords = cached_keywords
+            self._fingerprint = fingerprint
         self.last_update = time.time()
 
-    def check_text(self, text: str) -> Dict[str, bool]:
-        """检查文本是否包含敏感词"""
-        if not self.cached_keywords or time.time() - self.last_update > 3600:  # 1小时缓存
+    def _ensure_fresh(self):
+        if self.cached_keywords is None or time.time() - self.last_update > self.CACHE_TTL:
             self._refresh_cache()
 
-        return {
-            'has_porn': any(kw in text for kw in self.cached_keywords.get('porn', [])),
-            'has_violence': any(kw in text for kw in self.cached_keywords.get('violence', [])),
-            'has_politics': any(kw in text for kw in self.cached_keywords.get('politics', []))
-        }
+    def find_matches(self, text: str) -> List[Dict]:
+        """返回全部命中：[{"start", "end", "keyword", "categories"}]，一次扫描完成"""
+        self._ensure_fresh()
+        with self._lock:
+            return [
+                {"start": start, "end": end, "keyword": keyword, "categories": sorted(categories)}
+                for start, end, keyword, categories in self._automaton.iter_matches(text)
+            ]
+
+    def check_text(self, text: str) -> Dict[str, bool]:
+        """检查文本是否包含敏感词"""
+        matched = {category for m in self.find_matches(text) for category in m["categories"]}
+        return {flag: any(c in matched for c in categories) for flag, categories in self.CATEGORY_FLAGS.items()}
 
 
 # 全局实例
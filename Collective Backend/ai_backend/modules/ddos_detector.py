@@ -1,6 +1,8 @@
-import time
+import threading
 from datetime import datetime, timedelta
 from config.database import execute_query
+from modules.auth_cache import auth_cache
+from modules.rate_limiter import SlidingWindowLimiter
 import logging
 
 class DDoSDetector:
@@ -10,63 +12,42 @@ class DDoSDetector:
     TIME_WINDOW = 1  # 时间窗口（分钟）
     BAN_DURATION = 1440  # 封禁时长（分钟，24小时）
     
+    STATS_FLUSH_CHUNK = 500  # 批量写入 user_attack_stats 时每条语句的最大行数
+    STATS_RESET_CHUNK = 1000  # 重置统计时每条 UPDATE 的最大行数
+
+    # 滑动窗口计数（默认进程内）：只在越过阈值或定时批量刷新时写入 user_attack_stats
+    limiter = SlidingWindowLimiter(window_seconds=TIME_WINDOW * 60)
+    _dirty_users = set()
+    _dirty_lock = threading.Lock()
+    
+    @staticmethod
+    def set_window_backend(backend):
+        """替换滑动窗口计数后端（多 worker 部署时使用共享的 RedisWindowBackend）"""
+        DDoSDetector.limiter = SlidingWindowLimiter(window_seconds=DDoSDetector.TIME_WINDOW * 60, backend=backend)
+    
     @staticmethod
     def update_user_stats(user_id, action_type):
-        """更新用户攻击统计"""
+        """更新用户攻击统计（滑动窗口计数）"""
         try:
-            # 获取当前统计数据
-            stats = execute_query(
-                "SELECT session_count, conversation_count, delta_time_window FROM user_attack_stats WHERE user_id = %s",
-                (user_id,),
-                fetch=True
+            if action_type in ('session', 'conversation'):
+                DDoSDetector.limiter.hit(user_id, action_type)
+            with DDoSDetector._dirty_lock:
+                DDoSDetector._dirty_users.add(user_id)
+            return (
+                DDoSDetector.limiter.count(user_id, 'session'),
+                DDoSDetector.limiter.count(user_id, 'conversation'),
             )
-            
-            if not stats:
-                # 如果没有记录，创建新记录
-                execute_query(
-                    "INSERT INTO user_attack_stats (user_id, delta_time_window) VALUES (%s, %s)",
-                    (user_id, DDoSDetector.TIME_WINDOW)
-                )
-                session_count = 0
-                conversation_count = 0
-            else:
-                session_count = stats[0]['session_count']
-                conversation_count = stats[0]['conversation_count']
-            
-            # 根据动作类型更新计数
-            if action_type == 'session':
-                session_count += 1
-            elif action_type == 'conversation':
-                conversation_count += 1
-            
-            # 更新统计数据
-            execute_query(
-                "UPDATE user_attack_stats SET session_count = %s, conversation_count = %s WHERE user_id = %s",
-                (session_count, conversation_count, user_id)
-            )
-            
-            return session_count, conversation_count
         except Exception as e:
             logging.error(f"Error updating user stats: {e}")
             return 0, 0
     
     @staticmethod
     def check_ddos_attack(user_id):
-        """检测DDoS攻击 - 基于用户id+总攻击次数（delta范围内）"""
+        """检测DDoS攻击 - 基于用户id+总攻击次数（最近 TIME_WINDOW 分钟的滑动窗口内）"""
         try:
-            # 获取用户统计数据
-            stats = execute_query(
-                "SELECT session_count, conversation_count, is_ddos, delta_time_window FROM user_attack_stats WHERE user_id = %s",
-                (user_id,),
-                fetch=True
-            )
-            
-            if not stats:
-                return False
-            
-            session_count = stats[0]['session_count']
-            conversation_count = stats[0]['conversation_count']
-            delta_time_window = stats[0]['delta_time_window']
+            session_count = DDoSDetector.limiter.count(user_id, 'session')
+            conversation_count = DDoSDetector.limiter.count(user_id, 'conversation')
+            delta_time_window = DDoSDetector.TIME_WINDOW
             
             # 计算总攻击次数（在delta时间窗口内）
             total_attacks = session_count + conversation_count
@@ -82,11 +63,8 @@ class DDoSDetector:
                       total_attacks > adjusted_total_threshold)
             
             if is_ddos:
-                # 更新DDoS标记
-                execute_query(
-                    "UPDATE user_attack_stats SET is_ddos = 1 WHERE user_id = %s",
-                    (user_id,)
-                )
+                # 越过阈值时立即写入统计并标记DDoS
+                DDoSDetector._persist_stats([user_id], is_ddos=True)
                 
                 # 封禁用户
                 DDoSDetector.ban_user_for_ddos(user_id, total_attacks)
@@ -99,6 +77,51 @@ class DDoSDetector:
             logging.error(f"Error checking DDoS attack: {e}")
             return False
     
+    @staticmethod
+    def flush_stats():
+        """把内存中有变化的用户统计批量写入 user_attack_stats（定时任务）"""
+        with DDoSDetector._dirty_lock:
+            user_ids = list(DDoSDetector._dirty_users)
+            DDoSDetector._dirty_users.clear()
+        if not user_ids:
+            return
+        try:
+            DDoSDetector._persist_stats(user_ids)
+            logging.info(f"Flushed attack stats for {len(user_ids)} user(s)")
+        except Exception as e:
+            # 写入失败时保留脏标记，下次重试
+            with DDoSDetector._dirty_lock:
+                DDoSDetector._dirty_users.update(user_ids)
+            logging.error(f"Error flushing user stats: {e}")
+    
+    @staticmethod
+    def _persist_stats(user_ids, is_ddos=False):
+        """以多行 upsert 写入用户当前窗口计数（is_ddos 只会被置位，不会被清除）"""
+        for i in range(0, len(user_ids), DDoSDetector.STATS_FLUSH_CHUNK):
+            chunk = user_ids[i:i + DDoSDetector.STATS_FLUSH_CHUNK]
+            params = []
+            for user_id in chunk:
+                params.extend((
+                    user_id,
+                    DDoSDetector.TIME_WINDOW,
+                    DDoSDetector.limiter.count(user_id, 'session'),
+                    DDoSDetector.limiter.count(user_id, 'conversation'),
+                    int(is_ddos),
+                ))
+            execute_query(
+                f"""
+                INSERT INTO user_attack_stats
+                (user_id, delta_time_window, session_count, conversation_count, is_ddos)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))}
+                ON DUPLICATE KEY UPDATE
+                    delta_time_window = VALUES(delta_time_window),
+                    session_count = VALUES(session_count),
+                    conversation_count = VALUES(conversation_count),
+                    is_ddos = GREATEST(is_ddos, VALUES(is_ddos))
+                """,
+                tuple(params)
+            )
+    
     @staticmethod
     def ban_user_for_ddos(user_id, attack_count):
         """因DDoS攻击封禁用户 - 根据攻击次数动态调整封禁时长"""
@@ -149,24 +172,43 @@ class DDoSDetector:
                 (user_id,)
             )
             
+            auth_cache.invalidate(user_id)
             logging.info(f"User {user_id} banned for DDoS attack. Duration: {ban_duration} minutes, Attack count: {attack_count}")
         except Exception as e:
             logging.error(f"Error banning user for DDoS: {e}")
     
     @staticmethod
-    def reset_user_stats():
-        """重置所有用户的攻击统计（定时任务）"""
+    def reset_user_stats(clear_windows=False):
+        """
+        重置 user_attack_stats 中持久化的计数与 DDoS 标记（定时任务）：只更新非零行，按批提交以限制锁范围。
+        内存中的滑动窗口按时间自然过期，默认不清除，否则持续攻击的用户每次重置后都会从零开始计数；
+        clear_windows=True（管理员手动重置）时一并清空。
+        """
         try:
-            execute_query(
-                "UPDATE user_attack_stats SET session_count = 0, conversation_count = 0, is_ddos = 0"
-            )
-            logging.info("User attack stats reset successfully")
+            if clear_windows:
+                DDoSDetector.limiter.reset()
+                with DDoSDetector._dirty_lock:
+                    DDoSDetector._dirty_users.clear()
+            total = 0
+            while True:
+                updated = execute_query(
+                    """
+                    UPDATE user_attack_stats SET session_count = 0, conversation_count = 0, is_ddos = 0
+                    WHERE session_count <> 0 OR conversation_count <> 0 OR is_ddos <> 0
+                    LIMIT %s
+                    """,
+                    (DDoSDetector.STATS_RESET_CHUNK,)
+                )
+                total += updated
+                if updated < DDoSDetector.STATS_RESET_CHUNK:
+                    break
+            logging.info(f"User attack stats reset successfully ({total} rows)")
         except Exception as e:
             logging.error(f"Error resetting user stats: {e}")
     
     @staticmethod
     def get_user_attack_summary(user_id):
-        """获取用户攻击统计摘要"""
+        """获取用户攻击统计摘要（只读；计数取滑动窗口的当前值，落库由 flush_stats 定时完成）"""
         try:
             stats = execute_query(
                 """
@@ -178,7 +220,12 @@ class DDoSDetector:
                 (user_id,),
                 fetch=True
             )
-            return stats[0] if stats else None
+            if not stats:
+                return None
+            summary = stats[0]
+            summary['session_count'] = DDoSDetector.limiter.count(user_id, 'session')
+            summary['conversation_count'] = DDoSDetector.limiter.count(user_id, 'conversation')
+            return summary
         except Exception as e:
             logging.error(f"Error getting user attack summary: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,56 @@
+import functools
+
+from ultralytics.engine.predictor import BasePredictor
+from ultralytics.engine.results import Results
+from ultralytics.models.yolo.detect import DetectionPredictor
+
+from engine.preprocess import LetterboxBuffers, fusable
+from utils import ops  # 本仓库的 utils/ops.py（CUDA 上整批一次 NMS），不是 pip 安装的 ultralytics.utils.ops
+
+
+class _DetectionMixin:
+    """
+    检测预处理与后处理改用本仓库的实现，其余沿用 pip 安装的 ultralytics 检测预测器：
+    同尺寸 uint8 批次直接 letterbox 到复用的输入缓冲区（engine/preprocess.py），NMS 用 utils.ops。
+    fused_preprocess = False 时预处理走原实现，耗时都计入 Results.speed["preprocess"]。
+    """
+
+    fused_preprocess = True
+
+    def preprocess(self, im):
+        if self.fused_preprocess and type(self).pre_transform is BasePredictor.pre_transform and fusable(im):
+            buffers = getattr(self, "_letterbox_buffers", None)
+            if buffers is None:  # 每个预测器（上下文）一份，返回的张量会被下一批覆盖
+                buffers = self._letterbox_buffers = LetterboxBuffers()
+            return buffers(
+                im, self.imgsz, auto=self.model.pt, stride=self.model.stride, device=self.device, half=self.model.fp16
+            )
+        return super().preprocess(im)
+
+    def postprocess(self, preds, img, orig_imgs, **kwargs):
+        preds = ops.non_max_suppression(
+            preds,
+            self.args.conf,
+            self.args.iou,
+            classes=self.args.classes,
+            agnostic=self.args.agnostic_nms,
+            max_det=self.args.max_det,
+        )
+        if not isinstance(orig_imgs, list):  # 输入为 torch.Tensor 时
+            orig_imgs = ops.convert_torch2numpy_batch(orig_imgs)
+        results = []
+        for pred, orig_img, img_path in zip(preds, orig_imgs, self.batch[0]):
+            pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
+            results.append(Results(orig_img, path=img_path, names=self.model.names, boxes=pred))
+        return results
+
+
+@functools.lru_cache(maxsize=None)
+def accelerated(predictor_cls):
+    """
+    返回接入本仓库推理优化的预测器类。
+    只替换普通检测（DetectionPredictor 本身），分割 / 姿态 / 旋转框等子类的后处理不同，原样返回。
+    """
+    if predictor_cls is not DetectionPredictor:
+        return predictor_cls
+    return type(f"Fast{predictor_cls.__name__}", (_DetectionMixin, predictor_cls), {})
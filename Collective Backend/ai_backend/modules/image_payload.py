@@ -0,0 +1,170 @@
+import base64
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from config.database import execute_query
+
+
+class ImagePayloadCache:
+    """
+    大模型图片载荷缓存。
+    处理后图片缩放到视觉模型输入尺寸并重新压缩为 JPEG（不超过 max_payload_bytes），
+    data URI 按 (路径, 修改时间, 文件大小) 做 LRU 缓存，总大小不超过 max_bytes；文件被改写后自动重新编码。
+    会话 -> 图片路径另行缓存，多轮对话不再重复查库。
+    """
+
+    QUALITY_STEPS = (85, 70, 55)  # 载荷超限时依次降低的 JPEG 质量
+    MIN_SIDE = 256  # 载荷仍超限时继续缩小，长边不低于该值
+
+    def __init__(self, max_sessions=1024, max_bytes=64 * 1024 * 1024, max_side=1024, quality=85,
+                 max_payload_bytes=512 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes  # 缓存的 data URI 总大小上限
+        self.max_side = max_side  # 长边上限（像素）
+        self.quality = quality  # JPEG 初始质量
+        self.max_payload_bytes = max_payload_bytes  # 单张图片 data URI 大小上限
+        self._sessions = OrderedDict()  # session_id -> 图片路径
+        self._payloads = OrderedDict()  # (路径, mtime_ns, 文件大小) -> data URI
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # 统计
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.evictions = 0
+        self.encodes = 0
+        self.encode_s = 0.0
+        self.bytes_sent = 0  # 实际发送给大模型的 data URI 字节数
+        self.raw_bytes = 0  # 直接 base64 原文件时需要发送的字节数（对比用）
+
+    def get(self, session_id):
+        """返回会话图片的 data URI；会话没有处理后图片或无法解码时返回 None"""
+        path = self.path_for(session_id)
+        return self.get_path(path) if path else None
+
+    def path_for(self, session_id):
+        """会话的处理后图片路径（缓存），没有时返回 None"""
+        with self._lock:
+            path = self._sessions.get(session_id)
+            if path:
+                self._sessions.move_to_end(session_id)
+                return path
+
+        rows = execute_query(
+            "SELECT processed_image_path FROM session_results WHERE session_id=%s",
+            (session_id,), fetch=True
+        )
+        if not rows or not rows[0]["processed_image_path"]:
+            return None
+        path = rows[0]["processed_image_path"]
+        with self._lock:
+            self._sessions[session_id] = path
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return path
+
+    def get_path(self, path):
+        """返回图片文件的 data URI，每次调用按一次发送计入流量统计；文件不存在或无法解码时返回 None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            data_uri = self._payloads.get(key)
+            if data_uri:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                self._record_sent(data_uri, st.st_size)
+                return data_uri
+
+        t0 = time.perf_counter()
+        data_uri = self.encode(path)
+        encode_s = time.perf_counter() - t0
+        with self._lock:
+            self.encodes += 1
+            self.encode_s += encode_s
+            if data_uri is None:
+                self.failures += 1
+                return None
+            self.misses += 1
+            self._record_sent(data_uri, st.st_size)
+            if key not in self._payloads:
+                self._payloads[key] = data_uri
+                self._bytes += len(data_uri)
+            while self._bytes > self.max_bytes and len(self._payloads) > 1:
+                _, evicted = self._payloads.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+        return data_uri
+
+    def encode(self, path):
+        """读取图片，缩放到长边不超过 max_side 并压缩为 JPEG data URI；超过 max_payload_bytes 时降低质量或继续缩小"""
+        image = cv2.imread(path)
+        if image is None:
+            logging.warning(f"Cannot decode image for LLM payload: {path}")
+            return None
+        h, w = image.shape[:2]
+        side = min(self.max_side, max(h, w))
+        qualities = [self.quality] + [q for q in self.QUALITY_STEPS if q < self.quality]
+        while True:
+            scale = side / max(h, w)
+            resized = image if scale >= 1 else cv2.resize(
+                image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA
+            )
+            for quality in qualities:
+                ok, buf = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                if not ok:
+                    logging.warning(f"Cannot encode image for LLM payload: {path}")
+                    return None
+                # base64 后约为原大小的 4/3
+                if (len(buf) + 2) // 3 * 4 <= self.max_payload_bytes:
+                    break
+            else:
+                if side > self.MIN_SIDE:
+                    side = max(self.MIN_SIDE, int(side * 0.75))
+                    continue
+            return f"data:image/jpeg;base64,{base64.b64encode(buf).decode('utf-8')}"
+
+    def forget(self, session_id):
+        """删除会话时清除缓存"""
+        with self._lock:
+            path = self._sessions.pop(session_id, None)
+            if path:
+                for key in [k for k in self._payloads if k[0] == path]:
+                    self._bytes -= len(self._payloads.pop(key))
+
+    def stats(self):
+        """命中率、缓存大小与发送流量（对比直接 base64 原文件）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "entries": len(self._payloads),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "avg_encode_ms": round(self.encode_s * 1e3 / self.encodes, 1) if self.encodes else 0.0,
+                "requests": self.requests,
+                "bytes_sent": self.bytes_sent,
+                "avg_bytes_per_request": round(self.bytes_sent / self.requests) if self.requests else 0,
+                "raw_base64_bytes": self.raw_bytes,
+                "bytes_saved_ratio": round(1 - self.bytes_sent / self.raw_bytes, 3) if self.raw_bytes else 0.0,
+            }
+
+    def _record_sent(self, data_uri, file_size):
+        self.requests += 1
+        self.bytes_sent += len(data_uri)
+        self.raw_bytes += len("data:image/jpeg;base64,") + (file_size + 2) // 3 * 4
@@ -0,0 +1,461 @@
+"""
+推理后端。
+
+InferenceEngine  进程内推理：常驻模型注册表 + 视频流水线（首次使用时才导入 torch / ultralytics）
+InferenceServer  独立推理服务：预加载全部类别模型的多个 worker 进程共享一个 Unix socket
+InferenceClient  Flask 侧客户端：图片与标注结果通过共享内存传递，socket 上只传小的控制消息
+
+启动推理服务（在 ai_backend 目录下）：
+    python -m modules.inference_server --socket /tmp/huimou-infer.sock --workers 2 --cpu-sets "0-15;16-31"
+Flask 侧设置环境变量 INFERENCE_SOCKET=/tmp/huimou-infer.sock 即改为调用推理服务。
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import cv2
+import numpy as np
+
+
+def save_image(output_path, image):
+    """把标注结果编码一次写入 output_path"""
+    if not cv2.imwrite(output_path, image):
+        raise ValueError(f"Failed to encode image: {output_path}")
+    logging.info(f"Image saved successfully: {output_path}")
+
+
+def _open_shm(name=None, size=0):
+    """
+    打开（name=None 时创建）共享内存块。
+    共享内存的生命周期由请求协议管理（创建方负责 unlink，见 _unlink_shm），
+    因此不交给 resource_tracker，避免进程退出时误删对方仍在使用的内存块。
+    """
+    create = name is None
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    # Python < 3.13 没有 track 参数，手动从 resource_tracker 注销
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _unlink_shm(shm):
+    """
+    删除共享内存块。Python < 3.13 上 SharedMemory.unlink() 会再次向 resource_tracker 注销，
+    而 _open_shm 已经注销过，tracker 会打印 KeyError，因此直接调用 shm_unlink。
+    """
+    if sys.version_info >= (3, 13):
+        shm.unlink()
+    else:
+        import _posixshmem
+
+        _posixshmem.shm_unlink(shm._name)
+
+
+class InferenceEngine:
+    """进程内推理：按类别常驻模型，图片直接推理，视频走流式流水线"""
+
+    def __init__(self, weights_dir, memory_budget_mb=2048, pool=None):
+        self.weights_dir = weights_dir
+        self.memory_budget_mb = memory_budget_mb
+        self.pool = pool or {}  # 预测上下文池参数（ModelRegistry 的 pool_size / max_batch / max_wait_ms / slo_ms）
+        self._registry = None
+        self._lock = threading.Lock()
+
+    @property
+    def registry(self):
+        """常驻模型注册表（首次使用时才导入 ultralytics，Flask 启动不加载 torch）"""
+        if self._registry is None:
+            with self._lock:
+                if self._registry is None:
+                    from modules.model_registry import ModelRegistry
+
+                    self._registry = ModelRegistry(
+                        self.weights_dir, memory_budget_mb=self.memory_budget_mb, **self.pool
+                    )
+        return self._registry
+
+    def preload(self, weight_files=None):
+        """预加载并预热模型（默认权重目录下全部 .pt）"""
+        if weight_files is None:
+            weight_files = sorted(f for f in os.listdir(self.weights_dir) if f.endswith(".pt"))
+        for weight_file in weight_files:
+            with self.registry.acquire(weight_file):
+                pass
+        return weight_files
+
+    def predict_image(self, weight_file, image, predict_args):
+        """
+        推理单张 BGR 图片，返回 (标注图, 检测结果, 各阶段耗时)。
+        耗时沿用 Results.speed（毫秒），并补充 model_load（取模型，含首次加载）与 annotate。
+        """
+        t0 = time.perf_counter()
+        with self.registry.acquire(weight_file) as model:
+            model_load = (time.perf_counter() - t0) * 1e3
+            results = model.predict(image, **predict_args)
+        t0 = time.perf_counter()
+        annotated = results[0].plot()
+        speed = dict(results[0].speed, model_load=model_load, annotate=(time.perf_counter() - t0) * 1e3)
+        return annotated, results[0].summary(), speed
+
+    def detect_image(self, weight_file, image, output_path, predict_args):
+        """推理图片并把标注结果写入 output_path，返回 (检测结果, 各阶段耗时)"""
+        annotated, detections, speed = self.predict_image(weight_file, image, predict_args)
+        t0 = time.perf_counter()
+        save_image(output_path, annotated)
+        speed["encode"] = (time.perf_counter() - t0) * 1e3
+        return detections, speed
+
+    def detect_video(self, weight_file, source_path, output_path, predict_args, queue_size=8, batch_size=1,
+                     sampling=None, encoder=None):
+        """
+        处理视频文件（流式流水线，逐帧编码直接写入 output_path），返回 (检测结果, 流水线统计)。
+        sampling 为抽帧参数（video_sampling.VIDEO_MODES 中的一项），None 表示逐帧推理；
+        encoder 为编码器参数（video_encoders.open_encoder 的 backend / preset / crf）。
+        """
+        from modules.video_pipeline import VideoPipeline
+
+        t0 = time.perf_counter()
+        with self.registry.acquire(weight_file) as model:
+            model_load = time.perf_counter() - t0
+            pipeline = VideoPipeline(model, queue_size=queue_size, batch_size=batch_size, **predict_args,
+                                     encoder=encoder, **(sampling or {}))
+            try:
+                stats = pipeline.run(source_path, output_path)
+            except Exception:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise
+        stats["model_load_s"] = round(model_load, 3)
+        return pipeline.detections, stats
+
+    def stats(self):
+        """模型注册表统计"""
+        return self.registry.stats()
+
+
+class InferenceClient:
+    """
+    推理服务客户端，接口与 InferenceEngine 一致。
+    每个请求使用一条独立连接：图片写入客户端创建的共享内存，标注结果从 worker 的共享内存输出缓冲区读取，
+    连接关闭前 worker 不会复用该缓冲区。
+    """
+
+    def __init__(self, address, authkey=None, timeout=120):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout  # 图片请求的超时时间（秒），视频请求不限时
+
+    def _call(self, conn, request, timeout=None):
+        conn.send(request)
+        if timeout is not None and not conn.poll(timeout):
+            raise TimeoutError(f"Inference server did not reply within {timeout}s")
+        reply = conn.recv()
+        if "error" in reply:
+            raise RuntimeError(f"Inference server error: {reply['error']}")
+        return reply
+
+    def detect_image(self, weight_file, image, output_path, predict_args):
+        """推理图片并把标注结果写入 output_path，返回 (检测结果, 各阶段耗时)"""
+        shm = _open_shm(size=image.nbytes)
+        try:
+            np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[:] = image
+            with Client(self.address, family="AF_UNIX", authkey=self.authkey) as conn:
+                reply = self._call(conn, {
+                    "op": "image",
+                    "weight_file": weight_file,
+                    "shm": shm.name,
+                    "shape": image.shape,
+                    "dtype": str(image.dtype),
+                    "predict_args": predict_args,
+                }, timeout=self.timeout)
+                out = _open_shm(reply["shm"])
+                try:
+                    annotated = np.ndarray(reply["shape"], dtype=reply["dtype"], buffer=out.buf)
+                    t0 = time.perf_counter()
+                    save_image(output_path, annotated)
+                    reply["speed"]["encode"] = (time.perf_counter() - t0) * 1e3
+                    del annotated  # 释放对共享内存的引用后才能 close
+                finally:
+                    out.close()
+        finally:
+            shm.close()
+            _unlink_shm(shm)
+        return reply["detections"], reply["speed"]
+
+    def detect_video(self, weight_file, source_path, output_path, predict_args, queue_size=8, batch_size=1,
+                     sampling=None, encoder=None):
+        """视频按文件路径交给推理服务处理，返回 (检测结果, 流水线统计)"""
+        with Client(self.address, family="AF_UNIX", authkey=self.authkey) as conn:
+            reply = self._call(conn, {
+                "op": "video",
+                "weight_file": weight_file,
+                "source_path": os.path.abspath(source_path),
+                "output_path": os.path.abspath(output_path),
+                "predict_args": predict_args,
+                "queue_size": queue_size,
+                "batch_size": batch_size,
+                "sampling": sampling,
+                "encoder": encoder,
+            })
+        return reply["detections"], reply["stats"]
+
+    def stats(self):
+        """接受本次连接的 worker 的统计信息"""
+        with Client(self.address, family="AF_UNIX", authkey=self.authkey) as conn:
+            return self._call(conn, {"op": "stats"}, timeout=self.timeout)
+
+
+class _Worker:
+    """
+    推理 worker：在共享的监听 socket 上接受连接，每条连接交给一个线程处理，最多同时处理 threads 条；
+    线程都忙时不再 accept，新连接留在 socket 上由其它 worker 接受。
+    同一模型的并发请求由预测上下文池（--pool-size / --micro-batch）并行或合并推理。
+    """
+
+    def __init__(self, index, listener, engine, threads=8):
+        self.index = index
+        self.listener = listener
+        self.engine = engine
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self._slots = threading.BoundedSemaphore(threads)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 标注结果输出缓冲区（共享内存）：连接处理期间独占一块，按需扩容，连接关闭后放回空闲列表复用
+        self._buffers = set()
+        self._free = []
+
+    def serve(self):
+        try:
+            while True:
+                self._slots.acquire()
+                try:
+                    conn = self.listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                    self._slots.release()
+                    logging.warning(f"Inference worker {self.index} failed to accept connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            with self._lock:
+                buffers, self._buffers, self._free = self._buffers, set(), []
+            for out in buffers:
+                out.close()
+                _unlink_shm(out)
+
+    def _serve_connection(self, conn):
+        with self._lock:
+            self.active += 1
+            self._local.out = self._free.pop() if self._free else None
+        try:
+            with conn:
+                self._handle(conn)
+        finally:
+            with self._lock:
+                self.active -= 1
+                if self._local.out is not None and self._local.out in self._buffers:
+                    self._free.append(self._local.out)
+            self._slots.release()
+
+    def _handle(self, conn):
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                self.requests += 1
+            try:
+                reply = getattr(self, f"_op_{request['op']}")(request)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logging.error(f"Inference worker {self.index} failed on {request.get('op')}: {e}")
+                reply = {"error": str(e)}
+            try:
+                conn.send(reply)
+            except (OSError, EOFError) as e:
+                # 客户端已超时放弃并关闭了连接
+                logging.warning(f"Inference worker {self.index} dropped reply to {request.get('op')}: {e}")
+                return
+
+    def _op_image(self, request):
+        shm = _open_shm(request["shm"])
+        try:
+            # 拷贝一次：Results.orig_img 会持有输入图片，不能直接引用客户端的共享内存
+            image = np.ndarray(request["shape"], dtype=request["dtype"], buffer=shm.buf).copy()
+        finally:
+            shm.close()
+        annotated, detections, speed = self.engine.predict_image(
+            request["weight_file"], image, request["predict_args"]
+        )
+        out = self._output_buffer(annotated.nbytes)
+        np.ndarray(annotated.shape, dtype=annotated.dtype, buffer=out.buf)[:] = annotated
+        return {
+            "shm": out.name,
+            "shape": annotated.shape,
+            "dtype": str(annotated.dtype),
+            "detections": detections,
+            "speed": speed,
+        }
+
+    def _op_video(self, request):
+        detections, stats = self.engine.detect_video(
+            request["weight_file"], request["source_path"], request["output_path"], request["predict_args"],
+            queue_size=request["queue_size"], batch_size=request["batch_size"],
+            sampling=request.get("sampling"), encoder=request.get("encoder")
+        )
+        return {"detections": detections, "stats": stats}
+
+    def _op_stats(self, request):
+        with self._lock:
+            counters = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "active_connections": self.active,
+                "output_buffer_mb": round(sum(out.size for out in self._buffers) / 1024 / 1024, 1),
+            }
+        return {"worker": self.index, "pid": os.getpid(), **counters, **self.engine.stats()}
+
+    def _output_buffer(self, nbytes):
+        """当前连接的输出缓冲区，不够大时按 2 倍扩容"""
+        out = self._local.out
+        if out is None or out.size < nbytes:
+            new = _open_shm(size=max(nbytes, 2 * out.size if out else nbytes))
+            with self._lock:
+                if out is not None:
+                    self._buffers.discard(out)
+                self._buffers.add(new)
+            if out is not None:
+                out.close()
+                _unlink_shm(out)
+            self._local.out = out = new
+        return out
+
+
+def _worker_main(index, listener, weights_dir, memory_budget_mb, cpus, pool, threads):
+    """worker 进程入口：绑定 CPU、预加载全部模型后开始接受请求"""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker {index}] %(levelname)s %(message)s")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由父进程统一处理退出
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # 正常退出以释放共享内存输出缓冲区
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    engine = InferenceEngine(weights_dir, memory_budget_mb=memory_budget_mb, pool=pool)
+    start = time.perf_counter()
+    loaded = engine.preload()
+    logging.info(f"Preloaded {len(loaded)} models in {time.perf_counter() - start:.1f}s, serving requests")
+    _Worker(index, listener, engine, threads=threads).serve()
+
+
+def parse_cpu_sets(spec):
+    """'0-15;16-31' -> [{0..15}, {16..31}]，每组对应一个 worker"""
+    cpu_sets = []
+    for group in filter(None, (g.strip() for g in spec.split(";"))):
+        cpus = set()
+        for part in group.split(","):
+            lo, _, hi = part.partition("-")
+            cpus.update(range(int(lo), int(hi or lo) + 1))
+        cpu_sets.append(cpus)
+    return cpu_sets
+
+
+class InferenceServer:
+    """
+    推理服务：父进程创建监听 socket 后 fork 出 worker 进程，各 worker 在同一 socket 上 accept，
+    由内核分配连接；worker 异常退出时自动重启。
+    """
+
+    def __init__(self, address, weights_dir, workers=1, memory_budget_mb=4096, cpu_sets=None, authkey=None,
+                 pool=None, threads=8):
+        self.address = address
+        self.weights_dir = weights_dir
+        self.memory_budget_mb = memory_budget_mb
+        self.pool = pool
+        self.threads = threads  # 每个 worker 同时处理的连接数
+        self.cpu_sets = cpu_sets or [None] * workers
+        self.authkey = authkey
+        self._ctx = multiprocessing.get_context("fork")  # 监听 socket 需要被 worker 继承
+        self._procs = {}
+        self._stopping = False
+
+    def _spawn(self, index, listener):
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(index, listener, self.weights_dir, self.memory_budget_mb, self.cpu_sets[index], self.pool,
+                  self.threads),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        self._procs[index] = proc
+        logging.info(f"Inference worker {index} started (pid {proc.pid})")
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)  # 上次运行遗留的 socket 文件
+        listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            for index in range(len(self.cpu_sets)):
+                self._spawn(index, listener)
+            logging.info(f"Inference server listening on {self.address} with {len(self._procs)} workers")
+            while not self._stopping:
+                for index, proc in list(self._procs.items()):
+                    proc.join(timeout=1)
+                    if not proc.is_alive() and not self._stopping:
+                        logging.error(f"Inference worker {index} exited with code {proc.exitcode}, restarting")
+                        self._spawn(index, listener)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stopping = True
+            for proc in self._procs.values():
+                proc.terminate()
+            for proc in self._procs.values():
+                proc.join(timeout=5)
+            listener.close()
+
+    def stop(self):
+        self._stopping = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=os.environ.get("INFERENCE_SOCKET", "/tmp/huimou-infer.sock"))
+    parser.add_argument("--weights-dir", default="PtSource")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cpu-sets", default="", help="每个 worker 绑定的 CPU，例如 '0-15;16-31'（覆盖 --workers）")
+    parser.add_argument("--memory-mb", type=int, default=4096, help="每个 worker 的模型内存预算")
+    parser.add_argument("--threads", type=int, default=8, help="每个 worker 同时处理的连接数")
+    parser.add_argument("--pool-size", type=int, default=2, help="每个模型的并发预测上下文数")
+    parser.add_argument("--micro-batch", type=int, default=1, help="并发单张图片请求动态合并的最大批大小（1 表示不合并）")
+    parser.add_argument("--micro-batch-wait-ms", type=float, default=2.0, help="为凑批最多等待的时间")
+    parser.add_argument("--slo-ms", type=float, default=None, help="动态批的 p99 延迟目标")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    authkey = os.environ.get("INFERENCE_AUTHKEY")
+    InferenceServer(
+        args.socket,
+        args.weights_dir,
+        workers=args.workers,
+        memory_budget_mb=args.memory_mb,
+        cpu_sets=parse_cpu_sets(args.cpu_sets) or None,
+        authkey=authkey.encode() if authkey else None,
+        pool=dict(pool_size=args.pool_size, max_batch=args.micro_batch, max_wait_ms=args.micro_batch_wait_ms,
+                  slo_ms=args.slo_ms),
+        threads=args.threads,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
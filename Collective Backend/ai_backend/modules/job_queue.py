@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+
+# 任务优先级：数值越小越先执行（图片任务排在视频任务之前）
+PRIORITY_IMAGE = 0
+PRIORITY_VIDEO = 10
+
+
+class Job:
+    """单个检测任务"""
+
+    def __init__(self, func, args=(), kwargs=None, user_id=None, kind='image', priority=PRIORITY_IMAGE):
+        self.job_id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.user_id = user_id
+        self.kind = kind
+        self.priority = priority
+        self.status = 'queued'  # queued / running / done / failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        """任务状态（不含结果内容）"""
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_time": round((self.started_at or time.time()) - self.created_at, 3),
+            "run_time": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class QueueBackend(ABC):
+    """
+    任务队列后端接口。
+    put 入队，get 按优先级出队（超时返回 None）；可替换为外部消息队列实现。
+    """
+
+    @abstractmethod
+    def put(self, job):
+        """任务入队"""
+
+    @abstractmethod
+    def get(self, timeout=None):
+        """按优先级取出任务，超时返回 None"""
+
+    @abstractmethod
+    def qsize(self):
+        """排队中的任务数"""
+
+
+class InProcessQueueBackend(QueueBackend):
+    """进程内优先级队列（默认后端，无需外部 broker）"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()  # 同优先级按提交顺序执行
+        self._cond = threading.Condition()
+
+    def put(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._heap:
+                self._cond.wait(timeout)
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def qsize(self):
+        with self._cond:
+            return len(self._heap)
+
+
+class JobQueue:
+    """
+    异步检测任务队列：工作线程池按优先级执行任务，并限制每个用户同时运行的任务数。
+    首次提交任务时自动启动工作线程。
+    """
+
+    def __init__(self, workers=2, max_per_user=2, result_ttl=3600, backend=None, prune_interval=60):
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.result_ttl = result_ttl  # 已完成任务的保留时长（秒）
+        self.prune_interval = prune_interval  # 清理过期任务的最短间隔（秒）
+        self.backend = backend or InProcessQueueBackend()
+        self._pruned_at = 0.0
+
+        self._jobs = {}  # job_id -> Job
+        self._running = defaultdict(int)  # user_id -> 运行中任务数
+        self._deferred = defaultdict(deque)  # user_id -> 因超出并发上限而暂缓的任务
+        self._lock = threading.Lock()
+        self._threads = []
+        self.running = False
+
+    def start(self):
+        """启动工作线程"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for t in self._threads:
+            t.start()
+        logging.info(f"Job queue started with {self.workers} workers")
+
+    def stop(self):
+        """停止工作线程（等待当前任务完成）"""
+        self.running = False
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        logging.info("Job queue stopped")
+
+    def submit(self, func, *args, user_id=None, kind='image', **kwargs):
+        """提交任务，立即返回 Job"""
+        if not self.running:
+            self.start()
+        priority = PRIORITY_VIDEO if kind == 'video' else PRIORITY_IMAGE
+        job = Job(func, args, kwargs, user_id=user_id, kind=kind, priority=priority)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self.backend.put(job)
+        logging.info(f"Job {job.job_id} ({kind}) queued for user {user_id}")
+        return job
+
+    def get(self, job_id):
+        """按 ID 查询任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """队列统计"""
+        with self._lock:
+            counts = defaultdict(int)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {
+                "workers": self.workers,
+                "queued": self.backend.qsize(),
+                "deferred": sum(len(q) for q in self._deferred.values()),
+                "jobs": dict(counts),
+            }
+
+    def _worker(self):
+        """工作线程：取任务、检查用户并发上限、执行"""
+        while self.running:
+            job = self.backend.get(timeout=1)
+            with self._lock:
+                self._prune()  # 空闲时也清理，突发提交之后内存能降下来
+            if job is None:
+                continue
+            with self._lock:
+                if job.user_id is not None and self._running[job.user_id] >= self.max_per_user:
+                    # 该用户已达并发上限，等其它任务完成后再入队
+                    self._deferred[job.user_id].append(job)
+                    continue
+                self._running[job.user_id] += 1
+            self._execute(job)
+
+    def _execute(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = job.func(*job.args, **job.kwargs)
+            job.status = 'done'
+        except Exception as e:
+            logging.error(f"Job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            job.func = job.args = job.kwargs = None  # 不再持有上传内容（file_bytes 等），只保留结果
+            with self._lock:
+                self._running[job.user_id] -= 1
+                if not self._running[job.user_id]:
+                    del self._running[job.user_id]
+                deferred = self._deferred.get(job.user_id)
+                next_job = deferred.popleft() if deferred else None
+                if deferred is not None and not deferred:
+                    del self._deferred[job.user_id]
+            if next_job:
+                self.backend.put(next_job)
+
+    def _prune(self):
+        """清理过期的已完成任务，每 prune_interval 秒最多一次（调用方需持有 self._lock）"""
+        now = time.time()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at and now - job.finished_at > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,101 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from modules.telemetry import telemetry
+
+
+def sse(data, event=None):
+    """编码一条 server-sent event"""
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+
+class LLMMetrics:
+    """大模型调用指标：按模式（stream / blocking）统计首 token 时间、总耗时和生成速度"""
+
+    def __init__(self, window=500):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, mode, ttft, total, tokens):
+        """记录一次调用，返回本次调用的指标"""
+        sample = {
+            "ttft_ms": round(ttft * 1e3, 1),
+            "total_ms": round(total * 1e3, 1),
+            "tokens": tokens,
+            "tokens_per_s": round(tokens / total, 1) if total > 0 else 0.0,
+        }
+        with self._lock:
+            self._samples[mode].append(sample)
+        return sample
+
+    def stats(self):
+        """各模式的平均值与 p95"""
+        with self._lock:
+            samples = {mode: list(s) for mode, s in self._samples.items()}
+        result = {}
+        for mode, items in samples.items():
+            summary = {"calls": len(items)}
+            for field in ("ttft_ms", "total_ms", "tokens_per_s"):
+                values = sorted(x[field] for x in items)
+                summary[f"{field}_avg"] = round(sum(values) / len(values), 1)
+                summary[f"{field}_p95"] = values[min(len(values) - 1, int(len(values) * 0.95))]
+            result[mode] = summary
+        return result
+
+
+# 全局实例
+llm_metrics = LLMMetrics()
+
+
+def complete(client, model, messages):
+    """阻塞调用大模型，返回完整回复文本"""
+    start = time.perf_counter()
+    completion = client.chat.completions.create(model=model, messages=messages)
+    total = time.perf_counter() - start
+    telemetry.add("llm", total)
+    text = completion.choices[0].message.content
+    usage = getattr(completion, "usage", None)
+    tokens = usage.completion_tokens if usage and usage.completion_tokens else len(text)
+    llm_metrics.record("blocking", total, total, tokens)
+    return text
+
+
+def stream_completion(client, model, messages, on_complete=None, transform=None):
+    """
+    流式调用大模型，逐块产出 SSE 事件：
+      data: {"delta": "..."}                       每个文本块
+      event: done  data: {"text": ..., "metrics"}  结束（含 on_complete 返回的附加字段）
+      event: error data: {"error": ...}            出错
+    transform 用于逐块清洗文本；on_complete(text) 在生成结束后调用（例如写入数据库）。
+    """
+    start = time.perf_counter()
+    ttft, parts = None, []
+    try:
+        stream = client.chat.completions.create(model=model, messages=messages, stream=True)
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if transform:
+                delta = transform(delta)
+            parts.append(delta)
+            yield sse({"delta": delta})
+
+        text = "".join(parts)
+        total = time.perf_counter() - start
+        telemetry.add("llm", total)
+        # 流式响应没有 usage 时，以文本块数近似 token 数
+        metrics = llm_metrics.record("stream", ttft if ttft is not None else total, total, len(parts))
+        extra = on_complete(text) if on_complete else None
+        yield sse({"text": text, "metrics": metrics, **(extra or {})}, event="done")
+    except Exception as e:
+        logging.error(f"Error streaming LLM response: {e}")
+        yield sse({"error": str(e)}, event="error")
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from ultralytics import YOLO
+
+from modules.predictor_pool import PredictorPool
+
+
+class _ModelEntry:
+    """注册表中的单个常驻模型"""
+
+    def __init__(self, weight_file, model, size_bytes, load_time):
+        self.weight_file = weight_file
+        self.model = model  # PredictorPool
+        self.size_bytes = size_bytes
+        self.load_time = load_time
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+        self.refs = 0  # 正在使用该模型的请求数，>0 时不会被淘汰
+
+
+class ModelRegistry:
+    """
+    进程级常驻模型注册表。
+    按权重文件懒加载 YOLO 模型，加载后立即预热并常驻内存；
+    每个模型包装为 pool_size 个共享权重的预测上下文（PredictorPool），同一模型的并发请求可并行推理。
+    超出内存预算时按 LRU 淘汰空闲模型，同时统计命中/未命中/加载耗时。
+    """
+
+    def __init__(self, weights_dir, memory_budget_mb=2048, warmup_imgsz=640, pool_size=2, max_batch=1, max_wait_ms=2.0,
+                 slo_ms=None):
+        self.weights_dir = weights_dir
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.warmup_imgsz = warmup_imgsz
+        self.pool_size = pool_size
+        self.max_batch = max_batch  # 动态批：>1 时合并并发的单张图片请求
+        self.max_wait_ms = max_wait_ms
+        self.slo_ms = slo_ms  # 动态批的 p99 延迟目标
+        self._models = OrderedDict()  # weight_file -> _ModelEntry，按最近使用排序
+        self._load_locks = {}  # weight_file -> Lock，避免同一模型被并发重复加载
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_count = 0
+        self.load_time_total = 0.0
+
+    @contextmanager
+    def acquire(self, weight_file):
+        """
+        获取常驻模型（上下文管理器）：
+        with model_registry.acquire('烟雾.pt') as model:
+            results = model.predict(...)
+        得到的是 PredictorPool，同一模型的并发请求各用一个预测上下文，上下文都忙时排队。
+        """
+        entry = self._checkout(weight_file)
+        try:
+            with self._lock:
+                entry.uses += 1
+                entry.last_used = time.time()
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                self._evict_if_needed()
+
+    def _checkout(self, weight_file):
+        """取出模型条目并增加引用计数，未加载时懒加载"""
+        with self._lock:
+            entry = self._models.get(weight_file)
+            if entry:
+                self.hits += 1
+                entry.refs += 1
+                self._models.move_to_end(weight_file)
+                return entry
+            load_lock = self._load_locks.setdefault(weight_file, threading.Lock())
+
+        with load_lock:
+            # 等待期间可能已被其它线程加载完成
+            with self._lock:
+                entry = self._models.get(weight_file)
+                if entry:
+                    self.hits += 1
+                    entry.refs += 1
+                    self._models.move_to_end(weight_file)
+                    return entry
+                self.misses += 1
+
+            entry = self._load(weight_file)
+
+            with self._lock:
+                entry.refs += 1
+                self._models[weight_file] = entry
+                self.load_count += 1
+                self.load_time_total += entry.load_time
+                self._evict_if_needed()
+            return entry
+
+    def _load(self, weight_file):
+        """加载权重并预热（融合层、初始化各预测上下文）"""
+        start = time.perf_counter()
+        model = YOLO(os.path.join(self.weights_dir, weight_file))
+        dummy = np.zeros((self.warmup_imgsz, self.warmup_imgsz, 3), dtype=np.uint8)
+        model.predict(dummy, imgsz=self.warmup_imgsz, verbose=False)
+        pool = PredictorPool(
+            model, size=self.pool_size, max_batch=self.max_batch, max_wait_ms=self.max_wait_ms,
+            slo_ms=self.slo_ms, warmup_imgsz=self.warmup_imgsz
+        )
+        load_time = time.perf_counter() - start
+
+        size_bytes = self._model_size(model, weight_file)
+        logging.info(
+            f"Model {weight_file} loaded in {load_time:.2f}s, "
+            f"~{size_bytes / 1024 / 1024:.1f} MB resident"
+        )
+        return _ModelEntry(weight_file, pool, size_bytes, load_time)
+
+    def _model_size(self, model, weight_file):
+        """估算模型常驻内存（参数 + buffer），失败时退回权重文件大小"""
+        try:
+            module = model.model
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        except Exception:
+            return os.path.getsize(os.path.join(self.weights_dir, weight_file))
+
+    def _evict_if_needed(self):
+        """超出内存预算时按 LRU 淘汰空闲模型（调用方需持有 self._lock）"""
+        total = sum(e.size_bytes for e in self._models.values())
+        for weight_file in list(self._models):
+            if total <= self.memory_budget:
+                break
+            entry = self._models[weight_file]
+            if entry.refs > 0:
+                continue
+            del self._models[weight_file]
+            entry.model.close()
+            total -= entry.size_bytes
+            self.evictions += 1
+            logging.info(f"Model {weight_file} evicted (LRU), {total / 1024 / 1024:.1f} MB still resident")
+
+    def evict(self, weight_file):
+        """手动移除指定模型（正在使用时不移除）"""
+        with self._lock:
+            entry = self._models.get(weight_file)
+            if not entry or entry.refs > 0:
+                return False
+            del self._models[weight_file]
+            entry.model.close()
+            self.evictions += 1
+            return True
+
+    def stats(self):
+        """返回命中/未命中/加载耗时等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "load_count": self.load_count,
+                "load_time_total": round(self.load_time_total, 3),
+                "load_time_avg": round(self.load_time_total / self.load_count, 3) if self.load_count else 0.0,
+                "memory_budget_mb": round(self.memory_budget / 1024 / 1024, 1),
+                "resident_mb": round(sum(e.size_bytes for e in self._models.values()) / 1024 / 1024, 1),
+                "models": [
+                    {
+                        "weight_file": e.weight_file,
+                        "size_mb": round(e.size_bytes / 1024 / 1024, 1),
+                        "load_time": round(e.load_time, 3),
+                        "uses": e.uses,
+                        "in_use": e.refs,
+                        "last_used": e.last_used,
+                        "pool": e.model.stats(),
+                    }
+                    for e in self._models.values()
+                ],
+            }
@@ -0,0 +1,216 @@
+import copy
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from ultralytics.cfg import get_cfg
+
+from modules.batch_probe import profile_predict_latency
+from modules.batch_scheduler import BatchScheduler, LatencyCurve, power_of_two_sizes
+from modules.detect_predictor import accelerated
+
+# 与 YOLO.predict 相同的方法默认参数
+_PREDICT_DEFAULTS = {"conf": 0.25, "batch": 1, "save": False, "mode": "predict"}
+
+
+def _context_model(model):
+    """
+    为预测上下文浅拷贝检测网络：参数与各层子模块全部共享（只读），只复制最后的检测头，
+    使检测头按输入尺寸缓存的 anchors / strides / shape 各上下文独立，并发推理不同尺寸时不会互相覆盖。
+    """
+    ctx = copy.copy(model)
+    ctx._modules = copy.copy(model._modules)
+    layers = copy.copy(model.model)
+    layers._modules = copy.copy(layers._modules)
+    head = next(reversed(layers._modules))
+    layers._modules[head] = copy.copy(layers._modules[head])
+    ctx._modules["model"] = layers
+    return ctx
+
+
+class _Request:
+    """微批队列中的单张图片请求"""
+
+    __slots__ = ("image", "key", "kwargs", "future", "created")
+
+    def __init__(self, image, kwargs):
+        self.image = image
+        self.kwargs = kwargs
+        self.key = repr(sorted(kwargs.items()))  # 参数相同的请求才能合并（参数值可能是 list，不能直接哈希）
+        self.future = Future()
+        self.created = time.perf_counter()
+
+
+class PredictorPool:
+    """
+    同一模型的 N 个独立预测上下文。
+    权重只加载一份、各上下文共享；每个上下文有自己的 predictor（参数、数据源、结果状态），
+    并发请求各取一个空闲上下文，不再在同一个 predictor._lock 上排队。
+
+    max_batch > 1 时启用动态批：并发的单张图片请求进入队列，每当有空闲上下文，由 BatchScheduler
+    按实测的批大小-耗时曲线（以自动批大小探测结果为初值）和 p99 延迟目标 slo_ms 决定合并多少张、还能等多久；
+    负载低时退化为逐张推理。不同尺寸的图片合并后统一 letterbox 到 imgsz（与逐张推理的最小矩形填充略有差异）。
+    接口与 YOLO.predict 一致，可直接替代模型对象使用。
+    """
+
+    def __init__(self, model, size=2, max_batch=1, max_wait_ms=2.0, slo_ms=None, warmup_imgsz=640):
+        self.yolo = model
+        self.model = model.model  # 共享的网络（供自动批大小等按模型测量的逻辑使用）
+        self.size = max(1, int(size))
+        self.max_batch = max(1, int(max_batch))
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用刚用过的上下文
+        dummy = np.zeros((warmup_imgsz, warmup_imgsz, 3), dtype=np.uint8)
+        for _ in range(self.size):
+            # 逐个创建并预热，setup_model 对共享网络的 fuse / half 等原地操作不会并发执行
+            predictor = self._new_predictor()
+            predictor(source=dummy, stream=False)
+            self._idle.put(predictor)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.waits = 0  # 没有空闲上下文而等待的次数
+        self.wait_s = 0.0
+        self.in_use = 0
+        self.max_in_use = 0
+
+        self._queue = None
+        self.scheduler = None
+        if self.max_batch > 1:
+            seed = profile_predict_latency(
+                self.model, imgsz=warmup_imgsz, batch_sizes=power_of_two_sizes(self.max_batch), n=2
+            )
+            self.scheduler = BatchScheduler(self.max_batch, slo_ms, max_wait_ms, curve=LatencyCurve(seed))
+            self._queue = queue.Queue()
+            self._pending = deque()  # 参数与当前批不同、留给下一批的请求（仅分发线程访问）
+            self._slots = threading.Semaphore(self.size)  # 同时执行的批数不超过上下文数
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="micro-batch")
+            threading.Thread(target=self._dispatch, name="micro-batch-dispatcher", daemon=True).start()
+
+    def _new_predictor(self):
+        args = {**self.yolo.overrides, **_PREDICT_DEFAULTS, "verbose": False}
+        predictor = accelerated(self.yolo._smart_load("predictor"))(overrides=args, _callbacks=self.yolo.callbacks)
+        predictor.setup_model(model=_context_model(self.yolo.model), verbose=False)
+        return predictor
+
+    @contextmanager
+    def context(self):
+        """取一个空闲预测上下文，用完归还"""
+        t0 = time.perf_counter()
+        try:
+            predictor = self._idle.get_nowait()
+            waited = False
+        except queue.Empty:
+            predictor = self._idle.get()
+            waited = True
+        with self._lock:
+            self.requests += 1
+            if waited:
+                self.waits += 1
+                self.wait_s += time.perf_counter() - t0
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+        try:
+            yield predictor
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._idle.put(predictor)
+
+    def predict(self, source=None, **kwargs):
+        """与 YOLO.predict 相同的参数与返回值；启用动态批时单张图片请求进入调度队列"""
+        if self._queue is not None and isinstance(source, np.ndarray) and source.ndim == 3:
+            request = _Request(source, kwargs)
+            self._queue.put(request)
+            self.scheduler.arrived(self._queue.qsize() + len(self._pending))
+            return [request.future.result()]
+        return self._run(source, kwargs)
+
+    def _run(self, source, kwargs):
+        with self.context() as predictor:
+            predictor.args = get_cfg(predictor.args, {**self.yolo.overrides, **_PREDICT_DEFAULTS, **kwargs})
+            return predictor(source=source, stream=False)
+
+    def _next_request(self, timeout=None):
+        """先取上一批留下的请求，再取队列；超时返回 None，收到关闭标记时抛出 EOFError"""
+        if self._pending:
+            return self._pending.popleft()
+        try:
+            request = self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        if request is None:
+            raise EOFError
+        return request
+
+    def _dispatch(self):
+        """
+        动态批分发线程：等到有空闲上下文后再组批——上下文都忙时请求在队列中累积，批自然变大；
+        批大小与等待时间由调度器决定，只合并参数相同的请求。
+        """
+        closing = False
+        while not closing:
+            try:
+                first = self._next_request()
+            except EOFError:
+                break
+            self._slots.acquire()
+            batch, skipped = [first], []
+            target, wait = self.scheduler.plan(
+                time.perf_counter() - first.created, 1 + self._queue.qsize() + len(self._pending)
+            )
+            deadline = time.perf_counter() + wait
+            while len(batch) < target:
+                try:
+                    request = self._next_request(deadline - time.perf_counter())
+                except EOFError:
+                    closing = True
+                    break
+                if request is None:
+                    break
+                (batch if request.key == first.key else skipped).append(request)
+            self._pending.extendleft(reversed(skipped))
+            self._executor.submit(self._run_batch, batch)
+        for request in self._pending:
+            self._slots.acquire()
+            self._executor.submit(self._run_batch, [request])
+        self._executor.shutdown(wait=False)
+
+    def _run_batch(self, requests):
+        t0 = time.perf_counter()
+        try:
+            results = self._run([r.image for r in requests], requests[0].kwargs)
+        except Exception as e:
+            logging.error(f"Micro-batch of {len(requests)} images failed: {e}")
+            for r in requests:
+                r.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        done = time.perf_counter()
+        self.scheduler.completed_batch(len(requests), done - t0, [done - r.created for r in requests])
+        for r, result in zip(requests, results):
+            r.future.set_result(result)
+
+    def close(self):
+        """停止微批分发线程（模型被淘汰时调用），已入队的请求处理完后退出"""
+        if self._queue is not None:
+            self._queue.put(None)
+
+    def stats(self):
+        """上下文占用、等待与动态批调度情况"""
+        with self._lock:
+            return {
+                "contexts": self.size,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "requests": self.requests,
+                "waits": self.waits,
+                "avg_wait_ms": round(self.wait_s * 1e3 / self.waits, 2) if self.waits else 0.0,
+                "batching": self.scheduler.stats() if self.scheduler else None,
+            }
@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+
+
+class WindowBackend(ABC):
+    """
+    滑动窗口计数后端接口。
+    默认使用进程内实现；多进程部署使用共享实现（RedisWindowBackend），限额在所有 worker 间共同生效。
+    """
+
+    # 时间戳来源：进程内计数用单调时钟；跨进程共享的计数需要各进程一致的墙上时间
+    clock = staticmethod(time.monotonic)
+
+    @abstractmethod
+    def hit(self, key, now, window):
+        """记录一次事件并返回窗口内的事件数"""
+
+    @abstractmethod
+    def count(self, key, now, window):
+        """返回窗口内的事件数"""
+
+    @abstractmethod
+    def reset(self, key=None):
+        """清除指定键（None 表示全部）"""
+
+
+class MemoryWindowBackend(WindowBackend):
+    """进程内滑动窗口：每个键保存窗口内事件的时间戳"""
+
+    def __init__(self, max_events=1000):
+        # 单键最多保留的时间戳数，超出后计数饱和（足以触发最长封禁）
+        self.max_events = max_events
+        self._events = defaultdict(lambda: deque(maxlen=self.max_events))
+        self._lock = threading.Lock()
+
+    def hit(self, key, now, window):
+        with self._lock:
+            events = self._events[key]
+            events.append(now)
+            return self._trim(events, now, window)
+
+    def count(self, key, now, window):
+        with self._lock:
+            events = self._events.get(key)
+            if not events:
+                return 0
+            n = self._trim(events, now, window)
+            if not n:
+                del self._events[key]
+            return n
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._events.clear()
+            else:
+                self._events.pop(key, None)
+
+    @staticmethod
+    def _trim(events, now, window):
+        while events and events[0] <= now - window:
+            events.popleft()
+        return len(events)
+
+
+class RedisWindowBackend(WindowBackend):
+    """
+    Redis 有序集合滑动窗口：每个键一个 ZSET，成员为单次事件，分值为事件时间戳。
+    记录与计数在同一个 MULTI 事务中完成，多个 worker 共享同一份计数；client 为 redis.Redis 实例。
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, client, prefix='ratelimit:', max_events=1000):
+        self.client = client
+        self.prefix = prefix
+        self.max_events = max_events
+
+    def _key(self, key):
+        parts = key if isinstance(key, tuple) else (key,)
+        return self.prefix + ':'.join(str(p) for p in parts)
+
+    def hit(self, key, now, window):
+        name = self._key(key)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zremrangebyscore(name, '-inf', now - window)
+        pipe.zadd(name, {f"{now:.6f}:{uuid.uuid4().hex}": now})
+        pipe.zremrangebyrank(name, 0, -self.max_events - 1)  # 与进程内实现相同，超出后计数饱和
+        pipe.zcard(name)
+        pipe.expire(name, math.ceil(window) + 1)
+        return pipe.execute()[3]
+
+    def count(self, key, now, window):
+        name = self._key(key)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zremrangebyscore(name, '-inf', now - window)
+        pipe.zcard(name)
+        return pipe.execute()[1]
+
+    def reset(self, key=None):
+        if key is not None:
+            self.client.delete(self._key(key))
+            return
+        names = list(self.client.scan_iter(match=self.prefix + '*', count=500))
+        for i in range(0, len(names), 500):
+            self.client.delete(*names[i:i + 500])
+
+
+class SlidingWindowLimiter:
+    """按 (用户, 动作) 统计最近 window_seconds 秒内的请求数"""
+
+    def __init__(self, window_seconds=60, backend=None):
+        self.window = window_seconds
+        self.backend = backend or MemoryWindowBackend()
+
+    def hit(self, user_id, action):
+        """记录一次请求，返回窗口内该动作的请求数"""
+        return self.backend.hit((user_id, action), self.backend.clock(), self.window)
+
+    def count(self, user_id, action):
+        """窗口内该动作的请求数"""
+        return self.backend.count((user_id, action), self.backend.clock(), self.window)
+
+    def reset(self, user_id=None, actions=('session', 'conversation')):
+        """清除指定用户（None 表示全部用户）的计数"""
+        if user_id is None:
+            self.backend.reset()
+            return
+        for action in actions:
+            self.backend.reset((user_id, action))
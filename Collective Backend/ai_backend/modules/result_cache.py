@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+def link_or_copy(src, dst):
+    """优先用硬链接（不复制文件内容），跨设备等失败时退回复制；返回实际复制的字节数"""
+    try:
+        os.link(src, dst)
+        return 0
+    except OSError:
+        shutil.copy2(src, dst)
+        return os.path.getsize(dst)
+
+
+class ResultCache:
+    """
+    基于内容寻址的检测结果缓存。
+    键为 (上传文件 SHA256, 权重文件, 推理参数)，值为处理后的文件与检测结果 JSON；
+    磁盘持久化，按总大小与存活时间淘汰。
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3, max_age=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age  # 秒
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._index = OrderedDict()  # key -> 元数据，按最近访问排序
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load_index()
+
+    @staticmethod
+    def make_key(file_hash, weight_file, **params):
+        """由文件哈希、权重文件和推理参数（imgsz/conf/iou 等）生成缓存键"""
+        payload = json.dumps({"sha256": file_hash, "weight_file": weight_file, **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """查询缓存，命中返回 {"artifact": 路径, "detections": [...]}，否则返回 None"""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta and time.time() - meta["created_at"] > self.max_age:
+                self._remove(key)
+                self.evictions += 1
+                meta = None
+            if not meta or not os.path.exists(self._artifact_path(meta)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            meta["last_access"] = time.time()
+            self._index.move_to_end(key)
+            self._touch(key, meta["last_access"])
+            return {
+                "artifact": self._artifact_path(meta),
+                "name": meta.get("name"),  # 写入缓存时处理结果的文件名
+                "detections": meta["detections"],
+            }
+
+    def put(self, key, artifact_path, detections):
+        """写入缓存：缓存目录中保存处理后文件的硬链接和元数据，返回复制的字节数（硬链接为 0）"""
+        ext = os.path.splitext(artifact_path)[1]
+        artifact = f"{key}{ext}"
+        meta = {
+            "key": key,
+            "artifact": artifact,
+            "name": os.path.basename(artifact_path),
+            "detections": detections,
+            "size": os.path.getsize(artifact_path),
+            "created_at": time.time(),
+            "last_access": time.time(),
+        }
+        with self._lock:
+            if key in self._index:
+                return 0
+            try:
+                copied = link_or_copy(artifact_path, os.path.join(self.cache_dir, artifact))
+                tmp_path = os.path.join(self.cache_dir, f"{key}.json.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False)
+                os.replace(tmp_path, self._meta_path(key))
+            except Exception as e:
+                logging.error(f"Failed to write result cache entry {key}: {e}")
+                return 0
+            self._index[key] = meta
+            self._evict_if_needed()
+            return copied
+
+    def materialize(self, entry, dest_path):
+        """把缓存中的处理结果放到目标路径（硬链接，不复制内容），返回复制的字节数（无法硬链接时才复制）"""
+        return link_or_copy(entry["artifact"], dest_path)
+
+    def stats(self):
+        """命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "size_mb": round(sum(m["size"] for m in self._index.values()) / 1024 / 1024, 1),
+                "max_size_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "max_age": self.max_age,
+            }
+
+    def _artifact_path(self, meta):
+        return os.path.join(self.cache_dir, meta["artifact"])
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _touch(self, key, now):
+        """把访问时间记在元数据文件的 mtime 上（不重写 JSON），重启后按它恢复 LRU 顺序"""
+        try:
+            os.utime(self._meta_path(key), (now, now))
+        except OSError:
+            pass
+
+    def _load_index(self):
+        """启动时从磁盘元数据重建索引"""
+        metas = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                path = os.path.join(self.cache_dir, filename)
+                with open(path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                # 命中时只更新文件 mtime，取两者较新的作为最近访问时间
+                meta["last_access"] = max(meta["last_access"], os.path.getmtime(path))
+                metas.append(meta)
+            except Exception as e:
+                logging.warning(f"Skipping broken result cache entry {filename}: {e}")
+        for meta in sorted(metas, key=lambda m: m["last_access"]):
+            self._index[meta["key"]] = meta
+        with self._lock:
+            self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        """淘汰过期条目，再按 LRU 淘汰至总大小不超过上限（调用方需持有 self._lock）"""
+        now = time.time()
+        for key in [k for k, m in self._index.items() if now - m["created_at"] > self.max_age]:
+            self._remove(key)
+            self.evictions += 1
+
+        total = sum(m["size"] for m in self._index.values())
+        while self._index and total > self.max_bytes:
+            key, meta = next(iter(self._index.items()))
+            total -= meta["size"]
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key):
+        """删除条目及其磁盘文件（已链接到 processed_images 的结果不受影响）"""
+        meta = self._index.pop(key)
+        for path in (self._artifact_path(meta), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,135 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_from_directory
+from werkzeug.security import safe_join
+
+# 内容寻址文件名：<sha256 前 32 位>.<扩展名>
+CONTENT_NAME_RE = re.compile(r"^([0-9a-f]{32})\.[A-Za-z0-9]+$")
+
+# 预压缩变体：(Content-Encoding, 文件后缀)，按优先级排列
+ENCODING_VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+# 预编码图片变体：原扩展名 -> 变体扩展名（客户端 Accept 含 image/webp 时返回）
+IMAGE_VARIANTS = {".jpg": ".webp", ".jpeg": ".webp", ".png": ".webp"}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """流式计算文件 SHA256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_address(path):
+    """
+    把文件重命名为内容寻址文件名（同目录），返回新路径。
+    内容相同的文件已存在时直接复用并删除当前文件。
+    """
+    directory = os.path.dirname(path)
+    ext = os.path.splitext(path)[1].lower()
+    final_path = os.path.join(directory, f"{file_sha256(path)[:32]}{ext}")
+    if os.path.exists(final_path):
+        os.remove(path)
+    else:
+        os.replace(path, final_path)
+    return final_path
+
+
+class StaticFiles:
+    """
+    处理结果静态文件分发：
+    - 内容寻址文件名永不变化，返回一年有效期的 immutable 缓存头，ETag 即内容哈希；
+    - 支持 Range 请求（视频拖动进度条时只下载需要的片段），无 Range 时由 WSGI 服务器的
+      file_wrapper（gunicorn 等为 sendfile）发送文件；
+    - 配置 accel_prefix 时交给 nginx（X-Accel-Redirect）发送，由 nginx 处理 Range 与 sendfile；
+    - 客户端支持时优先返回同目录下预先生成的变体（.br / .gz 预压缩、.webp 预编码）。
+    """
+
+    def __init__(self, directory, accel_prefix=None, immutable_max_age=365 * 24 * 3600, default_max_age=3600):
+        self.directory = directory
+        self.accel_prefix = accel_prefix  # 例如 '/protected/processed_images/'，对应 nginx internal location
+        self.immutable_max_age = immutable_max_age
+        self.default_max_age = default_max_age
+
+    def _variant(self, filename):
+        """按 Accept / Accept-Encoding 选择已存在的变体，返回 (文件名, Content-Encoding)"""
+        accept_encoding = request.headers.get("Accept-Encoding", "")
+        for encoding, suffix in ENCODING_VARIANTS:
+            if encoding in accept_encoding and self._exists(filename + suffix):
+                return filename + suffix, encoding
+        stem, ext = os.path.splitext(filename)
+        webp = IMAGE_VARIANTS.get(ext.lower())
+        if webp and "image/webp" in request.headers.get("Accept", "") and self._exists(stem + webp):
+            return stem + webp, None
+        return filename, None
+
+    @staticmethod
+    def _vary(filename):
+        """
+        可能影响所选变体的请求头。无论本次是否返回变体都要设置，
+        否则共享缓存会把原文件的响应返回给本可获得变体的客户端（反之亦然）
+        """
+        vary = ["Accept-Encoding"]
+        if os.path.splitext(filename)[1].lower() in IMAGE_VARIANTS:
+            vary.append("Accept")
+        return vary
+
+    def _exists(self, filename):
+        path = safe_join(self.directory, filename)
+        return path is not None and os.path.isfile(path)
+
+    def serve(self, filename):
+        served, encoding = self._variant(filename)
+        match = CONTENT_NAME_RE.match(filename)
+        immutable = bool(match)
+        max_age = self.immutable_max_age if immutable else self.default_max_age
+
+        if self.accel_prefix and self._exists(served):
+            response = Response()
+            response.headers["X-Accel-Redirect"] = self.accel_prefix + served
+            del response.headers["Content-Type"]  # 由 nginx 按文件扩展名设置
+        else:
+            # conditional=True：处理 If-None-Match / If-Modified-Since 和 Range
+            response = send_from_directory(
+                self.directory,
+                served,
+                conditional=True,
+                etag=f"{match.group(1)}{os.path.splitext(served)[1]}" if immutable else True,
+                max_age=max_age,
+            )
+            response.headers["Accept-Ranges"] = "bytes"
+
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+            response.mimetype = mimetypes.guess_type(filename)[0] or response.mimetype
+        for header in self._vary(filename):
+            response.vary.add(header)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+
+def create_webp_variant(path, quality=80):
+    """为处理后的图片预先生成同名 .webp 变体（已存在时跳过），返回变体路径；失败返回 None"""
+    import cv2
+
+    variant = os.path.splitext(path)[0] + ".webp"
+    if os.path.exists(variant):
+        return variant
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    ok, buf = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    if not ok:
+        return None
+    tmp = variant + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf.tobytes())
+    os.replace(tmp, variant)
+    return variant
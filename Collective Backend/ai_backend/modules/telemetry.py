@@ -0,0 +1,241 @@
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+# 请求内统计的阶段（秒）
+STAGES = ("total", "db", "model_load", "preprocess", "inference", "postprocess", "annotate", "encode", "llm")
+# Prometheus 直方图分桶上界（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_current = contextvars.ContextVar("telemetry_request", default=None)
+
+
+class Reservoir:
+    """
+    单个指标的有界统计：固定分桶直方图（计数）+ 固定容量的等概率抽样（用于分位数），
+    内存占用与请求数无关。
+    """
+
+    def __init__(self, size=1024, buckets=BUCKETS):
+        self.size = size
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.samples = []
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._random = random.Random(0)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            # Algorithm R：第 n 个样本以 size/n 的概率替换已有样本
+            j = self._random.randrange(self.count)
+            if j < self.size:
+                self.samples[j] = value
+
+    def snapshot(self):
+        samples = sorted(self.samples)
+
+        def pct(q):
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1e3, 2) if samples else 0.0
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1e3, 2) if self.count else 0.0,
+            "p50_ms": pct(0.5),
+            "p90_ms": pct(0.9),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max * 1e3, 2),
+        }
+
+
+class _RequestScope:
+    """一次请求（或后台任务）内各阶段的累计耗时"""
+
+    def __init__(self, endpoint, category):
+        self.endpoint = endpoint
+        self.category = category
+        self.start = time.perf_counter()
+        self.stages = defaultdict(float)
+
+
+class Telemetry:
+    """
+    按 (接口, 类别, 阶段) 汇总耗时。
+    请求期间各阶段通过 add() 累加到当前请求，请求结束时统一写入统计；
+    每个请求同时计入 category="all" 和其所属类别。
+    """
+
+    def __init__(self, reservoir_size=1024, max_series=1000):
+        self.reservoir_size = reservoir_size
+        self.max_series = max_series  # 序列数上限，超出后新类别归入 "other"
+        self._series = {}  # (endpoint, category, stage) -> Reservoir
+        self._errors = defaultdict(int)  # endpoint -> 5xx / 异常次数
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------------------- 记录
+
+    def observe(self, endpoint, stage, seconds, category=None):
+        """直接记录一次阶段耗时"""
+        with self._lock:
+            for cat in ("all", category) if category else ("all",):
+                key = (endpoint, cat, stage)
+                reservoir = self._series.get(key)
+                if reservoir is None:
+                    if len(self._series) >= self.max_series:
+                        key = (endpoint, "other", stage)
+                        reservoir = self._series.get(key)
+                    if reservoir is None:
+                        reservoir = self._series[key] = Reservoir(self.reservoir_size)
+                reservoir.add(seconds)
+
+    def add(self, stage, seconds):
+        """把阶段耗时累加到当前请求（不在请求内时忽略）"""
+        scope = _current.get()
+        if scope is not None:
+            scope.stages[stage] += seconds
+
+    def add_speed(self, speed):
+        """累加 Results.speed 风格的毫秒耗时字典（preprocess / inference / postprocess / ...）"""
+        for stage, ms in (speed or {}).items():
+            if ms is not None:
+                self.add(stage, ms / 1e3)
+
+    def set_category(self, category):
+        """设置当前请求的类别"""
+        scope = _current.get()
+        if scope is not None:
+            scope.category = category
+
+    @contextmanager
+    def stage(self, name):
+        """计时代码块并累加到当前请求"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    @contextmanager
+    def request(self, endpoint, category=None):
+        """请求（或后台任务）范围：结束时写入总耗时和各阶段耗时"""
+        scope = _RequestScope(endpoint, category)
+        token = _current.set(scope)
+        try:
+            yield scope
+        except Exception:
+            self._error(endpoint)
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(scope)
+
+    def _error(self, endpoint):
+        with self._lock:
+            self._errors[endpoint] += 1
+
+    def _finish(self, scope):
+        self.observe(scope.endpoint, "total", time.perf_counter() - scope.start, scope.category)
+        for stage, seconds in scope.stages.items():
+            self.observe(scope.endpoint, stage, seconds, scope.category)
+
+    def timed(self, endpoint):
+        """
+        Flask 视图装饰器。流式响应在响应关闭（生成器结束）时才写入统计，
+        生成器内的阶段需用 bind() 绑定到该请求。
+        """
+
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                from flask import make_response
+
+                scope = _RequestScope(endpoint, None)
+                token = _current.set(scope)
+                try:
+                    response = make_response(f(*args, **kwargs))
+                except Exception:
+                    self._error(endpoint)
+                    self._finish(scope)
+                    raise
+                finally:
+                    _current.reset(token)
+                if response.status_code >= 500:
+                    self._error(endpoint)
+                if response.is_streamed:
+                    response.call_on_close(lambda: self._finish(scope))
+                else:
+                    self._finish(scope)
+                return response
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def bind(events):
+        """把生成器绑定到当前请求：每次迭代时恢复请求范围（用于流式响应）"""
+        scope = _current.get()
+        for_each = iter(events)
+        while True:
+            token = _current.set(scope)
+            try:
+                item = next(for_each)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield item
+
+    # ---------------------------------------------------------------- 导出
+
+    def stats(self):
+        """{endpoint: {"errors": n, "categories": {category: {stage: 分位数}}}}"""
+        with self._lock:
+            series = {key: r.snapshot() for key, r in self._series.items()}
+            errors = dict(self._errors)
+        result = {}
+        for (endpoint, category, stage), snapshot in sorted(series.items()):
+            entry = result.setdefault(endpoint, {"errors": errors.get(endpoint, 0), "categories": {}})
+            entry["categories"].setdefault(category, {})[stage] = snapshot
+        return result
+
+    def prometheus(self, prefix="huimou"):
+        """Prometheus 文本格式（直方图 + 错误计数）"""
+        name = f"{prefix}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent per request stage.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            for (endpoint, category, stage), r in series:
+                labels = f'endpoint="{endpoint}",category="{category}",stage="{stage}"'
+                cumulative = 0
+                for bound, n in zip(r.buckets, r.bucket_counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {r.count}')
+                lines.append(f"{name}_sum{{{labels}}} {r.sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {r.count}")
+            errors = sorted(self._errors.items())
+        lines += [f"# HELP {prefix}_errors_total Failed requests.", f"# TYPE {prefix}_errors_total counter"]
+        lines += [f'{prefix}_errors_total{{endpoint="{endpoint}"}} {n}' for endpoint, n in errors]
+        return "\n".join(lines) + "\n"
+
+
+# 全局实例
+telemetry = Telemetry()
@@ -0,0 +1,86 @@
+import logging
+import os
+
+import cv2
+
+
+class ThumbnailStore:
+    """
+    处理结果缩略图。
+    检测完成时为处理后的图片（或视频首帧）生成长边不超过 max_side 的 WebP 预览，
+    编码失败时退回 JPEG；缩略图文件名由处理结果文件名决定，内容不再变化。
+    """
+
+    def __init__(self, thumb_dir, max_side=256, quality=75):
+        self.thumb_dir = thumb_dir
+        self.max_side = max_side
+        self.quality = quality
+        os.makedirs(thumb_dir, exist_ok=True)
+
+    def _candidates(self, processed_path):
+        stem = os.path.splitext(os.path.basename(processed_path))[0]
+        return [f"{stem}.webp", f"{stem}.jpg"]
+
+    def filename_for(self, processed_path):
+        """已生成的缩略图文件名，没有时返回 None"""
+        if not processed_path:
+            return None
+        for name in self._candidates(processed_path):
+            if os.path.exists(os.path.join(self.thumb_dir, name)):
+                return name
+        return None
+
+    def create(self, processed_path, is_video=False):
+        """生成缩略图，返回文件名；失败时记录日志并返回 None（不影响检测结果）"""
+        try:
+            image = self._read_frame(processed_path) if is_video else self._read_image(processed_path)
+            if image is None:
+                raise ValueError(f"Cannot decode {processed_path}")
+            h, w = image.shape[:2]
+            scale = self.max_side / max(h, w)
+            if scale < 1:
+                image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+
+            webp, jpg = self._candidates(processed_path)
+            ok, buf = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, self.quality])
+            name = webp
+            if not ok:  # OpenCV 未编译 WebP 支持
+                ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                name = jpg
+            if not ok:
+                raise ValueError("Thumbnail encoding failed")
+            tmp = os.path.join(self.thumb_dir, f".{name}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(buf.tobytes())
+            os.replace(tmp, os.path.join(self.thumb_dir, name))
+            return name
+        except Exception as e:
+            logging.warning(f"Failed to create thumbnail for {processed_path}: {e}")
+            return None
+
+    def _read_image(self, path):
+        """先按 1/4 缩小解码（JPEG 解码时直接降采样，开销远小于整图解码），不够大再解码原图"""
+        image = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_4)
+        if image is None or max(image.shape[:2]) < self.max_side:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+        return image
+
+    @staticmethod
+    def _read_frame(path):
+        """读取视频首帧"""
+        cap = cv2.VideoCapture(path)
+        try:
+            ok, frame = cap.read()
+            return frame if ok else None
+        finally:
+            cap.release()
+
+    def delete(self, processed_path):
+        """删除缩略图"""
+        name = self.filename_for(processed_path)
+        if name:
+            try:
+                os.remove(os.path.join(self.thumb_dir, name))
+            except OSError:
+                pass
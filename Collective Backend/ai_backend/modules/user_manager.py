@@ -1,7 +1,7 @@
 import hashlib
 import time
 from datetime import datetime, timedelta
-from config.database import execute_query
+from config.database import execute_query, transaction
 import logging
 
 class UserManager:
@@ -32,37 +32,31 @@ class UserManager:
             if not UserManager.verify_invite_code(invite_code):
                 raise Exception("Invalid invite code")
             
-            # 插入管理员名
-            execute_query(
-                "INSERT INTO admin_names (admin_name) VALUES (%s)",
-                (username,)
-            )
-            
-            # 获取管理员ID
-            admin_data = execute_query(
-                "SELECT admin_id FROM admin_names WHERE admin_name = %s",
-                (username,),
-                fetch=True
-            )
-            
-            if not admin_data:
-                raise Exception("Failed to create admin")
-            
-            admin_id = admin_data[0]['admin_id']
-            
-            # 插入密码
-            hashed_password = UserManager.hash_password(password)
-            execute_query(
-                "INSERT INTO admin_passwords (admin_id, password) VALUES (%s, %s)",
-                (admin_id, hashed_password)
-            )
-            
-            # 设置管理员权限
-            admin_permissions = ['manage', 'view_ALLdiagram']
-            for perm in admin_permissions:
-                execute_query(
+            # 管理员名、密码、权限在同一事务中写入
+            with transaction() as tx:
+                # 插入管理员名
+                tx.execute(
+                    "INSERT INTO admin_names (admin_name) VALUES (%s)",
+                    (username,)
+                )
+                
+                # 获取管理员ID
+                admin_id = tx.lastrowid
+                if not admin_id:
+                    raise Exception("Failed to create admin")
+                
+                # 插入密码
+                hashed_password = UserManager.hash_password(password)
+                tx.execute(
+                    "INSERT INTO admin_passwords (admin_id, password) VALUES (%s, %s)",
+                    (admin_id, hashed_password)
+                )
+                
+                # 设置管理员权限
+                admin_permissions = ['manage', 'view_ALLdiagram']
+                tx.executemany(
                     "INSERT INTO permissions (admin_id, permission_value, permission_type) VALUES (%s, %s, %s)",
-                    (admin_id, 1, perm)
+                    [(admin_id, 1, perm) for perm in admin_permissions]
                 )
             
             return admin_id
@@ -74,51 +68,45 @@ class UserManager:
     def create_user(username: str, password: str, role: str = 'user') -> int:
         """创建新用户"""
         try:
-            # 插入用户名和角色（只插入一次）
-            execute_query(
-                "INSERT INTO user_names (username, role) VALUES (%s, %s)",
-                (username, role)
-            )
-            
-            # 获取用户ID
-            user_data = execute_query(
-                "SELECT user_id FROM user_names WHERE username = %s",
-                (username,),
-                fetch=True
-            )
-            
-            if not user_data:
-                raise Exception("Failed to create user")
-            
-            user_id = user_data[0]['user_id']
-            
-            # 插入密码
-            hashed_password = UserManager.hash_password(password)
-            execute_query(
-                "INSERT INTO user_passwords (user_id, password) VALUES (%s, %s)",
-                (user_id, hashed_password)
-            )
-            
-            # 初始化安全统计
-            execute_query(
-                "INSERT INTO user_security_stats (user_id) VALUES (%s)",
-                (user_id,)
-            )
-            
-            # 初始化攻击统计
-            execute_query(
-                "INSERT INTO user_attack_stats (user_id) VALUES (%s)",
-                (user_id,)
-            )
-            
-            # 设置默认权限
-            permissions = ['upload', 'chat']
-            if role == 'admin':
-                permissions.extend(['ban_user', 'unban_user'])
-            for perm in permissions:
-                execute_query(
+            # 用户名、密码、统计、权限在同一事务中写入
+            with transaction() as tx:
+                # 插入用户名和角色（只插入一次）
+                tx.execute(
+                    "INSERT INTO user_names (username, role) VALUES (%s, %s)",
+                    (username, role)
+                )
+                
+                # 获取用户ID
+                user_id = tx.lastrowid
+                if not user_id:
+                    raise Exception("Failed to create user")
+                
+                # 插入密码
+                hashed_password = UserManager.hash_password(password)
+                tx.execute(
+                    "INSERT INTO user_passwords (user_id, password) VALUES (%s, %s)",
+                    (user_id, hashed_password)
+                )
+                
+                # 初始化安全统计
+                tx.execute(
+                    "INSERT INTO user_security_stats (user_id) VALUES (%s)",
+                    (user_id,)
+                )
+                
+                # 初始化攻击统计
+                tx.execute(
+                    "INSERT INTO user_attack_stats (user_id) VALUES (%s)",
+                    (user_id,)
+                )
+                
+                # 设置默认权限
+                permissions = ['upload', 'chat']
+                if role == 'admin':
+                    permissions.extend(['ban_user', 'unban_user'])
+                tx.executemany(
                     "INSERT INTO permissions (user_id, permission_value, permission_type) VALUES (%s, %s, %s)",
-                    (user_id, 1, perm)
+                    [(user_id, 1, perm) for perm in permissions]
                 )
             
             return user_id
@@ -0,0 +1,130 @@
+import logging
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+
+
+def ffmpeg_executable():
+    """ffmpeg 可执行文件路径：优先使用 imageio-ffmpeg 自带的版本，其次是 PATH 中的 ffmpeg"""
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe
+
+        return get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        exe = shutil.which("ffmpeg")
+        if exe is None:
+            raise FileNotFoundError("ffmpeg executable not found")
+        return exe
+
+
+class FfmpegPipeEncoder:
+    """
+    BGR 原始帧直接写入 ffmpeg 标准输入，由 ffmpeg 完成颜色转换和 libx264 编码。
+    写入在 ffmpeg 处理不过来时阻塞，与流水线的有界队列一起形成背压。
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, path, size, fps, preset="veryfast", crf=23):
+        width, height = size
+        cmd = [
+            ffmpeg_executable(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:.6g}", "-i", "-",
+            "-an", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",  # yuv420p 要求宽高为偶数
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            # faststart：moov 索引放在文件开头，浏览器无需下载完整文件即可播放和拖动
+            "-movflags", "+faststart", path,
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited while encoding: {self._stderr()}")
+
+    def close(self):
+        self._proc.stdin.close()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed with code {self._proc.returncode}: {self._stderr()}")
+        self._proc.stderr.close()
+
+    def abort(self):
+        self._proc.kill()
+        self._proc.wait()
+        self._proc.stdin.close()
+        self._proc.stderr.close()
+
+    def _stderr(self):
+        self._proc.wait()
+        return self._proc.stderr.read().decode("utf-8", "replace").strip()
+
+
+class Cv2Encoder:
+    """
+    cv2.VideoWriter 编码（与 BasePredictor 保存视频的方式相同）。
+    优先使用 H.264（avc1），OpenCV 未编译 H.264 支持时退回 mp4v，后者部分浏览器无法播放。
+    """
+
+    name = "cv2"
+
+    def __init__(self, path, size, fps, preset=None, crf=None):
+        for fourcc in ("avc1", "mp4v"):
+            self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+            if self._writer.isOpened():
+                self.fourcc = fourcc
+                break
+        else:
+            raise RuntimeError(f"cv2.VideoWriter cannot open {path}")
+
+    def write(self, frame):
+        self._writer.write(frame)
+
+    def close(self):
+        self._writer.release()
+
+    abort = close
+
+
+class MoviepyEncoder:
+    """moviepy FFMPEG_VideoWriter 编码（旧实现，作为兜底）；moviepy 只接受 RGB 帧，需要额外转换一次"""
+
+    name = "moviepy"
+
+    def __init__(self, path, size, fps, preset="veryfast", crf=23):
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+        self._writer = FFMPEG_VideoWriter(
+            path, size, fps, codec="libx264", preset=preset,
+            ffmpeg_params=["-crf", str(crf), "-movflags", "+faststart"]
+        )
+
+    def write(self, frame):
+        self._writer.write_frame(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def close(self):
+        self._writer.close()
+
+    abort = close
+
+
+ENCODERS = {encoder.name: encoder for encoder in (FfmpegPipeEncoder, MoviepyEncoder, Cv2Encoder)}
+
+
+def open_encoder(path, size, fps, backend="ffmpeg", preset="veryfast", crf=23):
+    """
+    打开视频编码器，输入为 BGR 帧。指定的后端不可用时依次尝试 ffmpeg、moviepy、cv2。
+    preset / crf 只对 libx264 后端（ffmpeg、moviepy）生效。
+    """
+    if backend not in ENCODERS:
+        raise ValueError(f"Unknown video encoder: {backend}, expected one of: {', '.join(ENCODERS)}")
+    errors = []
+    for name in [backend] + [name for name in ENCODERS if name != backend]:
+        try:
+            return ENCODERS[name](path, size, fps, preset=preset, crf=crf)
+        except (ImportError, OSError, RuntimeError) as e:
+            logging.warning(f"Video encoder {name} unavailable: {e}")
+            errors.append(f"{name}: {e}")
+    raise RuntimeError(f"No video encoder available ({'; '.join(errors)})")
@@ -0,0 +1,352 @@
+import logging
+import queue
+import threading
+import time
+import weakref
+
+import cv2
+import numpy as np
+
+from modules.batch_probe import check_predict_batch_size
+from modules.video_encoders import open_encoder
+from modules.video_sampling import capped_size, interpolate_boxes, read_keyframes
+
+_STOP = object()  # 流水线结束标记
+
+# 自动批大小的测量结果，按模型缓存（模型被注册表淘汰后自动失效）
+_AUTO_BATCH = weakref.WeakKeyDictionary()
+
+
+def resolve_batch_size(model, batch_size, imgsz=640):
+    """batch_size <= 0 时按推理吞吐量自动选择批大小（每个模型只测量一次）"""
+    if batch_size > 0:
+        return int(batch_size)
+    if model not in _AUTO_BATCH:
+        _AUTO_BATCH[model] = check_predict_batch_size(model.model, imgsz=imgsz)
+    return _AUTO_BATCH[model]
+
+
+class _StageTimer:
+    """记录单个阶段的处理耗时与等待耗时"""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.wait = 0.0
+        self.items = 0
+
+    def as_dict(self):
+        return {
+            "busy_s": round(self.busy, 3),
+            "wait_s": round(self.wait, 3),
+            "items": self.items,
+            "ms_per_item": round(self.busy * 1e3 / self.items, 2) if self.items else 0.0,
+        }
+
+
+class VideoPipeline:
+    """
+    视频处理流水线：解码线程 → 批量推理 → 标注 → 增量编码（编码后端见 video_encoders.open_encoder）。
+    各阶段之间通过有界队列衔接，内存峰值为 O(队列深度) 而非 O(视频长度)。
+    支持抽帧推理（vid_stride）、分辨率上限（max_side）和只解码关键帧（keyframes_only），
+    未推理帧的检测框按 fill 沿用（hold）、插值（interpolate）或不输出该帧（drop），见 video_sampling.VIDEO_MODES。
+    """
+
+    def __init__(self, model, queue_size=8, batch_size=1, imgsz=640, conf=0.25, iou=0.45,
+                 vid_stride=1, max_side=None, keyframes_only=False, fill="hold", keyframe_fps=5, record_boxes=False,
+                 encoder=None):
+        self.model = model
+        self.batch_size = resolve_batch_size(model, batch_size, imgsz)
+        self.queue_size = max(queue_size, self.batch_size)  # 至少能容纳一个完整批次
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.vid_stride = max(1, int(vid_stride))
+        self.max_side = max_side
+        self.keyframes_only = keyframes_only
+        self.fill = fill
+        self.keyframe_fps = keyframe_fps
+        self.encoder = dict(encoder or {})  # open_encoder 参数：backend / preset / crf
+        self._encoder_name = None
+
+        self._stop = threading.Event()
+        self._error = None
+        self._timers = {name: _StageTimer() for name in ("decode", "inference", "annotate", "encode")}
+        self._peak_depth = {}
+        self._queue_names = {}
+        self._batches = 0
+        self._speed = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}  # Results.speed 累计（毫秒）
+        self._size = None  # 缩放后的 (宽, 高)，None 表示保持原分辨率
+        self.detections = []  # 有检测目标的推理帧：[{"frame": i, "detections": [...]}]
+        # record_boxes=True 时记录每个输出帧实际绘制的框 (N, 6)，用于评估抽帧模式的精度
+        self.frame_boxes = [] if record_boxes else None
+
+    def run(self, source_path, output_path):
+        """处理视频并写入 output_path，返回各阶段耗时统计"""
+        cap = cv2.VideoCapture(source_path)
+        if not cap.isOpened():
+            logging.error(f"Failed to open video file: {source_path}")
+            raise ValueError(f"Failed to open video file: {source_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if self.max_side and max(width, height) > self.max_side:
+            self._size = capped_size(width, height, self.max_side)
+        if self.keyframes_only:
+            cap.release()
+            frames = read_keyframes(source_path, self._size or capped_size(width, height, None), self.keyframe_fps)
+            out_fps = self.keyframe_fps
+        else:
+            frames = None
+            out_fps = fps / self.vid_stride if self.fill == "drop" else fps
+
+        frame_q = queue.Queue(maxsize=self.queue_size)
+        result_q = queue.Queue(maxsize=self.queue_size)
+        annotated_q = queue.Queue(maxsize=self.queue_size)
+        self._queue_names = {id(frame_q): "frames", id(result_q): "results", id(annotated_q): "annotated"}
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._guard, args=(self._decode, cap, frames, frame_q), daemon=True),
+            threading.Thread(target=self._guard, args=(self._infer, frame_q, result_q), daemon=True),
+            threading.Thread(target=self._guard, args=(self._annotate, result_q, annotated_q), daemon=True),
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            self._encode(annotated_q, output_path, out_fps)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+            cap.release()
+            if frames is not None:
+                frames.close()
+
+        if self._error:
+            logging.error(f"Video pipeline failed: {self._error}")
+            raise self._error
+        if not self._timers["encode"].items:
+            raise ValueError(f"No frames decoded from video file: {source_path}")
+
+        stats = {name: timer.as_dict() for name, timer in self._timers.items()}
+        stats["frames"] = self._timers["encode"].items
+        stats["sampled_frames"] = self._timers["inference"].items
+        stats["wall_s"] = round(time.perf_counter() - start, 3)
+        stats["batch_size"] = self.batch_size
+        stats["batches"] = self._batches
+        stats["peak_queue_depth"] = self._peak_depth
+        stats["speed"] = {k: round(v, 1) for k, v in self._speed.items()}
+        stats["encoder"] = self._encoder_name
+        stats["mode"] = {
+            "vid_stride": self.vid_stride,
+            "max_side": self.max_side,
+            "keyframes_only": self.keyframes_only,
+            "fill": self.fill,
+            "output_size": list(self._size or (width, height)),
+            "output_fps": round(out_fps, 2),
+        }
+        logging.info(f"Video saved successfully: {output_path} ({stats['frames']} frames in {stats['wall_s']}s)")
+        return stats
+
+    # ---------------------------------------------------------------- 各阶段
+
+    def _decode(self, cap, keyframes, out_q):
+        """解码线程：逐帧读取视频，输出 (输出帧序号, BGR 帧, 是否推理)"""
+        timer = self._timers["decode"]
+        source_index = 0
+        previous = None
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            if keyframes is not None:
+                # 只解码关键帧：ffmpeg 按固定帧率重复关键帧，重复帧沿用上一帧的检测结果
+                frame = next(keyframes, None)
+                ret = frame is not None
+                sampled = ret and (previous is None or not np.array_equal(frame, previous))
+                previous = frame
+            else:
+                sampled = source_index % self.vid_stride == 0
+                if self.fill == "drop" and not sampled:
+                    # 不输出未推理帧：和 LoadImagesAndVideos 一样只 grab，不做颜色转换
+                    ret = cap.grab()
+                    timer.busy += time.perf_counter() - t0
+                    source_index += 1
+                    if not ret:
+                        break
+                    continue
+                ret, frame = cap.read()
+                if ret and self._size:
+                    frame = cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+            timer.busy += time.perf_counter() - t0
+            if not ret:
+                break
+            self._put(out_q, (timer.items, frame, sampled), timer)
+            timer.items += 1
+            source_index += 1
+        self._put(out_q, _STOP, timer)
+
+    def _infer(self, in_q, out_q):
+        """
+        推理阶段：推理帧凑满 batch_size 后一次前向，再与夹在中间的未推理帧按帧序一起输出 (序号, 帧, 结果或 None)。
+        """
+        timer = self._timers["inference"]
+        window = []  # 第一个待推理帧及其之后的帧
+        pending = 0
+        while True:
+            item = self._get(in_q, timer)
+            if item is _STOP:
+                if pending:
+                    self._predict_window(window, out_q, timer)
+                break
+            index, frame, sampled = item
+            if not sampled and not pending:
+                # 前面没有待推理的帧，可直接输出
+                self._put(out_q, (index, frame, None), timer)
+                continue
+            window.append(item)
+            pending += int(sampled)
+            if pending >= self.batch_size:
+                self._predict_window(window, out_q, timer)
+                window, pending = [], 0
+        self._put(out_q, _STOP, timer)
+
+    def _predict_window(self, window, out_q, timer):
+        indices = [index for index, _, sampled in window if sampled]
+        frames = [frame for _, frame, sampled in window if sampled]
+        t0 = time.perf_counter()
+        results = self.model.predict(frames, save=False, imgsz=self.imgsz, conf=self.conf, iou=self.iou)
+        timer.busy += time.perf_counter() - t0
+        if results is None or len(results) != len(frames):
+            raise ValueError("Model prediction failed for frame")
+        timer.items += len(frames)
+        self._batches += 1
+        by_index = dict(zip(indices, results))
+        for index, frame, _ in window:
+            result = by_index.get(index)
+            if result is not None:
+                for k in self._speed:
+                    self._speed[k] += result.speed.get(k) or 0.0
+            self._put(out_q, (index, frame, result), timer)
+
+    def _annotate(self, in_q, out_q):
+        """标注阶段：绘制检测框（未推理帧沿用或插值），输出 BGR 帧"""
+        timer = self._timers["annotate"]
+        prev = None  # 上一推理帧 (序号, 框 ndarray, Results)
+        waiting = []  # interpolate 模式下等待下一推理帧的 (序号, 帧)
+        while True:
+            item = self._get(in_q, timer)
+            if item is _STOP:
+                for index, frame in waiting:  # 视频末尾没有下一推理帧，沿用上一帧
+                    self._emit(out_q, timer, index, self._draw(prev, frame))
+                break
+            index, frame, result = item
+            t0 = time.perf_counter()
+            if result is None:
+                if self.fill == "interpolate" and prev is not None:
+                    waiting.append((index, frame))
+                    timer.busy += time.perf_counter() - t0
+                    continue
+                self._emit(out_q, timer, index, self._draw(prev, frame), t0)
+                continue
+
+            boxes = result.boxes.data.cpu().numpy()
+            for j, waiting_frame in waiting:
+                t = (j - prev[0]) / (index - prev[0])
+                self._emit(out_q, timer, j, self._draw(prev, waiting_frame, interpolate_boxes(prev[1], boxes, t)))
+            waiting = []
+            if len(boxes):
+                self.detections.append({"frame": index, "detections": result.summary()})
+            prev = (index, boxes, result)
+            self._emit(out_q, timer, index, (result.plot(), boxes), t0)
+        self._put(out_q, _STOP, timer)
+
+    def _draw(self, prev, frame, boxes=None):
+        """在未推理帧上绘制上一推理帧的框（或给定的插值框），返回 (标注图, 框)"""
+        if prev is None:
+            return frame, np.zeros((0, 6), dtype=np.float32)
+        if boxes is None:
+            return prev[2].plot(img=frame), prev[1]
+        import torch
+
+        result = prev[2].new()
+        result.update(boxes=torch.from_numpy(boxes))
+        return result.plot(img=frame), boxes
+
+    def _emit(self, out_q, timer, index, drawn, t0=None):
+        annotated, boxes = drawn
+        if self.frame_boxes is not None:
+            self.frame_boxes.append(boxes)
+        if t0 is not None:
+            timer.busy += time.perf_counter() - t0
+        timer.items += 1
+        self._put(out_q, (index, annotated), timer)
+
+    def _encode(self, in_q, output_path, fps):
+        """编码阶段（调用线程）：从有界队列逐帧取出写入编码器"""
+        timer = self._timers["encode"]
+        writer = None
+        try:
+            while True:
+                item = self._get(in_q, timer)
+                if item is _STOP:
+                    break
+                index, frame = item
+                if index != timer.items:
+                    raise RuntimeError(f"Video frame out of order: expected {timer.items}, got {index}")
+                t0 = time.perf_counter()
+                if writer is None:
+                    writer = open_encoder(output_path, (frame.shape[1], frame.shape[0]), fps, **self.encoder)
+                    self._encoder_name = writer.name
+                writer.write(frame)
+                timer.busy += time.perf_counter() - t0
+                timer.items += 1
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            t0 = time.perf_counter()
+            writer.close()  # 等待编码器写完剩余帧
+            timer.busy += time.perf_counter() - t0
+
+    # ---------------------------------------------------------------- 工具方法
+
+    def _guard(self, stage, *args):
+        """运行后台阶段，出错时终止整条流水线"""
+        try:
+            stage(*args)
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _put(self, q, item, timer):
+        """带停止检查的阻塞写入，下游满时等待（背压）"""
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        timer.wait += time.perf_counter() - t0
+        name = self._queue_names.get(id(q))
+        if name:
+            self._peak_depth[name] = max(self._peak_depth.get(name, 0), q.qsize())
+
+    def _get(self, q, timer):
+        """带停止检查的阻塞读取，流水线终止时返回结束标记"""
+        t0 = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _STOP
+        finally:
+            timer.wait += time.perf_counter() - t0
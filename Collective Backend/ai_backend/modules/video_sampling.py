@@ -0,0 +1,94 @@
+import subprocess
+
+import numpy as np
+
+# 视频检测模式预设
+#   vid_stride      每隔 N 帧推理一次
+#   max_side        解码后长边上限（像素），同时决定输出分辨率；None 表示保持原分辨率
+#   keyframes_only  只解码关键帧（ffmpeg -skip_frame nokey），按 keyframe_fps 输出
+#   fill            未推理帧的检测框：hold 沿用上一推理帧，interpolate 在前后推理帧之间线性插值，
+#                   drop 不输出未推理帧（只 grab 不解码，输出帧率 = 源帧率 / vid_stride）
+VIDEO_MODES = {
+    "full": dict(vid_stride=1, max_side=None, keyframes_only=False, fill="hold"),
+    "balanced": dict(vid_stride=2, max_side=1280, keyframes_only=False, fill="interpolate"),
+    "fast": dict(vid_stride=4, max_side=960, keyframes_only=False, fill="interpolate"),
+    "keyframes": dict(vid_stride=1, max_side=960, keyframes_only=True, fill="hold", keyframe_fps=5),
+}
+
+
+def capped_size(width, height, max_side):
+    """按长边上限等比缩放后的尺寸（取偶数，满足 yuv420p 编码要求）"""
+    scale = min(1.0, max_side / max(width, height)) if max_side else 1.0
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def box_iou(a, b):
+    """两组 xyxy 框的 IoU 矩阵 (len(a), len(b))"""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_boxes(prev, nxt, iou_thres=0.3):
+    """按类别贪心匹配前后两帧的框，返回 [(prev_i, next_j)]"""
+    iou = box_iou(prev[:, :4], nxt[:, :4])
+    if iou.size:
+        iou[prev[:, None, 5] != nxt[None, :, 5]] = 0  # 只匹配同类别
+    pairs = []
+    while iou.size and iou.max() >= iou_thres:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        pairs.append((int(i), int(j)))
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return pairs
+
+
+def interpolate_boxes(prev, nxt, t, iou_thres=0.3):
+    """
+    在两组检测框 (N, 6: x1, y1, x2, y2, conf, cls) 之间按比例 t∈[0, 1] 线性插值。
+    匹配上的框插值坐标和置信度；未匹配的旧框保留到中点，新框从中点开始出现。
+    """
+    prev = np.asarray(prev, dtype=np.float32).reshape(-1, 6)
+    nxt = np.asarray(nxt, dtype=np.float32).reshape(-1, 6)
+    pairs = match_boxes(prev, nxt, iou_thres)
+    out = [np.append(prev[i, :5] * (1 - t) + nxt[j, :5] * t, nxt[j, 5]) for i, j in pairs]
+    matched_prev = {i for i, _ in pairs}
+    matched_next = {j for _, j in pairs}
+    if t < 0.5:
+        out += [prev[i] for i in range(len(prev)) if i not in matched_prev]
+    else:
+        out += [nxt[j] for j in range(len(nxt)) if j not in matched_next]
+    return np.stack(out).astype(np.float32) if out else np.zeros((0, 6), dtype=np.float32)
+
+
+def read_keyframes(source_path, size, fps, ffmpeg_exe=None):
+    """
+    只解码关键帧（ffmpeg -skip_frame nokey），缩放到 size 并按 fps 输出恒定帧率的 BGR 帧；
+    两个关键帧之间由 ffmpeg 重复上一关键帧补齐，时间轴与原视频一致。
+    """
+    if ffmpeg_exe is None:
+        from modules.video_encoders import ffmpeg_executable
+
+        ffmpeg_exe = ffmpeg_executable()
+    width, height = size
+    cmd = [
+        ffmpeg_exe, "-loglevel", "error", "-skip_frame", "nokey", "-i", source_path,
+        "-vf", f"fps={fps},scale={width}:{height}", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1",
+    ]
+    frame_bytes = width * height * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_bytes)
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
@@ -3,74 +3,179 @@ import time
 import threading
 from modules.ddos_detector import DDoSDetector
 from modules.user_manager import UserManager
+from modules.auth_cache import auth_cache
 import logging
 
+# 每批解封的用户数（单个事务内处理，限制锁持有时间）
+UNBAN_CHUNK_SIZE = 500
+
+
+class _JobStats:
+    """单个定时任务的运行统计"""
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval  # 秒
+        self.runs = 0
+        self.failures = 0
+        self.overlaps = 0  # 到期时上一次仍在运行而被跳过的次数
+        self.overruns = 0  # 运行时间超过调度间隔的次数
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_started = None
+        self.running = False
+
+    def as_dict(self):
+        return {
+            "interval_s": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "overlaps": self.overlaps,
+            "overruns": self.overruns,
+            "running": self.running,
+            "last_started": self.last_started,
+            "last_duration_s": round(self.last_duration, 3),
+            "avg_duration_s": round(self.total_duration / self.runs, 3) if self.runs else 0.0,
+            "max_duration_s": round(self.max_duration, 3),
+        }
+
+
 class TaskScheduler:
     def __init__(self):
         self.running = False
         self.thread = None
-    
+        self._schedule = schedule.Scheduler()
+        self._wakeup = threading.Event()
+        self._jobs = {}  # 任务名 -> _JobStats
+        self._lock = threading.Lock()
+
     def start(self):
         """启动定时任务"""
         if not self.running:
             self.running = True
+            self._wakeup.clear()
             self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
             self.thread.start()
             logging.info("Task scheduler started")
-    
+
     def stop(self):
         """停止定时任务"""
         self.running = False
+        self._wakeup.set()
         if self.thread:
             self.thread.join()
         logging.info("Task scheduler stopped")
-    
+
+    def stats(self):
+        """各定时任务的运行次数、耗时和重叠情况"""
+        with self._lock:
+            return {name: job.as_dict() for name, job in self._jobs.items()}
+
+    def _every(self, seconds, name, func):
+        """注册任务：每次在独立线程运行，上一次未结束时跳过并计为重叠"""
+        with self._lock:
+            if name in self._jobs:
+                return
+            self._jobs[name] = _JobStats(name, seconds)
+        self._schedule.every(seconds).seconds.do(self._launch, name, func)
+
+    def _launch(self, name, func):
+        job = self._jobs[name]
+        with self._lock:
+            if job.running:
+                job.overlaps += 1
+                logging.warning(f"Scheduled job {name} still running, skipping this run")
+                return
+            job.running = True
+            job.last_started = time.time()
+        threading.Thread(target=self._execute, args=(job, func), name=f"job-{name}", daemon=True).start()
+
+    def _execute(self, job, func):
+        start = time.perf_counter()
+        failed = False
+        try:
+            func()
+        except Exception as e:
+            failed = True
+            logging.error(f"Scheduled job {job.name} failed: {e}")
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                job.running = False
+                job.runs += 1
+                job.failures += int(failed)
+                job.last_duration = duration
+                job.total_duration += duration
+                job.max_duration = max(job.max_duration, duration)
+                if duration > job.interval:
+                    job.overruns += 1
+            if duration > job.interval:
+                logging.warning(f"Scheduled job {job.name} took {duration:.1f}s, longer than its {job.interval}s interval")
+
     def _run_scheduler(self):
         """运行调度器"""
-        # 每小时重置用户攻击统计
-        schedule.every().hour.do(DDoSDetector.reset_user_stats)
-        
+        # 每小时重置数据库中的用户攻击统计（内存滑动窗口按时间自然过期，不在此清除）
+        self._every(3600, "reset_user_stats", DDoSDetector.reset_user_stats)
+
+        # 每分钟把内存中的攻击统计批量写入数据库
+        self._every(60, "flush_ddos_stats", DDoSDetector.flush_stats)
+
         # 每10分钟检查并自动解封到期用户
-        schedule.every(10).minutes.do(self._auto_unban_expired_users)
-        
+        self._every(600, "auto_unban", self._auto_unban_expired_users)
+
         while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # 每分钟检查一次
-    
+            self._schedule.run_pending()
+            # 睡到下一个任务到期（stop() 会立即唤醒）
+            idle = self._schedule.idle_seconds
+            self._wakeup.wait(timeout=max(idle, 0.0) if idle is not None else 60)
+
     def _auto_unban_expired_users(self):
-        """自动解封到期用户"""
-        try:
-            from datetime import datetime
-            from config.database import execute_query
-            
-            # 查找到期的封禁用户
-            expired_bans = execute_query(
-                """
-                SELECT user_id FROM banned_users 
-                WHERE is_active = 1 AND unban_at IS NOT NULL AND unban_at <= NOW()
-                """,
-                fetch=True
-            )
-            
-            for ban in expired_bans:
-                user_id = ban['user_id']
-                
-                # 解除封禁
-                execute_query(
-                    "UPDATE banned_users SET is_active = 0 WHERE user_id = %s",
-                    (user_id,)
-                )
-                
-                # 恢复用户权限
-                execute_query(
-                    "UPDATE permissions SET permission_value = 1 WHERE user_id = %s AND permission_value IS NULL",
-                    (user_id,)
+        """自动解封到期用户：按批集合更新，每批一个事务"""
+        from config.database import transaction
+
+        total = 0
+        while True:
+            with transaction() as tx:
+                # 锁定一批到期封禁，避免多进程重复处理
+                expired_bans = tx.execute(
+                    """
+                    SELECT user_id FROM banned_users
+                    WHERE is_active = 1 AND unban_at IS NOT NULL AND unban_at <= NOW()
+                    ORDER BY user_id
+                    LIMIT %s
+                    FOR UPDATE
+                    """,
+                    (UNBAN_CHUNK_SIZE,),
+                    fetch=True
                 )
-                
-                logging.info(f"Auto-unbanned user {user_id}")
-                
-        except Exception as e:
-            logging.error(f"Error in auto unban: {e}")
+                user_ids = [ban['user_id'] for ban in expired_bans]
+                if user_ids:
+                    placeholders = ", ".join(["%s"] * len(user_ids))
+                    # 解除封禁
+                    tx.execute(
+                        f"UPDATE banned_users SET is_active = 0 WHERE is_active = 1 AND user_id IN ({placeholders})",
+                        user_ids
+                    )
+                    # 恢复用户权限
+                    tx.execute(
+                        f"""
+                        UPDATE permissions SET permission_value = 1
+                        WHERE permission_value IS NULL AND user_id IN ({placeholders})
+                        """,
+                        user_ids
+                    )
+
+            # 事务提交后再失效缓存，避免其它请求读回旧状态
+            for user_id in user_ids:
+                auth_cache.invalidate(user_id)
+            total += len(user_ids)
+            if len(user_ids) < UNBAN_CHUNK_SIZE:
+                break
+
+        if total:
+            logging.info(f"Auto-unbanned {total} users")
+        return total
 
 # 全局调度器实例
-scheduler = TaskScheduler()
\ No newline at end of file
+scheduler = TaskScheduler()
@@ -1,6 +1,7 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
 import contextlib
+import logging
 import math
 import re
 import time
@@ -10,8 +11,7 @@ import numpy as np
 import torch
 import torch.nn.functional as F
 
-from ultralytics.utils import LOGGER
-from ultralytics.utils.metrics import batch_probiou
+LOGGER = logging.getLogger("ultralytics")  # same logger as ultralytics.utils.LOGGER, without importing it
 
 
 class Profile(contextlib.ContextDecorator):
@@ -151,6 +151,8 @@ def nms_rotated(boxes, scores, threshold=0.45):
     Returns:
         (torch.Tensor): Indices of boxes to keep after NMS.
     """
+    from ultralytics.utils.metrics import batch_probiou  # scope so that this module loads with torch alone
+
     if len(boxes) == 0:
         return np.empty((0,), dtype=np.int8)
     sorted_idx = torch.argsort(scores, descending=True)
@@ -160,6 +162,202 @@ def nms_rotated(boxes, scores, threshold=0.45):
     return sorted_idx[pick]
 
 
+def nms(boxes, scores, iou_thres=0.45, groups=None):
+    """
+    Greedy NMS for axis-aligned boxes, using torchvision.ops.nms when available and a NumPy (or Numba, if installed)
+    CPU implementation otherwise.
+
+    Args:
+        boxes (torch.Tensor): Boxes in (x1, y1, x2, y2) format, shape (N, 4).
+        scores (torch.Tensor): Confidence scores, shape (N,).
+        iou_thres (float): IoU threshold above which lower-scoring boxes are suppressed.
+        groups (torch.Tensor, optional): Integer group ids, shape (N,). Boxes only suppress boxes of the same group.
+
+    Returns:
+        (torch.Tensor): Indices of the kept boxes, sorted by decreasing score.
+    """
+    try:
+        import torchvision  # scope for faster 'import ultralytics'
+    except ImportError:
+        return nms_cpu(boxes, scores, iou_thres, groups)
+    if groups is None or not len(boxes):
+        return torchvision.ops.nms(boxes, scores, iou_thres)
+    if boxes.device.type == "cpu":
+        # The CPU kernel is O(N^2) in the boxes of one call, so suppress each group separately
+        return _nms_per_group(torchvision.ops.nms, boxes, scores, iou_thres, groups)
+
+    # Offset boxes by group so that different groups never overlap; a common shift does not change IoU
+    boxes = boxes.float()  # FP16 cannot represent the offsets
+    lo = boxes.min()
+    span = boxes.max() - lo + 1
+    if float(span) * (int(groups.max()) + 1) > 2**22:  # keep sub-pixel precision for large offsets
+        boxes, lo, span = boxes.double(), lo.double(), span.double()
+    return torchvision.ops.nms(boxes - lo + groups[:, None] * span, scores, iou_thres)
+
+
+def _nms_per_group(kernel, boxes, scores, iou_thres, groups):
+    """Run `kernel` on each group of boxes separately and merge the kept indices by decreasing score."""
+    order = torch.sort(groups, stable=True).indices
+    keep = [
+        idx[kernel(boxes[idx], scores[idx], iou_thres)]
+        for idx in order.split(torch.bincount(groups).tolist())
+        if len(idx)
+    ]
+    keep = torch.cat(keep) if keep else order[:0]
+    return keep[scores[keep].argsort(descending=True, stable=True)]
+
+
+def nms_cpu(boxes, scores, iou_thres=0.45, groups=None):
+    """
+    NumPy/Numba NMS for environments without torchvision. Same inputs and outputs as `nms`; groups are suppressed
+    independently.
+
+    Args:
+        boxes (torch.Tensor | np.ndarray): Boxes in (x1, y1, x2, y2) format, shape (N, 4).
+        scores (torch.Tensor | np.ndarray): Confidence scores, shape (N,).
+        iou_thres (float): IoU threshold above which lower-scoring boxes are suppressed.
+        groups (torch.Tensor | np.ndarray, optional): Integer group ids, shape (N,).
+
+    Returns:
+        (torch.Tensor | np.ndarray): Indices of the kept boxes, sorted by decreasing score.
+    """
+    is_tensor = isinstance(boxes, torch.Tensor)
+
+    def to_numpy(t, dtype):
+        return t.detach().cpu().numpy().astype(dtype) if is_tensor else np.asarray(t, dtype=dtype)
+
+    b = np.ascontiguousarray(to_numpy(boxes, np.float64))
+    sc = np.ascontiguousarray(to_numpy(scores, np.float64))
+    kernel = _nms_numba() or _nms_numpy
+    if groups is None:
+        keep = kernel(b, sc, float(iou_thres))
+    else:
+        g = to_numpy(groups, np.int64)
+        order = g.argsort(kind="stable")
+        bounds = np.flatnonzero(np.diff(g[order])) + 1
+        keep = [idx[kernel(b[idx], sc[idx], float(iou_thres))] for idx in np.split(order, bounds) if len(idx)]
+        keep = np.concatenate(keep) if keep else np.empty(0, dtype=np.int64)
+        keep = keep[sc[keep].argsort(kind="stable")[::-1]]
+    keep = np.ascontiguousarray(keep, dtype=np.int64)
+    return torch.from_numpy(keep).to(boxes.device) if is_tensor else keep
+
+
+def _nms_numpy(boxes, scores, iou_thres):
+    """Greedy NMS, vectorized over the remaining boxes at each step."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort(kind="stable")[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
+
+_NUMBA_NMS = []
+
+
+def _nms_numba():
+    """Compile the Numba NMS kernel on first use; returns None when Numba is not installed."""
+    if not _NUMBA_NMS:
+        try:
+            from numba import njit
+        except ImportError:
+            _NUMBA_NMS.append(None)
+        else:
+
+            @njit
+            def kernel(boxes, scores, iou_thres):
+                order = np.argsort(-scores, kind="mergesort")
+                areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+                suppressed = np.zeros(len(order), dtype=np.bool_)
+                keep = np.empty(len(order), dtype=np.int64)
+                n = 0
+                for a in range(len(order)):
+                    i = order[a]
+                    if suppressed[i]:
+                        continue
+                    keep[n] = i
+                    n += 1
+                    for c in range(a + 1, len(order)):
+                        j = order[c]
+                        if suppressed[j]:
+                            continue
+                        w = min(boxes[i, 2], boxes[j, 2]) - max(boxes[i, 0], boxes[j, 0])
+                        h = min(boxes[i, 3], boxes[j, 3]) - max(boxes[i, 1], boxes[j, 1])
+                        if w <= 0 or h <= 0:
+                            continue
+                        inter = w * h
+                        if inter / (areas[i] + areas[j] - inter + 1e-9) > iou_thres:
+                            suppressed[j] = True
+                return keep[:n]
+
+            _NUMBA_NMS.append(kernel)
+    return _NUMBA_NMS[0]
+
+
+def _rank_in_group(group, n):
+    """
+    For `group` ids listed in decreasing score order, return the indices that stably sort them by group and the rank
+    of each sorted element within its group (0 = highest score).
+    """
+    order = torch.sort(group, stable=True).indices
+    sorted_group = group[order]
+    counts = torch.bincount(sorted_group, minlength=n)
+    starts = counts.cumsum(0) - counts
+    return order, torch.arange(len(order), device=group.device) - starts[sorted_group]
+
+
+def _batched_nms(prediction, xc, conf_thres, iou_thres, classes, agnostic, multi_label, max_det, nc, nm, max_nms):
+    """
+    Whole-batch NMS: candidates of all images are gathered into one tensor, suppressed with a single NMS call grouped
+    by (image, class) and split back per image. There is no per-image step to stop at, so the caller can only report
+    an exceeded time limit, not skip the remaining images.
+    """
+    bs = prediction.shape[0]
+    empty = torch.zeros((0, 6 + nm), device=prediction.device)
+    b, k = torch.where(xc)  # image index and anchor index of every candidate
+    box, cls, mask = prediction[b, k].split((4, nc, nm), 1)
+    if multi_label:
+        k, j = torch.where(cls > conf_thres)
+        x = torch.cat((box[k], cls[k, j, None], j[:, None].float(), mask[k]), 1)
+        b = b[k]
+    else:  # best class only
+        conf, j = cls.max(1, keepdim=True)
+        keep = conf.view(-1) > conf_thres
+        x = torch.cat((box, conf, j.float(), mask), 1)[keep]
+        b = b[keep]
+    if classes is not None:
+        keep = (x[:, 5:6] == classes).any(1)
+        x, b = x[keep], b[keep]
+    if not x.shape[0]:
+        return [empty] * bs
+
+    # At most max_nms highest-confidence candidates per image
+    if int(torch.bincount(b, minlength=bs).max()) > max_nms:
+        by_score = x[:, 4].argsort(descending=True)
+        x, b = x[by_score], b[by_score]
+        order, rank = _rank_in_group(b, bs)
+        keep = order[rank < max_nms]
+        x, b = x[keep], b[keep]
+
+    # One NMS call for all (image, class) groups
+    group = b if agnostic else b * nc + x[:, 5].long()
+    i = nms(x[:, :4], x[:, 4], iou_thres, groups=group)  # sorted by decreasing score
+
+    # Top max_det per image, grouped by image for the split
+    order, rank = _rank_in_group(b[i], bs)
+    i = i[order[rank < max_det]]
+    counts = torch.bincount(b[i], minlength=bs)
+    return list(x[i].split(counts.tolist()))
+
+
 def non_max_suppression(
     prediction,
     conf_thres=0.25,
@@ -175,6 +373,7 @@ def non_max_suppression(
     max_wh=7680,
     in_place=True,
     rotated=False,
+    batched=None,
 ):
     """
     Perform non-maximum suppression (NMS) on a set of boxes, with support for masks and multiple labels per box.
@@ -201,14 +400,17 @@ def non_max_suppression(
         max_wh (int): The maximum box width and height in pixels.
         in_place (bool): If True, the input prediction tensor will be modified in place.
         rotated (bool): If Oriented Bounding Boxes (OBB) are being passed for NMS.
+        batched (bool, optional): If True, run a single NMS call for the whole batch instead of one per image.
+            Defaults to True for CUDA tensors only: on CPU the grouped call falls back to one torchvision call per
+            (image, class) group, which is no faster than the per-image loop. Rotated boxes and apriori labels always
+            use the per-image path. The batched path runs the whole batch at once, so exceeding `max_time_img` only
+            logs a warning instead of returning early with the remaining images empty.
 
     Returns:
         (List[torch.Tensor]): A list of length batch_size, where each element is a tensor of
             shape (num_boxes, 6 + num_masks) containing the kept boxes, with columns
             (x1, y1, x2, y2, confidence, class, mask1, mask2, ...).
     """
-    import torchvision  # scope for faster 'import ultralytics'
-
     # Checks
     assert 0 <= conf_thres <= 1, f"Invalid Confidence threshold {conf_thres}, valid values are between 0.0 and 1.0"
     assert 0 <= iou_thres <= 1, f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
@@ -242,6 +444,16 @@ def non_max_suppression(
             prediction = torch.cat((xywh2xyxy(prediction[..., :4]), prediction[..., 4:]), dim=-1)  # xywh to xyxy
 
     t = time.time()
+    if batched is None:
+        batched = prediction.device.type == "cuda"
+    if batched and not rotated and not any(len(lb) for lb in labels):
+        output = _batched_nms(
+            prediction, xc, conf_thres, iou_thres, classes, agnostic, multi_label, max_det, nc, nm, max_nms
+        )
+        if (time.time() - t) > time_limit:
+            LOGGER.warning(f"WARNING ⚠️ NMS time limit {time_limit:.3f}s exceeded")
+        return output
+
     output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
     for xi, x in enumerate(prediction):  # image index, image inference
         # Apply constraints
@@ -289,7 +501,7 @@ def non_max_suppression(
             i = nms_rotated(boxes, scores, iou_thres)
         else:
             boxes = x[:, :4] + c  # boxes (offset by class)
-            i = torchvision.ops.nms(boxes, scores, iou_thres)  # NMS
+            i = nms(boxes, scores, iou_thres)  # NMS
         i = i[:max_det]  # limit detections
 
         # # Experimental
@@ -0,0 +1,640 @@
+# Tests for the Flask backend helper modules (no database or network required)
+
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1] / "ai_backend"
+sys.path.insert(0, str(BACKEND))  # backend modules are imported as top-level packages (modules.*, benchmarks.*)
+
+
+def load_vendored(path):
+    """Load a vendored ultralytics module by file path, skipping its package __init__ (which imports ultralytics)."""
+    spec = importlib.util.spec_from_file_location(f"vendored_{Path(path).stem}", BACKEND / path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_sse(events):
+    """Split SSE strings into (event, data) tuples."""
+    parsed = []
+    for raw in events:
+        event, data = None, None
+        for line in raw.strip().splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: ") :])
+        parsed.append((event, data))
+    return parsed
+
+
+def test_llm_stream_fake_server():
+    """Test streaming and blocking LLM calls against the local fake OpenAI-compatible server."""
+    openai = pytest.importorskip("openai")
+    from benchmarks.fake_openai_server import FakeOpenAIServer
+    from modules.llm_stream import LLMMetrics, complete, stream_completion
+    import modules.llm_stream as llm_stream
+
+    llm_stream.llm_metrics = metrics = LLMMetrics()
+    messages = [{"role": "user", "content": "hi"}]
+    saved = []
+    with FakeOpenAIServer(reply="a*b#c", first_token_delay=0.05, token_delay=0.01) as server:
+        client = openai.OpenAI(base_url=server.base_url, api_key="fake")
+        assert complete(client, "fake", messages) == "a*b#c"
+        events = parse_sse(
+            stream_completion(
+                client,
+                "fake",
+                messages,
+                on_complete=lambda text: saved.append(text) or {"round_id": 1},
+                transform=lambda s: s.replace("*", "").replace("#", ""),
+            )
+        )
+
+    deltas = [data["delta"] for event, data in events if event is None]
+    event, done = events[-1]
+    assert "".join(deltas) == "abc" and event == "done"
+    assert done["text"] == "abc" and done["round_id"] == 1 and saved == ["abc"]
+    assert done["metrics"]["ttft_ms"] < done["metrics"]["total_ms"]
+
+    stats = metrics.stats()
+    assert stats["stream"]["calls"] == stats["blocking"]["calls"] == 1
+    assert stats["stream"]["ttft_ms_avg"] < stats["blocking"]["ttft_ms_avg"]
+
+
+def test_llm_stream_error_event():
+    """Test that upstream failures surface as an SSE error event instead of breaking the response."""
+
+    class BrokenClient:
+        class chat:
+            class completions:
+                @staticmethod
+                def create(**kwargs):
+                    raise RuntimeError("upstream unavailable")
+
+    from modules.llm_stream import stream_completion
+
+    saved = []
+    events = parse_sse(stream_completion(BrokenClient, "fake", [], on_complete=saved.append))
+    assert events == [("error", {"error": "upstream unavailable"})] and not saved
+
+
+def test_telemetry_reservoir_and_prometheus():
+    """Test bounded per-stage reservoirs, per-category breakdowns and the Prometheus export."""
+    from modules.telemetry import Telemetry
+
+    t = Telemetry(reservoir_size=16)
+    for i in range(100):
+        with t.request("detect_job", category="fire_detection"):
+            t.add("db", 0.001)
+            t.add_speed({"preprocess": 1.0, "inference": 5.0, "postprocess": 0.5})
+    t.add("db", 1.0)  # outside a request scope: ignored
+
+    stats = t.stats()["detect_job"]
+    assert set(stats["categories"]) == {"all", "fire_detection"}
+    inference = stats["categories"]["fire_detection"]["inference"]
+    assert inference["count"] == 100 and inference["p50_ms"] == 5.0
+    assert stats["categories"]["all"]["db"]["max_ms"] == 1.0
+    assert all(len(r.samples) <= 16 for r in t._series.values())
+
+    text = t.prometheus()
+    assert 'huimou_stage_seconds_count{endpoint="detect_job",category="all",stage="total"} 100' in text
+    assert 'stage="inference",le="0.005"} 100' in text
+
+
+def test_static_files_range_and_cache_headers(tmp_path):
+    """Test content-addressed names, immutable caching, byte ranges and pre-compressed variants."""
+    flask = pytest.importorskip("flask")
+    from modules.static_files import StaticFiles, content_address
+
+    src = tmp_path / "upload.mp4"
+    src.write_bytes(bytes(range(256)) * 4)
+    name = Path(content_address(str(src))).name
+    assert not src.exists() and len(name) == len("0" * 32 + ".mp4")
+    (tmp_path / "legacy.mp4").write_bytes(b"x" * 10)
+    (tmp_path / "data.json").write_text("{}")
+    (tmp_path / "data.json.gz").write_bytes(b"gz")
+
+    app = flask.Flask(__name__)
+    files = StaticFiles(str(tmp_path))
+    app.add_url_rule("/f/<filename>", "f", files.serve)
+    client = app.test_client()
+
+    r = client.get(f"/f/{name}", headers={"Range": "bytes=100-199"})
+    assert r.status_code == 206 and len(r.data) == 100 and r.headers["Content-Range"] == "bytes 100-199/1024"
+    assert "immutable" in r.headers["Cache-Control"] and "max-age=31536000" in r.headers["Cache-Control"]
+    assert client.get(f"/f/{name}", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+    assert "immutable" not in client.get("/f/legacy.mp4").headers["Cache-Control"]
+
+    r = client.get("/f/data.json", headers={"Accept-Encoding": "gzip"})
+    assert r.data == b"gz" and r.headers["Content-Encoding"] == "gzip" and r.mimetype == "application/json"
+    # 未返回变体时同样声明 Vary，共享缓存才不会把原文件返回给支持变体的客户端
+    assert client.get("/f/data.json").headers["Vary"] == "Accept-Encoding"
+    (tmp_path / "photo.jpg").write_bytes(b"jpg")
+    (tmp_path / "photo.webp").write_bytes(b"webp")
+    r = client.get("/f/photo.jpg", headers={"Accept": "image/webp"})
+    assert r.data == b"webp" and set(r.headers["Vary"].split(", ")) == {"Accept", "Accept-Encoding"}
+    assert set(client.get("/f/photo.jpg").headers["Vary"].split(", ")) == {"Accept", "Accept-Encoding"}
+
+
+def test_aho_corasick_matches_brute_force():
+    """Test Aho-Corasick matches against a brute-force scan, including overlaps and incremental removal."""
+    import random
+
+    from modules.aho_corasick import AhoCorasick
+
+    rng = random.Random(0)
+    keywords = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)} | {"he", "she", "hers"}
+    ac = AhoCorasick()
+    for kw in keywords:
+        ac.add(kw, "cat")
+
+    def brute(text, kws):
+        return sorted((i, i + len(k), k) for k in kws for i in range(len(text)) if text.startswith(k, i))
+
+    for _ in range(50):
+        text = "".join(rng.choice("abcsher") for _ in range(40))
+        assert sorted(m[:3] for m in ac.find_all(text)) == brute(text, keywords)
+
+    removed = set(list(keywords)[:10])
+    for kw in removed:
+        ac.remove(kw, "cat")
+    text = "ushers" + "".join(rng.choice("abc") for _ in range(40))
+    assert sorted(m[:3] for m in ac.find_all(text)) == brute(text, keywords - removed)
+    assert len(ac) == len(keywords - removed)
+
+
+def test_video_sampling_interpolation():
+    """Test box interpolation between sampled frames and the even, capped output size."""
+    np = pytest.importorskip("numpy")
+    from modules.video_sampling import capped_size, interpolate_boxes
+
+    assert capped_size(1920, 1080, 960) == (960, 540)
+    assert capped_size(641, 361, None) == (640, 360)
+
+    prev = np.array([[0, 0, 10, 10, 0.8, 0], [50, 50, 60, 60, 0.9, 1]], dtype=np.float32)
+    nxt = np.array([[4, 0, 14, 10, 0.6, 0], [100, 100, 110, 110, 0.7, 2]], dtype=np.float32)
+    mid = interpolate_boxes(prev, nxt, 0.25)
+    assert np.allclose(mid[0], [1, 0, 11, 10, 0.75, 0])  # 匹配的框按比例插值
+    assert len(mid) == 2 and mid[1][5] == 1  # 中点前保留消失的旧框
+    late = interpolate_boxes(prev, nxt, 0.75)
+    assert len(late) == 2 and late[1][5] == 2  # 中点后出现新框
+    assert interpolate_boxes(np.zeros((0, 6)), np.zeros((0, 6)), 0.5).shape == (0, 6)
+
+
+def test_batched_nms_matches_per_image():
+    """Test the whole-batch NMS path returns the same detections as the per-image loop and the NumPy fallback."""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("cv2")
+    ops = load_vendored("utils/ops.py")
+    nms_cpu, non_max_suppression = ops.nms_cpu, ops.non_max_suppression
+
+    torch.manual_seed(0)
+    pred = torch.rand(4, 4 + 3, 1000)
+    pred[:, :2] *= 640
+    pred[:, 2:4] = pred[:, 2:4] * 100 + 5
+    for kwargs in ({}, {"agnostic": True}, {"multi_label": True}, {"max_det": 10}, {"max_nms": 50}):
+        batched = non_max_suppression(pred, 0.3, 0.5, in_place=False, batched=True, **kwargs)
+        looped = non_max_suppression(pred, 0.3, 0.5, in_place=False, batched=False, **kwargs)
+        for a, b in zip(batched, looped):
+            assert sorted(map(tuple, a.tolist())) == sorted(map(tuple, b.tolist()))
+
+    boxes = torch.tensor([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30], [0, 0, 10, 10.0]])
+    scores = torch.tensor([0.9, 0.8, 0.7, 0.6])
+    assert nms_cpu(boxes, scores, 0.5).tolist() == [0, 2]
+    assert nms_cpu(boxes, scores, 0.5, groups=torch.tensor([0, 0, 0, 1])).tolist() == [0, 2, 3]
+
+
+def test_fused_preprocess_matches_legacy():
+    """Test the fused letterbox buffers produce the same tensor as the letterbox/np.stack preprocess path."""
+    torch = pytest.importorskip("torch")
+    cv2 = pytest.importorskip("cv2")
+    np = pytest.importorskip("numpy")
+    preprocess = load_vendored("engine/preprocess.py")
+
+    def legacy(im, new_shape, auto, stride=32):
+        # BasePredictor.pre_transform (LetterBox) + np.stack / BGR to RGB / BCHW / 0-1 as in BasePredictor.preprocess
+        (w, h), (top, bottom, left, right) = preprocess.letterbox_geometry(im[0].shape[:2], new_shape, auto, stride)
+        boxed = []
+        for x in im:
+            if x.shape[1::-1] != (w, h):
+                x = cv2.resize(x, (w, h), interpolation=cv2.INTER_LINEAR)
+            boxed.append(cv2.copyMakeBorder(x, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114)))
+        x = np.ascontiguousarray(np.stack(boxed)[..., ::-1].transpose((0, 3, 1, 2)))
+        return torch.from_numpy(x).float() / 255
+
+    assert preprocess.letterbox_geometry((480, 640), 640) == ((640, 480), (80, 80, 0, 0))
+    assert preprocess.letterbox_geometry((720, 1280), 640, auto=True) == ((640, 360), (12, 12, 0, 0))
+    rng = np.random.default_rng(0)
+    buffers = preprocess.LetterboxBuffers()
+    for shape, auto in (((720, 1280), True), ((1080, 1920), False), ((480, 640), True), ((333, 517), False)):
+        im = [rng.integers(0, 255, (*shape, 3), dtype=np.uint8) for _ in range(3)]
+        assert preprocess.fusable(im)
+        fused = buffers(im, 640, auto=auto)
+        assert torch.equal(fused, legacy(im, 640, auto))
+    ptr = buffers.dev.data_ptr()
+    buffers(im[:2], 640, auto=False)
+    assert buffers.dev.data_ptr() == ptr  # smaller batch of the same shape reuses the buffers
+    assert not preprocess.fusable([im[0], im[0][:100]])
+
+
+def test_predictor_pool_context_model_shares_weights():
+    """Test each predictor context shares the network weights but owns its Detect head state."""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("ultralytics")
+    from modules.predictor_pool import _context_model
+
+    class Net(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3), torch.nn.Conv2d(8, 4, 1))
+            self.model[-1].shape = None
+
+    net = Net()
+    ctx = _context_model(net)
+    assert ctx.model[0] is net.model[0]
+    assert ctx.model[-1] is not net.model[-1] and ctx.model[-1].weight is net.model[-1].weight
+    ctx.model[-1].shape = (1, 3, 640, 640)  # 检测头按输入尺寸缓存 anchors / shape
+    assert net.model[-1].shape is None
+    assert list(ctx.parameters())[0].data_ptr() == list(net.parameters())[0].data_ptr()
+
+
+def test_batch_scheduler_plan():
+    """Test the dynamic batch size follows the latency curve, the p99 SLO and the arrival rate."""
+    from modules.batch_scheduler import BatchScheduler, LatencyCurve
+
+    curve = LatencyCurve({1: 0.010, 2: 0.012, 4: 0.016, 8: 0.040})
+    assert curve.latency(3) == pytest.approx(0.014)
+    assert curve.latency(16) == pytest.approx(0.080)  # 超出已测范围按线性外推
+    assert curve.best_batch(8) == 4  # 吞吐量 250 张/秒，高于 batch 8 的 200 张/秒
+
+    scheduler = BatchScheduler(8, slo_ms=50, max_wait_ms=5, curve=curve)
+    assert scheduler.plan(0.0, 1) == (4, 0.0)  # 不知道到达速率，不等待
+    scheduler.interarrival = 0.001
+    assert scheduler.plan(0.0, 2) == (4, pytest.approx(0.002))  # 按到达速率 2ms 内能凑满
+    assert scheduler.plan(0.0, 6) == (4, 0.0)
+    assert scheduler.plan(0.035, 1)[0] == 3  # 已等 35ms，只剩 15ms 余量，batch 3 预计 14ms
+    assert scheduler.plan(0.2, 1) == (1, 0.0)  # 已超出 SLO，立即逐张发送
+    scheduler.interarrival = 1.0
+    assert scheduler.plan(0.0, 1) == (4, 0.0)  # 负载低时不为凑批等待
+
+    scheduler.completed_batch(2, 0.02, [0.03, 0.06])
+    stats = scheduler.stats()
+    assert stats["slo_violations"] == 1 and stats["batch_sizes"] == {2: 1}
+    assert curve.latency(2) == pytest.approx(0.0136)
+
+
+def test_batch_scheduler_latency_probe():
+    """Test the latency probe and throughput-based batch size on a plain torch model, without ultralytics."""
+    torch = pytest.importorskip("torch")
+    from modules.batch_probe import check_predict_batch_size, profile_predict_latency
+    from modules.batch_scheduler import LatencyCurve
+
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.AdaptiveAvgPool2d(1)).eval()
+    latency = profile_predict_latency(model, imgsz=32, batch_sizes=(1, 2, 4), n=1)
+    assert list(latency) == [1, 2, 4] and all(t > 0 for t in latency.values())
+    assert LatencyCurve(latency).best_batch(4) in {1, 2, 4}
+    assert check_predict_batch_size(model, imgsz=32, batch_sizes=(1, 2, 4), n=1) in {1, 2, 4}
+    assert check_predict_batch_size(model, imgsz=32, batch_sizes=(), batch_size=3) == 3  # 探测失败时使用默认值
+
+
+def test_stream_buffer_drop_policies():
+    """Test the preallocated stream ring buffer honours its drop policies and counts drops."""
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("cv2")
+    StreamBuffer = load_vendored("data/stream_buffer.py").StreamBuffer
+
+    def frames(buf, values):
+        for v in values:
+            buf.put(np.full((2, 2, 3), v, dtype=np.uint8))
+
+    for policy, expected in (("drop-oldest", [2, 3, 4]), ("drop-newest", [0, 1, 2])):
+        buf = StreamBuffer((2, 2, 3), capacity=3, policy=policy)
+        frames(buf, range(5))
+        assert [int(buf.get()[0, 0, 0]) for _ in range(len(buf))] == expected
+        assert buf.stats()["dropped"] == 2 and buf.get() is None
+
+    buf = StreamBuffer((2, 2, 3), capacity=3)
+    frames(buf, range(3))
+    assert int(buf.get(latest=True)[0, 0, 0]) == 2 and len(buf) == 0  # 只取最新帧，其余计为丢弃
+    buf.put(np.zeros((4, 4, 3), dtype=np.uint8))  # 分辨率变化时缩放到缓冲区尺寸
+    assert buf.get().shape == (2, 2, 3)
+    with pytest.raises(ValueError):
+        StreamBuffer((2, 2, 3), policy="newest")
+
+
+def test_stream_deadline_assembly():
+    """Test a batch waits for a stream that catches up before the deadline but not for a stalled one."""
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("cv2")
+    import threading
+
+    stream_buffer = load_vendored("data/stream_buffer.py")
+    cond = threading.Condition()
+    buffers = [stream_buffer.StreamBuffer((2, 2, 3), capacity=2, cond=cond) for _ in range(3)]
+    frame = np.zeros((2, 2, 3), dtype=np.uint8)
+
+    def ready():
+        return [i for i, b in enumerate(buffers) if len(b)], len(buffers)
+
+    buffers[0].put(frame)
+    threading.Timer(0.05, buffers[1].put, (frame,)).start()  # 截止时间内赶上；buffers[2] 一直没有帧
+    t0 = time.perf_counter()
+    with cond:
+        got, live = stream_buffer.wait_for_streams(cond, ready, deadline=0.3)
+    elapsed = time.perf_counter() - t0
+    assert got == [0, 1] and live == 3
+    assert 0.25 < elapsed < 1.0  # 等到截止时间为止，不会一直等停滞的流
+
+    buffers[2].put(frame)
+    with cond:
+        t0 = time.perf_counter()
+        assert stream_buffer.wait_for_streams(cond, ready, deadline=5)[0] == [0, 1, 2]
+        assert time.perf_counter() - t0 < 0.1  # 全部就绪时立即返回
+
+
+def test_job_queue_priority_and_user_cap():
+    """Test queued image jobs run before video jobs and each user is held to max_per_user running jobs."""
+    import threading
+
+    from modules.job_queue import JobQueue
+
+    queue = JobQueue(workers=1, max_per_user=1)
+    gate, order = threading.Event(), []
+    blocker = queue.submit(gate.wait, 5, user_id="a")
+    time.sleep(0.1)  # 唯一的工作线程被占用，之后的任务都在排队
+    jobs = [queue.submit(order.append, name, user_id=name, kind=kind) for name, kind in
+            (("v1", "video"), ("i1", "image"), ("v2", "video"), ("i2", "image"))]
+    gate.set()
+    for job in [blocker, *jobs]:
+        while job.status not in ("done", "failed"):
+            time.sleep(0.01)
+    assert order == ["i1", "i2", "v1", "v2"]  # 同优先级按提交顺序
+    queue.stop()
+
+    queue = JobQueue(workers=3, max_per_user=1)
+    lock, running, peak = threading.Lock(), {"a": 0, "b": 0}, {"a": 0, "b": 0}
+
+    def work(user):
+        with lock:
+            running[user] += 1
+            peak[user] = max(peak[user], running[user])
+        time.sleep(0.05)
+        with lock:
+            running[user] -= 1
+
+    jobs = [queue.submit(work, user, user_id=user) for user in ("a", "a", "a", "b", "b")]
+    for job in jobs:
+        while job.status not in ("done", "failed"):
+            time.sleep(0.01)
+    assert peak == {"a": 1, "b": 1}
+    assert all(job.status == "done" for job in jobs)
+    queue.stop()
+
+
+def test_job_queue_releases_inputs_and_prunes():
+    """Test finished jobs drop their function arguments and expired jobs are pruned without new submissions."""
+    from modules.job_queue import JobQueue
+
+    queue = JobQueue(workers=1, result_ttl=0.2, prune_interval=0)
+    job = queue.submit(len, b"uploaded image bytes", user_id=1)
+    while job.status != "done":
+        time.sleep(0.01)
+    assert job.result == 20 and job.func is None and job.args is None and job.kwargs is None
+    deadline = time.time() + 3
+    while queue.get(job.job_id) is not None and time.time() < deadline:
+        time.sleep(0.05)
+    assert queue.get(job.job_id) is None  # 工作线程空闲时清理，不依赖下一次 submit
+    queue.stop()
+
+
+def test_result_cache_lru_survives_restart(tmp_path):
+    """Test a cache hit refreshes the entry's LRU position in a new process (index rebuilt from disk)."""
+    from modules.result_cache import ResultCache
+
+    cache_dir = tmp_path / "cache"
+    cache = ResultCache(str(cache_dir), max_bytes=25)
+    for name in ("a", "b"):
+        artifact = tmp_path / f"{name}.jpg"
+        artifact.write_bytes(b"x" * 10)
+        cache.put(name, str(artifact), [])
+        time.sleep(0.01)
+    assert cache.get("a") is not None  # a 变为最近使用
+
+    reloaded = ResultCache(str(cache_dir), max_bytes=25)
+    artifact = tmp_path / "c.jpg"
+    artifact.write_bytes(b"x" * 10)
+    reloaded.put("c", str(artifact), [])  # 超出上限，应淘汰最久未使用的 b
+    assert reloaded.get("a") is not None and reloaded.get("b") is None
+
+
+def test_thumbnail_create_and_delete(tmp_path):
+    """Test a thumbnail is bounded by max_side, found by the processed file name and removed by delete()."""
+    import cv2
+    import numpy as np
+
+    from modules.thumbnails import ThumbnailStore
+
+    processed = tmp_path / "abc123.jpg"
+    cv2.imwrite(str(processed), np.full((600, 800, 3), 128, dtype=np.uint8))
+    store = ThumbnailStore(str(tmp_path / "thumbs"), max_side=64)
+    name = store.create(str(processed))
+    assert name and name == store.filename_for(str(processed))
+    thumb = cv2.imread(str(tmp_path / "thumbs" / name))
+    assert max(thumb.shape[:2]) == 64
+
+    store.delete(str(processed))
+    assert store.filename_for(str(processed)) is None
+
+
+class FakeDbConnection:
+    """Pooled connection double: records statements and transaction calls; close() returns it to its pool."""
+
+    def __init__(self, pool):
+        self.pool, self.pool_name = pool, pool.pool_name
+        self.log, self.connected = [], True
+
+    def cursor(self, dictionary=False):
+        return FakeDbCursor(self.log)
+
+    def start_transaction(self):
+        self.log.append("begin")
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.pool.idle.append(self)
+
+    def disconnect(self):
+        self.connected = False
+
+
+class FakeDbCursor:
+    """Cursor double appending executed statements to its connection's log."""
+
+    def __init__(self, log):
+        self.log, self.rowcount, self.lastrowid = log, 0, None
+
+    def execute(self, query, params=()):
+        self.log.append(query)
+        self.rowcount = 1
+
+    def executemany(self, query, seq_params):
+        self.log.append((query, len(seq_params)))
+        self.rowcount = len(seq_params)
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeDbPool:
+    """mysql-connector pool double exposing only the public interface AdaptivePool uses."""
+
+    created = 0
+
+    def __init__(self, size):
+        from mysql.connector.errors import PoolError
+
+        FakeDbPool.created += 1
+        self.pool_name, self.pool_size, self.error = f"fake_{FakeDbPool.created}", size, PoolError
+        self.idle = []
+        self.idle.extend(FakeDbConnection(self) for _ in range(size))
+
+    def get_connection(self):
+        if not self.idle:
+            raise self.error("pool exhausted")
+        return self.idle.pop()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Route config.database through an AdaptivePool backed by FakeDbPool."""
+    pytest.importorskip("mysql.connector")
+    from config import database
+
+    pool = database.AdaptivePool(4)
+    monkeypatch.setattr(pool, "_create", FakeDbPool)
+    monkeypatch.setattr(database, "connection_pool", pool)
+    return database
+
+
+def test_transaction_commits_or_rolls_back(fake_db):
+    """Test transaction() commits all statements on one connection and rolls back when the block raises."""
+    with fake_db.transaction() as tx:
+        tx.execute("INSERT a")
+        tx.executemany("INSERT b", [(1,), (2,)])
+    conn = fake_db.connection_pool.pool.idle[-1]  # 归还后回到连接池
+    assert conn.log == ["begin", "INSERT a", ("INSERT b", 2), "commit"]
+
+    conn.log.clear()
+    with pytest.raises(ValueError):
+        with fake_db.transaction() as tx:
+            tx.execute("INSERT a")
+            raise ValueError("boom")
+    assert conn.log == ["begin", "INSERT a", "rollback"]
+    assert fake_db.connection_pool.metrics.in_use == 0
+
+
+def test_execute_many_single_commit(fake_db):
+    """Test execute_many runs one executemany and one commit, and skips the database for empty input."""
+    assert fake_db.execute_many("INSERT x", iter([(1,), (2,), (3,)])) == 3
+    conn = fake_db.connection_pool.pool.idle[-1]
+    assert conn.log == [("INSERT x", 3), "commit"]
+    assert fake_db.execute_many("INSERT x", []) == 0
+    assert fake_db.connection_pool.metrics.checkouts == 1
+
+
+def test_adaptive_pool_shrink_disconnects_old_connections(fake_db, monkeypatch):
+    """Test shrinking disconnects the old pool's idle connections at once and borrowed ones when released."""
+    monkeypatch.setattr(fake_db, "POOL_MIN_SIZE", 1)
+    pool = fake_db.connection_pool
+    borrowed = pool.get_connection()
+    old = pool.pool
+    idle = list(old.idle)
+    pool._resize(force=False)  # 峰值占用 1 < 4 // 2，缩容到 2
+
+    assert pool.size == 2 and pool.pool is not old and pool.metrics.resizes == 1
+    assert not old.idle and not any(c.connected for c in idle)
+    pool.release(borrowed)
+    assert not borrowed.connected and not old.idle  # 旧池的连接断开，不放回旧池
+    assert pool.stats()["retired_in_use"] == 0 and not pool._retired
+
+
+def test_sliding_window_counts():
+    """Test events older than the window stop counting and the per-key cap saturates the count."""
+    from modules.rate_limiter import MemoryWindowBackend, SlidingWindowLimiter
+
+    backend = MemoryWindowBackend(max_events=5)
+    assert [backend.hit("k", t, 10) for t in (0, 1, 2)] == [1, 2, 3]
+    assert backend.count("k", 10, 10) == 2  # t=0 已滑出窗口 (0, 10]
+    assert backend.count("k", 12, 10) == 0
+    assert backend.count("other", 12, 10) == 0
+    assert [backend.hit("k", 20, 10) for _ in range(7)][-1] == 5  # 超过 max_events 后饱和
+
+    limiter = SlidingWindowLimiter(window_seconds=60, backend=backend)
+    limiter.hit(1, "session")
+    limiter.hit(1, "conversation")
+    limiter.hit(2, "session")
+    limiter.reset(1)
+    assert (limiter.count(1, "session"), limiter.count(1, "conversation"), limiter.count(2, "session")) == (0, 0, 1)
+
+
+def test_redis_window_backend_matches_memory():
+    """Test the shared Redis sorted-set window counts like the in-process one."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from modules.rate_limiter import MemoryWindowBackend, RedisWindowBackend
+
+    memory, shared = MemoryWindowBackend(max_events=5), RedisWindowBackend(fakeredis.FakeRedis(), max_events=5)
+    for backend in (memory, shared):
+        hits = [backend.hit((1, "session"), t, 10) for t in (0, 1, 2, 3, 3, 3, 3)]
+        counts = [backend.count((1, "session"), t, 10) for t in (10, 12, 14)]
+        backend.reset()
+        assert (hits, counts, backend.count((1, "session"), 14, 10)) == ([1, 2, 3, 4, 5, 5, 5], [5, 4, 0], 0)
+
+
+def test_ddos_flush_stats_persists_window_counts(monkeypatch):
+    """Test flush_stats upserts the current window counts of dirty users in one statement and retries on failure."""
+    pytest.importorskip("mysql.connector")
+    from modules import ddos_detector
+    from modules.ddos_detector import DDoSDetector
+    from modules.rate_limiter import MemoryWindowBackend
+
+    DDoSDetector.set_window_backend(MemoryWindowBackend())
+    DDoSDetector._dirty_users.clear()
+    calls = []
+    monkeypatch.setattr(ddos_detector, "execute_query", lambda query, params=None, fetch=False: calls.append(params))
+
+    for _ in range(3):
+        DDoSDetector.update_user_stats(7, "session")
+    DDoSDetector.update_user_stats(8, "conversation")
+    DDoSDetector.flush_stats()
+    assert len(calls) == 1
+    rows = sorted(zip(*[iter(calls[0])] * 5))
+    assert rows == [(7, DDoSDetector.TIME_WINDOW, 3, 0, 0), (8, DDoSDetector.TIME_WINDOW, 0, 1, 0)]
+    DDoSDetector.flush_stats()
+    assert len(calls) == 1  # 没有新的变化时不写库
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(ddos_detector, "execute_query", fail)
+    DDoSDetector.update_user_stats(7, "session")
+    DDoSDetector.flush_stats()
+    assert DDoSDetector._dirty_users == {7}  # 写入失败时保留脏标记，下次重试
+    DDoSDetector._dirty_users.clear()
@@ -126,7 +126,9 @@ CREATE TABLE session_users (
     user_id INT NOT NULL COMMENT '发起会话的用户ID',
     image_path VARCHAR(500) COMMENT '上传图片的存储路径',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '会话创建时间，也需要作为前端端一个组件进行展示',
-    FOREIGN KEY (user_id) REFERENCES user_names(user_id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES user_names(user_id) ON DELETE CASCADE,
+    -- 历史列表按 (created_at, session_id) 倒序 keyset 分页的覆盖索引
+    INDEX idx_user_created (user_id, created_at, session_id)
 )COMMENT='会话用户关联表，记录每个会话的发起用户';
 
 -- 9. 会话检测类别表
@@ -157,7 +159,9 @@ CREATE TABLE session_results (
     recognition_result TEXT NOT NULL COMMENT 'AI图像识别的详细结果描述',
     processed_image_path VARCHAR(500) COMMENT '处理后图片的本地存储路径',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '识别完成时间',
-    FOREIGN KEY (session_id) REFERENCES session_users(session_id) ON DELETE CASCADE
+    FOREIGN KEY (session_id) REFERENCES session_users(session_id) ON DELETE CASCADE,
+    -- 删除会话时检查内容寻址的处理结果是否仍被其他会话引用
+    INDEX idx_processed_path (processed_image_path)
 ) COMMENT='会e话识别结果表，存储AI图像识别的详细结果';
 
 -- 11. 用户消息表
@@ -242,7 +246,9 @@ CREATE TABLE banned_users (
     is_active TINYINT(1) DEFAULT 1 COMMENT '封禁状态：0=已解封，1=封禁中',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '封禁开始时间，用于解禁',
     FOREIGN KEY (user_id) REFERENCES user_names(user_id) ON DELETE CASCADE,
-    FOREIGN KEY (banned_by_admin_id) REFERENCES admin_names(admin_id) ON DELETE SET NULL
+    FOREIGN KEY (banned_by_admin_id) REFERENCES admin_names(admin_id) ON DELETE SET NULL,
+    -- 定时自动解封：WHERE is_active = 1 AND unban_at <= NOW()
+    INDEX idx_active_unban (is_active, unban_at)
 ) COMMENT='被封禁用户管理表，专门记录和管理用户封禁状态';
 
 -- 16. 管理员邀请码表
@@ -253,6 +259,19 @@ CREATE TABLE admin_invite_codes (
     FOREIGN KEY (used_by_user_id) REFERENCES user_names(user_id)
 ) COMMENT='管理员邀请码表';
 
+-- =============================================================================
+-- 已有数据库升级（新建库无需执行）
+-- =============================================================================
+
+-- 历史列表 keyset 分页：WHERE user_id=? AND (created_at, session_id) < (?, ?) ORDER BY created_at DESC, session_id DESC
+-- ALTER TABLE session_users ADD INDEX idx_user_created (user_id, created_at, session_id);
+
+-- 定时自动解封按批扫描到期封禁
+-- ALTER TABLE banned_users ADD INDEX idx_active_unban (is_active, unban_at);
+
+-- 删除会话时按处理结果路径查找其他引用
+-- ALTER TABLE session_results ADD INDEX idx_processed_path (processed_image_path);
+
 -- =============================================================================
 -- 系统初始化数据
 -- =============================================================================